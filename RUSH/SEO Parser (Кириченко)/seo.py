@@ -11,34 +11,164 @@
 
 Установка:
 pip install requests beautifulsoup4 openpyxl python-docx lxml
+pip install pyarrow  # опционально, для --parquet
+pip install numpy    # опционально, быстрый расчёт текстовых метрик
+pip install redis    # опционально, общая очередь шардов на нескольких машинах
+pip install pymorphy3  # опционально, --lemmatize (леммы русских слов в ключевых словах)
 
 Использование:
 python seo_audit_v9_0.py https://example.com 100 3
+python seo_audit_v9_0.py https://example.com 100 3 --skip-duplicate-links
+python seo_audit_v9_0.py https://example.com 5000 5 --partial-every 500
+python seo_audit_v9_0.py https://example.com 100000 6 --parquet
+python seo_audit_v9_0.py https://example.com 500000 8 --disk-frontier ./crawl_state
+python seo_audit_v9_0.py https://example.com 100 3 --metrics quick
+python seo_audit_v9_0.py https://example.com 100 3 --metrics quick,trust,eeat
+python seo_audit_v9_0.py https://example.com 1000 4 --template-threshold 0.6
+python seo_audit_v9_0.py https://example.com 500 5 --crawl-order bfs
+python seo_audit_v9_0.py https://example.com 5000 5 --verify-links --link-workers 64
+python seo_audit_v9_0.py https://example.com 1000 4 --verify-external --external-per-domain 2
+python seo_audit_v9_0.py https://example.com 500 4 --page-weight
+python seo_audit_v9_0.py https://example.com 500 4 --timing-json timing.json
+python seo_audit_v9_0.py https://example.com 2000 4 --hreflang-fetch
+python seo_audit_v9_0.py https://example.com 500 4 --history audits.sqlite
+python seo_audit_v9_0.py diff example.com --history audits.sqlite
+python seo_audit_v9_0.py diff example.com --old 3 --new 7 --score-delta 5
+python seo_audit_v9_0.py https://example.com 1000 4 --page-budget 3 --heavy-page-nodes 10000
+python seo_audit_v9_0.py https://example.com 1000 4 --stream-page-kb 1500
+python seo_audit_v9_0.py https://example.com 500 4 --lemmatize
+python seo_audit_v9_0.py rules my_rules.json
+python seo_audit_v9_0.py https://example.com 500 4 --rules my_rules.json
+python seo_audit_v9_0.py https://example.com 20000 8 --sample 30
+python seo_audit_v9_0.py https://example.com 5000 6 --trap-max-segments 8 --trap-min-urls 100
+python seo_audit_v9_0.py https://example.com 50000 6 --shards 8
+python seo_audit_v9_0.py https://example.com 50000 6 --shards 8 --remote-shards 4 --shard-queue redis://queue:6379/0 --shard-dir /mnt/shared/crawl
+python seo_audit_v9_0.py https://example.com 50000 6 --shards 8 --shard-id 5 --shard-queue redis://queue:6379/0 --shard-dir /mnt/shared/crawl
+
+Промежуточный Excel отчёт во время краулинга: kill -USR1 <pid> (Windows: Ctrl+Break).
+Каждый аудит сохраняется в историю (по умолчанию seo_history.sqlite, --no-history — выключить);
+diff сравнивает два прогона домена (по умолчанию два последних).
+Страницы больше --stream-page-kb разбираются потоково (html.parser без дерева BeautifulSoup)
+и считаются быстрым профилем метрик.
+Оценки здоровья, качества перелинковки и список проблем страниц задаются правилами
+(DEFAULT_RULES); команда rules выгружает их в JSON, --rules FILE подменяет их разделы.
+--sample N — быстрая оценка большого сайта: URL из sitemap и ссылок группируются в шаблоны
+(числа, id и слаги в пути свёрнуты), анализируется до N страниц шаблона, а метрики и доли
+проблем экстраполируются на все найденные URL шаблона с 95% доверительными интервалами.
+Ловушки краулинга (бесконечные календари и пагинация, сессии в пути, перестановки фильтров)
+не попадают во фронтир и показываются на листе Crawl Traps; --no-trap-detection — выключить.
+--shards N делит краулинг между N процессами-воркерами по хэшу хоста и пути URL; найденные
+ссылки воркеры передают друг другу через общую очередь (SQLite в --shard-dir или Redis).
+Координатор сливает результаты и графы ссылок и считает метрики уровня сайта. Воркеры
+--remote-shards запускаются на других машинах с --shard-id после старта координатора.
+URL выдаётся воркеру в аренду: если воркер упал, его URL возвращаются в очередь шарда, а
+координатор останавливает краулинг с ошибкой — отчёт без шарда был бы неполным.
 """
 
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from bs4 import BeautifulSoup, NavigableString, CData, UnicodeDammit
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse, urlsplit, parse_qsl
 from urllib.robotparser import RobotFileParser
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque, OrderedDict
 import time
 import sys
+import random
+import copy
+import heapq
+import itertools
+import operator
 from datetime import datetime
 import re
 import logging
-from math import log
+from math import log, ceil, sqrt
 import json
 from pathlib import Path
 import threading
+import hashlib
+import argparse
+import signal
+import sqlite3
+import socket
+import os
+import pickle
+import zlib
+import multiprocessing
+from functools import cached_property, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import pymorphy3 as pymorphy
+except ImportError:
+    try:
+        import pymorphy2 as pymorphy
+    except ImportError:
+        pymorphy = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 
+# ==================== PARQUET СХЕМА ====================
+
+# Вложенные словари с фиксированными ключами → колонки <поле>_<ключ>
+PARQUET_FLATTEN_FIELDS = ('eeat_components', 'structured_data_detail', 'images_optimization',
+                          'heading_distribution', 'h_details')
+# Словари/списки ключевых слов → отдельная таблица keywords.parquet
+PARQUET_KEYWORD_FIELDS = ('top_keywords', 'keyword_density_profile', 'tf_idf_keywords')
+# Явные типы колонок, которые могут быть целиком пустыми или не влезают в double.
+# Остальные: числа → double, bool → bool, всё прочее → string (списки — JSON)
+PARQUET_COLUMN_TYPES = {
+    'simhash': 'uint64',
+    'readability_score': 'double',
+    'content_freshness_days': 'double',
+    'duplicate_group': 'double',
+    'nearest_duplicate_distance': 'double',
+    'topic_cluster': 'string',
+    'nearest_duplicate_url': 'string',
+    'canonical_url': 'string',
+    'canonical_status': 'double',
+    'canonical_issue': 'string',
+    'dns_ms': 'double',
+    'connect_ms': 'double',
+    'tls_ms': 'double',
+    'ttfb_ms': 'double',
+    'download_ms': 'double',
+    'total_ms': 'double',
+    'crawl_priority': 'double',
+    'title': 'string',
+    'h1_text': 'string',
+}
+
 # ==================== АНИМАЦИЯ МОЛНИИ ====================
 
 class LightningAnimation:
@@ -121,29 +251,2166 @@ class LightningAnimation:
         
         print(f'\r[{bar}] {current:>3}/{total:<3} {status:<30}', end='', flush=True)
 
+# ==================== SIMHASH ИНДЕКС ====================
+
+class SimHashIndex:
+    """Индекс SimHash-отпечатков для поиска почти-дублей по расстоянию Хэмминга.
+
+    Отпечаток режется на max_distance + 1 блоков: у двух отпечатков с расстоянием
+    <= max_distance хотя бы один блок совпадает (принцип Дирихле), поэтому
+    сравниваются только кандидаты из общих корзин, а не все пары страниц.
+    """
+
+    def __init__(self, max_distance=3, bits=64):
+        self.max_distance = max_distance
+        self.bits = bits
+        blocks = max_distance + 1
+        step = bits // blocks
+        self.blocks = [(i * step, bits if i == blocks - 1 else (i + 1) * step) for i in range(blocks)]
+        self.tables = [defaultdict(list) for _ in self.blocks]
+        self.fingerprints = {}
+
+    def _block_keys(self, fingerprint):
+        for start, end in self.blocks:
+            yield (fingerprint >> start) & ((1 << (end - start)) - 1)
+
+    def add(self, url, fingerprint):
+        if url in self.fingerprints:
+            for table, key in zip(self.tables, self._block_keys(self.fingerprints[url])):
+                table[key].remove(url)
+        self.fingerprints[url] = fingerprint
+        for table, key in zip(self.tables, self._block_keys(fingerprint)):
+            table[key].append(url)
+
+    def find_near(self, fingerprint, exclude=None):
+        """Возвращает [(url, distance)] отпечатков в пределах max_distance, ближайшие первыми"""
+        found = {}
+        for table, key in zip(self.tables, self._block_keys(fingerprint)):
+            for url in table.get(key, ()):
+                if url == exclude or url in found:
+                    continue
+                distance = bin(self.fingerprints[url] ^ fingerprint).count('1')
+                if distance <= self.max_distance:
+                    found[url] = distance
+        return sorted(found.items(), key=lambda x: x[1])
+
+# ==================== ШАБЛОННЫЕ БЛОКИ САЙТА ====================
+
+class TemplateBlockDetector:
+    """Учит текстовые блоки, которые повторяются на доле страниц >= threshold (шапка, меню, подвал)"""
+
+    def __init__(self, threshold=0.6, min_pages=20):
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self.block_pages = Counter()
+        self.pages = 0
+
+    @property
+    def ready(self):
+        return self.pages >= self.min_pages
+
+    def observe(self, block_hashes):
+        self.pages += 1
+        self.block_pages.update(set(block_hashes))
+        # Редкие блоки (уникальный контент страниц) уже не станут шаблонными — не держим их в памяти
+        if self.pages % (self.min_pages * 10) == 0:
+            floor = self.pages * self.threshold / 10
+            for block_hash in [h for h, count in self.block_pages.items() if count < floor]:
+                del self.block_pages[block_hash]
+
+    def is_template(self, block_hash):
+        return self.ready and self.block_pages[block_hash] >= self.pages * self.threshold
+
+# ==================== ЧАСТЫЕ ФРАЗЫ ====================
+
+# Размеры таблиц Space-Saving: фразы сайта (на каждое n), фразы шаблона URL и сколько шаблонов
+# отслеживать отдельно (остальные — в общем профиле PHRASE_OTHER_TEMPLATE)
+PHRASE_SITE_CAPACITY = 20000
+PHRASE_TEMPLATE_CAPACITY = 300
+PHRASE_TEMPLATE_LIMIT = 200
+PHRASE_OTHER_TEMPLATE = '(прочие шаблоны)'
+PHRASE_SIZES = (2, 3)
+
+
+class SpaceSaving:
+    """Частые элементы потока в фиксированной памяти (алгоритм Space-Saving).
+
+    Хранит не больше capacity счётчиков. Новый элемент при заполненной
+    таблице вытесняет элемент с минимальным счётчиком и наследует его
+    значение как ошибку: count — оценка частоты сверху, count - error —
+    снизу. Элемент с частотой больше total / capacity всегда в таблице.
+    Куча минимумов ленивая: записи могут отставать от текущих счётчиков
+    и исправляются, только когда оказываются на вершине.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+        self.total = 0
+
+    def _pop_min(self):
+        counts, heap = self.counts, self.heap
+        while True:
+            count, item = heap[0]
+            current = counts.get(item)
+            if current == count:
+                heapq.heappop(heap)
+                return item, count
+            if current is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (current, item))
+
+    def update(self, weights):
+        """weights: элемент → сколько раз он встретился (например, Counter фраз страницы)"""
+        counts, errors = self.counts, self.errors
+        for item, weight in weights.items():
+            self.total += weight
+            if item in counts:
+                counts[item] += weight
+                continue
+            error = 0
+            if len(counts) >= self.capacity:
+                victim, error = self._pop_min()
+                del counts[victim], errors[victim]
+            counts[item] = error + weight
+            errors[item] = error
+            heapq.heappush(self.heap, (counts[item], item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, item) for item, count in counts.items()]
+            heapq.heapify(self.heap)
+
+    def floor(self):
+        """Верхняя граница частоты элемента, которого нет в таблице: минимум заполненной таблицы, иначе 0"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        """Слияние двух таблиц (шарды краулинга): суммы счётчиков, затем capacity наибольших.
+
+        Элемент, которого нет в одной из таблиц, мог быть в ней вытеснен: к его счётчику
+        и ошибке добавляется floor() этой таблицы, чтобы count оставался оценкой сверху.
+        """
+        floor, other_floor = self.floor(), other.floor()
+        counts, errors = Counter(), Counter()
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, floor) + other.errors.get(item, other_floor)
+        self.counts = dict(counts.most_common(self.capacity))
+        self.errors = {item: errors[item] for item in self.counts}
+        self.heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self.heap)
+        self.total += other.total
+
+    def top(self, n):
+        """[(элемент, оценка частоты, ошибка)] по убыванию частоты"""
+        return [(item, count, self.errors[item])
+                for item, count in heapq.nlargest(n, self.counts.items(), key=lambda pair: pair[1])]
+
+# ==================== ПРИОРИТЕТНЫЙ ФРОНТИР ====================
+
+# Веса слагаемых оценки URL (см. SEOAuditParser.crawl_priority)
+CRAWL_PRIORITY_WEIGHTS = {
+    'depth': 3.0,             # 1 / (1 + глубина)
+    'sitemap_priority': 2.0,  # <priority> из sitemap.xml (0..1)
+    'freshness': 1.0,         # свежесть <lastmod>: 1 / (1 + дней / 30)
+    'inlinks': 2.0,           # входящие ссылки, найденные к этому моменту (log, насыщение на 50)
+    'rarity': 2.0,            # редкость шаблона URL: 1 / sqrt(URL с таким шаблоном)
+}
+
+
+class PriorityFrontier:
+    """Фронтир (url, depth) с приоритетом, совместимый с list.append / list.pop(0).
+
+    pop(0) отдаёт URL с наибольшей оценкой, pop_min() — с наименьшей (вытеснение
+    при заполненном фронтире). Повторное обнаружение URL пересчитывает оценку
+    (входящих ссылок стало больше) — старые записи в кучах остаются и пропускаются
+    при извлечении.
+    """
+
+    def __init__(self, score):
+        self.score = score
+        self.heap = []
+        self.low = []
+        self.entries = {}
+        self.counter = itertools.count()
+
+    def append(self, item):
+        url, depth = item
+        old = self.entries.get(url)
+        if old is not None:
+            depth = min(depth, old[1])
+        entry = (self.score(url, depth), depth)
+        if entry == old:
+            return
+        self.entries[url] = entry
+        order = next(self.counter)
+        heapq.heappush(self.heap, (-entry[0], order, url, depth))
+        heapq.heappush(self.low, (entry[0], order, url, depth))
+        if max(len(self.heap), len(self.low)) > 4 * len(self.entries) + 1000:
+            self.heap = [(-score, next(self.counter), url, depth) for url, (score, depth) in self.entries.items()]
+            self.low = [(-neg_score, order, url, depth) for neg_score, order, url, depth in self.heap]
+            heapq.heapify(self.heap)
+            heapq.heapify(self.low)
+
+    def pop(self, index=0):
+        if index != 0:
+            raise IndexError('PriorityFrontier поддерживает только pop(0)')
+        while self.heap:
+            neg_score, _, url, depth = heapq.heappop(self.heap)
+            if self.entries.get(url) == (-neg_score, depth):
+                del self.entries[url]
+                return url, depth
+        raise IndexError('pop from empty frontier')
+
+    def _drop_stale_low(self):
+        low = self.low
+        while low and self.entries.get(low[0][2]) != (low[0][0], low[0][3]):
+            heapq.heappop(low)
+
+    def min_score(self):
+        """Наименьшая оценка во фронтире (None — фронтир пуст)"""
+        self._drop_stale_low()
+        return self.low[0][0] if self.low else None
+
+    def pop_min(self):
+        """Извлекает наименее ценный URL"""
+        self._drop_stale_low()
+        if not self.low:
+            raise IndexError('pop from empty frontier')
+        _, _, url, depth = heapq.heappop(self.low)
+        del self.entries[url]
+        return url, depth
+
+    def top(self, n):
+        """n самых ценных URL (url, depth) без извлечения"""
+        best = heapq.nlargest(n, self.entries.items(), key=lambda item: item[1][0])
+        return [(url, depth) for url, (_, depth) in best]
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+# ==================== ДИСКОВОЕ СОСТОЯНИЕ КРАУЛИНГА ====================
+
+class BloomFilter:
+    """Bloom-фильтр: отвечает «точно не видели» без обращения к диску"""
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01):
+        self.size = max(64, int(-capacity * log(error_rate) / (log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest(), 'little')
+        h1, h2 = digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, item):
+        """Добавляет элемент; True — если его точно не было раньше"""
+        is_new = False
+        bits = self.bits
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                is_new = True
+        return is_new
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class DiskQueue:
+    """FIFO очередь (url, depth) в SQLite, совместимая с list.append / list.pop(0)"""
+
+    def __init__(self, conn, batch_size=1000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.write_buffer = []
+        self.read_buffer = deque()
+        self.stored = 0
+        conn.execute('CREATE TABLE IF NOT EXISTS frontier (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, depth INTEGER)')
+
+    def append(self, item):
+        self.write_buffer.append(item)
+        if len(self.write_buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.write_buffer:
+            self.conn.executemany('INSERT INTO frontier (url, depth) VALUES (?, ?)', self.write_buffer)
+            self.conn.commit()
+            self.stored += len(self.write_buffer)
+            self.write_buffer = []
+
+    def pop(self, index=0):
+        if index != 0:
+            raise IndexError('DiskQueue поддерживает только pop(0)')
+        if not self.read_buffer:
+            self.flush()
+            rows = self.conn.execute('SELECT id, url, depth FROM frontier ORDER BY id LIMIT ?', (self.batch_size,)).fetchall()
+            if not rows:
+                raise IndexError('pop from empty queue')
+            self.conn.execute('DELETE FROM frontier WHERE id <= ?', (rows[-1][0],))
+            self.conn.commit()
+            self.stored -= len(rows)
+            self.read_buffer.extend((url, depth) for _, url, depth in rows)
+        return self.read_buffer.popleft()
+
+    def top(self, n):
+        """Первые n элементов очереди без извлечения"""
+        self.flush()
+        items = list(itertools.islice(self.read_buffer, n))
+        if len(items) < n:
+            items.extend(self.conn.execute('SELECT url, depth FROM frontier ORDER BY id LIMIT ?', (n - len(items),)))
+        return items
+
+    def __len__(self):
+        return len(self.read_buffer) + self.stored + len(self.write_buffer)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class DiskPriorityQueue:
+    """Приоритетный фронтир в SQLite (см. PriorityFrontier): один URL — одна строка.
+
+    Повторно найденный URL, как и в PriorityFrontier, получает меньшую из глубин и
+    заново посчитанную оценку (не максимум из старой и новой).
+    """
+
+    def __init__(self, conn, score, batch_size=1000):
+        self.conn = conn
+        self.score = score
+        self.batch_size = batch_size
+        self.pending = {}
+        self.pending_new = 0  # URL из pending, которых ещё нет в таблице
+        self.stored = 0
+        conn.execute('CREATE TABLE IF NOT EXISTS priority_frontier (url TEXT PRIMARY KEY, depth INTEGER, score REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS priority_frontier_score ON priority_frontier (score)')
+
+    def append(self, item):
+        url, depth = item
+        old = self.pending.get(url)
+        if old is not None:
+            depth = min(depth, old[0])
+        else:
+            row = self.conn.execute('SELECT depth FROM priority_frontier WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                self.pending_new += 1
+            else:
+                depth = min(depth, row[0])
+        self.pending[url] = (depth, self.score(url, depth))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            rows = [(url, depth, score) for url, (depth, score) in self.pending.items()]
+            self.conn.executemany('INSERT INTO priority_frontier (url, depth, score) VALUES (?, ?, ?) '
+                                  'ON CONFLICT(url) DO UPDATE SET depth = excluded.depth, score = excluded.score', rows)
+            self.conn.commit()
+            self.stored += self.pending_new
+            self.pending = {}
+            self.pending_new = 0
+
+    def pop(self, index=0):
+        if index != 0:
+            raise IndexError('DiskPriorityQueue поддерживает только pop(0)')
+        self.flush()
+        row = self.conn.execute('SELECT url, depth FROM priority_frontier ORDER BY score DESC LIMIT 1').fetchone()
+        if row is None:
+            raise IndexError('pop from empty frontier')
+        self.conn.execute('DELETE FROM priority_frontier WHERE url = ?', (row[0],))
+        self.conn.commit()
+        self.stored -= 1
+        return row[0], row[1]
+
+    def min_score(self):
+        self.flush()
+        row = self.conn.execute('SELECT score FROM priority_frontier ORDER BY score LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def pop_min(self):
+        self.flush()
+        row = self.conn.execute('SELECT url, depth FROM priority_frontier ORDER BY score LIMIT 1').fetchone()
+        if row is None:
+            raise IndexError('pop from empty frontier')
+        self.conn.execute('DELETE FROM priority_frontier WHERE url = ?', (row[0],))
+        self.conn.commit()
+        self.stored -= 1
+        return row[0], row[1]
+
+    def top(self, n):
+        self.flush()
+        return self.conn.execute('SELECT url, depth FROM priority_frontier ORDER BY score DESC LIMIT ?', (n,)).fetchall()
+
+    def __contains__(self, url):
+        if url in self.pending:
+            return True
+        return self.conn.execute('SELECT 1 FROM priority_frontier WHERE url = ?', (url,)).fetchone() is not None
+
+    def __len__(self):
+        return self.stored + self.pending_new
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class DiskURLSet:
+    """Множество URL в SQLite с Bloom-фильтром перед точной проверкой"""
+
+    def __init__(self, conn, capacity=1_000_000, batch_size=1000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.bloom = BloomFilter(capacity)
+        self.pending = set()
+        self.count = 0
+        conn.execute('CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def add(self, url):
+        if not self.bloom.add(url) and self._stored(url):
+            return
+        self.pending.add(url)
+        self.count += 1
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany('INSERT OR IGNORE INTO visited (url) VALUES (?)', ((url,) for url in self.pending))
+            self.conn.commit()
+            self.pending = set()
+
+    def __contains__(self, url):
+        return url in self.bloom and self._stored(url)
+
+    def _stored(self, url):
+        if url in self.pending:
+            return True
+        return self.conn.execute('SELECT 1 FROM visited WHERE url = ?', (url,)).fetchone() is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.flush()
+        for (url,) in self.conn.execute('SELECT url FROM visited'):
+            yield url
+
+
+class DiskCounter:
+    """Счётчик URL в SQLite; приращения копятся в памяти и сбрасываются пачками"""
+
+    def __init__(self, conn, batch_size=50000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pending = Counter()
+        conn.execute('CREATE TABLE IF NOT EXISTS link_counts (url TEXT PRIMARY KEY, count INTEGER) WITHOUT ROWID')
+
+    def update(self, urls):
+        self.pending.update(urls)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany(
+                'INSERT INTO link_counts (url, count) VALUES (?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET count = count + excluded.count',
+                self.pending.items())
+            self.conn.commit()
+            self.pending = Counter()
+
+    def __getitem__(self, url):
+        row = self.conn.execute('SELECT count FROM link_counts WHERE url = ?', (url,)).fetchone()
+        return (row[0] if row else 0) + self.pending[url]
+
+    def __contains__(self, url):
+        return self[url] > 0
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM link_counts').fetchone()[0]
+
+    def items(self):
+        self.flush()
+        yield from self.conn.execute('SELECT url, count FROM link_counts')
+
+    def __iter__(self):
+        for url, _ in self.items():
+            yield url
+
+
+class DiskTextStore:
+    """Тексты страниц (для TF-IDF и фраз) в SQLite, сжатые zlib; в памяти только их число"""
+
+    def __init__(self, conn, commit_every=1000):
+        self.conn = conn
+        self.commit_every = commit_every
+        self.writes = 0
+        self.count = 0
+        conn.execute('CREATE TABLE IF NOT EXISTS page_text (url TEXT PRIMARY KEY, text BLOB) WITHOUT ROWID')
+
+    def get(self, url, default=None):
+        row = self.conn.execute('SELECT text FROM page_text WHERE url = ?', (url,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else default
+
+    def __setitem__(self, url, text):
+        if self.conn.execute('SELECT 1 FROM page_text WHERE url = ?', (url,)).fetchone() is None:
+            self.count += 1
+        self.conn.execute('INSERT OR REPLACE INTO page_text (url, text) VALUES (?, ?)',
+                          (url, zlib.compress(text.encode('utf-8'))))
+        self.writes += 1
+        if self.writes % self.commit_every == 0:
+            self.conn.commit()
+
+    def items(self):
+        for url, text in self.conn.execute('SELECT url, text FROM page_text'):
+            yield url, zlib.decompress(text).decode('utf-8')
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+
+class DiskCrawlState:
+    """Фронтир, visited, счётчики ссылок и тексты страниц краулинга в одном временном SQLite файле.
+
+    Результаты анализа страниц, граф внутренних ссылок и индекс SimHash остаются в памяти —
+    это несколько сотен байт на страницу против десятков КБ текста.
+    """
+
+    def __init__(self, directory, capacity=1_000_000, score=None):
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.path = Path(directory) / f'crawl_state_{os.getpid()}_{int(time.time())}.sqlite'
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute('PRAGMA journal_mode = OFF')
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.queue = DiskPriorityQueue(self.conn, score) if score else DiskQueue(self.conn)
+        self.visited = DiskURLSet(self.conn, capacity)
+        self.link_counts = DiskCounter(self.conn)
+        self.page_texts = DiskTextStore(self.conn)
+
+    def close(self, remove=True):
+        self.conn.close()
+        if remove and self.path.exists():
+            self.path.unlink()
+
+# ==================== ШАРДИРОВАННЫЙ КРАУЛИНГ ====================
+
+# Состояние краулинга, которое воркер шарда передаёт координатору
+SHARD_STATE_FIELDS = ('results', 'internal_links_graph', 'incoming_links', 'external_links', 'broken_links',
+                      'crawled_status', 'redirects', 'redirect_hops', 'link_status_cache', 'page_resources',
+                      'hreflang_index', 'all_urls_data', 'timings', 'exact_duplicates', 'frontier_dropped',
+                      'url_templates', 'slow_pages', 'site_phrases', 'template_phrases', 'template_pages',
+                      'uncrawlable_links')
+
+
+def shard_of(url, shards):
+    """Шард-владелец URL: хэш хоста и пути, одинаковый во всех процессах и на всех машинах"""
+    parsed = urlparse(url)
+    digest = hashlib.blake2b(f'{parsed.netloc}{parsed.path}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+class SQLiteSharedFrontier:
+    """Общий фронтир шардов в SQLite — процессы одной машины.
+
+    URL — первичный ключ, поэтому каждый URL попадает в очередь один раз
+    за краулинг. state: 0 — ждёт, 1 — выдан воркеру до lease, 2 — обработан.
+    Выдача — аренда: URL воркера, который упал, не вернув его (OOM, SIGKILL),
+    по истечении lease секунд снова ждёт в очереди. Счётчики: claimed —
+    выдано страниц (общий бюджет max_pages), ready — координатор очистил
+    очередь и положил стартовый URL, heartbeat:N — последняя активность шарда N.
+    """
+
+    def __init__(self, path, shards, lease=300):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.shards = shards
+        self.lease = lease
+        self.conn = sqlite3.connect(str(path), timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS shard_queue (
+                url TEXT PRIMARY KEY, shard INTEGER, depth INTEGER, state INTEGER DEFAULT 0,
+                lease REAL) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS shard_queue_pending ON shard_queue (shard, state, depth);
+            CREATE TABLE IF NOT EXISTS shard_counters (name TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID;
+        ''')
+
+    def _write(self, action):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = action()
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+        return result
+
+    def _counter(self, name):
+        row = self.conn.execute('SELECT value FROM shard_counters WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _add(self, name, delta):
+        self.conn.execute('INSERT INTO shard_counters (name, value) VALUES (?, ?) '
+                          'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, delta))
+
+    def _insert(self, items):
+        self.conn.executemany('INSERT OR IGNORE INTO shard_queue (url, shard, depth) VALUES (?, ?, ?)', items)
+
+    def reset(self, seeds):
+        def action():
+            self.conn.execute('DELETE FROM shard_queue')
+            self.conn.execute('DELETE FROM shard_counters')
+            self._insert([(url, shard_of(url, self.shards), depth) for url, depth in seeds])
+            self._add('ready', 1)
+        self._write(action)
+
+    def ready(self):
+        return self._counter('ready') > 0
+
+    def push(self, items):
+        """items: [(url, шард, глубина)]; уже известные URL пропускаются"""
+        self._write(lambda: self._insert(items))
+
+    def claim(self, shard, budget):
+        """Следующий (url, depth) шарда или None, если очередь шарда пуста или бюджет исчерпан"""
+        def action():
+            now = time.time()
+            # Просроченная аренда — воркер упал: URL снова ждёт, его страница не в бюджете
+            expired = self.conn.execute('UPDATE shard_queue SET state = 0, lease = NULL '
+                                        'WHERE shard = ? AND state = 1 AND lease < ?', (shard, now)).rowcount
+            if expired:
+                self._add('claimed', -expired)
+            if self._counter('claimed') >= budget:
+                return None
+            row = self.conn.execute('SELECT url, depth FROM shard_queue WHERE shard = ? AND state = 0 '
+                                    'ORDER BY depth LIMIT 1', (shard,)).fetchone()
+            if row:
+                self.conn.execute('UPDATE shard_queue SET state = 1, lease = ? WHERE url = ?',
+                                  (now + self.lease, row[0]))
+                self._add('claimed', 1)
+            return row
+        return self._write(action)
+
+    def release(self, shard, item, requeue=False):
+        """Страница item обработана (её ссылки уже в очереди); requeue — выдана, но не начата"""
+        def action():
+            if requeue:
+                self.conn.execute('UPDATE shard_queue SET state = 0, lease = NULL WHERE url = ?', (item[0],))
+                self._add('claimed', -1)
+            else:
+                self.conn.execute('UPDATE shard_queue SET state = 2, lease = NULL WHERE url = ?', (item[0],))
+        self._write(action)
+
+    def heartbeat(self, shard):
+        def action():
+            self.conn.execute('INSERT OR REPLACE INTO shard_counters (name, value) VALUES (?, ?)',
+                              (f'heartbeat:{shard}', int(time.time())))
+        self._write(action)
+
+    def lost(self):
+        """Шарды, которые молчат дольше lease, хотя у них есть очередь или выданные URL"""
+        stale = time.time() - self.lease
+        rows = self.conn.execute("SELECT name FROM shard_counters WHERE name LIKE 'heartbeat:%' AND value < ?",
+                                 (stale,))
+        silent = {int(name.split(':')[1]) for name, in rows}
+        return sorted(shard for shard in silent if self.conn.execute(
+            'SELECT 1 FROM shard_queue WHERE shard = ? AND state < 2 LIMIT 1', (shard,)).fetchone())
+
+    def claimed(self):
+        return self._counter('claimed')
+
+    def pending(self, shard=None):
+        if shard is None:
+            return self.conn.execute('SELECT COUNT(*) FROM shard_queue WHERE state = 0').fetchone()[0]
+        return self.conn.execute('SELECT COUNT(*) FROM shard_queue WHERE shard = ? AND state = 0',
+                                 (shard,)).fetchone()[0]
+
+    def idle(self):
+        return self.conn.execute('SELECT 1 FROM shard_queue WHERE state < 2 LIMIT 1').fetchone() is None
+
+    def remaining(self, shard=None):
+        if shard is None:
+            rows = self.conn.execute('SELECT url, depth FROM shard_queue WHERE state = 0 ORDER BY depth')
+        else:
+            rows = self.conn.execute('SELECT url, depth FROM shard_queue WHERE shard = ? AND state = 0 '
+                                     'ORDER BY depth', (shard,))
+        return [tuple(row) for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+class RedisSharedFrontier:
+    """Общий фронтир шардов в Redis-совместимом сервере — воркеры на разных машинах.
+
+    Та же семантика, что у SQLiteSharedFrontier: seen — все URL краулинга
+    (SADD отвечает, новый ли URL), очередь шарда — список, выданные URL —
+    sorted set со сроком аренды, выдача URL с возвратом просроченных и
+    проверкой бюджета — атомарный Lua-скрипт.
+    """
+
+    CLAIM_SCRIPT = '''
+        local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[2])
+        for _, item in ipairs(expired) do
+            redis.call('ZREM', KEYS[3], item)
+            redis.call('LPUSH', KEYS[2], item)
+            redis.call('DECR', KEYS[1])
+        end
+        if tonumber(redis.call('GET', KEYS[1]) or '0') >= tonumber(ARGV[1]) then return false end
+        local item = redis.call('LPOP', KEYS[2])
+        if not item then return false end
+        redis.call('INCR', KEYS[1])
+        redis.call('ZADD', KEYS[3], ARGV[3], item)
+        return item
+    '''
+
+    def __init__(self, url, namespace, shards, lease=300):
+        if redis is None:
+            raise RuntimeError('Для очереди шардов в Redis установите redis: pip install redis')
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.shards = shards
+        self.lease = lease
+        self.claim_script = self.client.register_script(self.CLAIM_SCRIPT)
+
+    def _key(self, *parts):
+        return ':'.join((self.namespace,) + tuple(str(part) for part in parts))
+
+    def reset(self, seeds):
+        keys = list(self.client.scan_iter(self._key('*')))
+        if keys:
+            self.client.delete(*keys)
+        self.push([(url, shard_of(url, self.shards), depth) for url, depth in seeds])
+        self.client.set(self._key('ready'), 1)
+
+    def ready(self):
+        return bool(self.client.exists(self._key('ready')))
+
+    def push(self, items):
+        pipe = self.client.pipeline()
+        for url, _, _ in items:
+            pipe.sadd(self._key('seen'), url)
+        added = pipe.execute()
+        pipe = self.client.pipeline()
+        for (url, shard, depth), new in zip(items, added):
+            if new:
+                pipe.rpush(self._key('queue', shard), json.dumps([url, depth]))
+        pipe.execute()
+
+    def claim(self, shard, budget):
+        now = time.time()
+        raw = self.claim_script(keys=[self._key('claimed'), self._key('queue', shard), self._key('inflight', shard)],
+                                args=[budget, now, now + self.lease])
+        return tuple(json.loads(raw)) if raw else None
+
+    def release(self, shard, item, requeue=False):
+        raw = json.dumps(list(item))
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key('inflight', shard), raw)
+        if requeue:
+            pipe.lpush(self._key('queue', shard), raw)
+            pipe.decr(self._key('claimed'))
+        pipe.execute()
+
+    def heartbeat(self, shard):
+        self.client.hset(self._key('heartbeat'), shard, int(time.time()))
+
+    def lost(self):
+        stale = time.time() - self.lease
+        beats = self.client.hgetall(self._key('heartbeat'))
+        return sorted(int(shard) for shard, at in beats.items() if int(at) < stale and (
+            self.client.llen(self._key('queue', int(shard))) or self.client.zcard(self._key('inflight', int(shard)))))
+
+    def claimed(self):
+        return int(self.client.get(self._key('claimed')) or 0)
+
+    def pending(self, shard=None):
+        shards = range(self.shards) if shard is None else (shard,)
+        return sum(self.client.llen(self._key('queue', s)) for s in shards)
+
+    def idle(self):
+        return self.pending() == 0 and not any(self.client.zcard(self._key('inflight', s)) for s in range(self.shards))
+
+    def remaining(self, shard=None):
+        shards = range(self.shards) if shard is None else (shard,)
+        return [tuple(json.loads(raw)) for s in shards for raw in self.client.lrange(self._key('queue', s), 0, -1)]
+
+    def close(self):
+        self.client.close()
+
+
+def open_shared_frontier(spec, namespace, shards):
+    """redis://… (rediss://, unix://) → RedisSharedFrontier, иначе путь к файлу SQLite"""
+    if str(spec).startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSharedFrontier(str(spec), namespace, shards)
+    return SQLiteSharedFrontier(spec, shards)
+
+
+class ShardFrontier:
+    """Фронтир воркера шарда поверх общего (list.append / pop(0), как остальные фронтиры).
+
+    append копит найденные URL и отправляет их шардам-владельцам пачкой.
+    bool() выдаёт воркеру следующий URL его шарда и ждёт, пока работа не
+    появится или краулинг не закончится: очередь пуста и ни одна страница
+    не в обработке, либо выдано max_pages страниц. Страница считается
+    обработанной при следующем обращении — к этому моменту её ссылки уже
+    отправлены, поэтому пустая очередь без страниц в обработке значит конец.
+    Пока воркер ждёт работу, он отмечает heartbeat; если другой шард молчит
+    дольше аренды, а его очередь не пуста, краулинг этим шардом не закончить —
+    воркер останавливается, а координатор сообщает о потерянном шарде.
+    """
+
+    def __init__(self, shared, shard, shards, budget, poll=0.2):
+        self.shared = shared
+        self.shard = shard
+        self.shards = shards
+        self.budget = budget
+        self.poll = poll
+        self.outbox = {}
+        self.next_item = None
+        self.current = None
+        self.pending = 0
+        self.beat_every = max(1.0, shared.lease / 10)
+        self.last_beat = 0.0
+
+    def _beat(self):
+        now = time.monotonic()
+        if now - self.last_beat >= self.beat_every:
+            self.shared.heartbeat(self.shard)
+            self.last_beat = now
+
+    def append(self, item):
+        url, depth = item
+        if depth < self.outbox.get(url, depth + 1):
+            self.outbox[url] = depth
+
+    def flush(self):
+        if self.outbox:
+            self.shared.push([(url, shard_of(url, self.shards), depth) for url, depth in self.outbox.items()])
+            self.outbox = {}
+
+    def _finish_current(self):
+        self.flush()
+        if self.current:
+            self.shared.release(self.shard, self.current)
+            self.current = None
+
+    def __bool__(self):
+        if self.next_item:
+            return True
+        self._finish_current()
+        while True:
+            self._beat()
+            if self.shared.ready():
+                item = self.shared.claim(self.shard, self.budget)
+                if item:
+                    self.next_item = self.current = tuple(item)
+                    self.pending = self.shared.pending(self.shard)
+                    return True
+                if self.shared.claimed() >= self.budget or self.shared.idle():
+                    return False
+                lost = self.shared.lost()
+                if lost:
+                    logging.error(f"❌ Шарды {lost} не отвечают дольше {self.shared.lease} с, останавливаюсь")
+                    return False
+            time.sleep(self.poll)
+
+    def pop(self, index=0):
+        if index != 0:
+            raise IndexError('ShardFrontier поддерживает только pop(0)')
+        if not self:
+            raise IndexError('pop from empty frontier')
+        item, self.next_item = self.next_item, None
+        return item
+
+    def top(self, n):
+        return self.shared.remaining(self.shard)[:n]
+
+    def close(self):
+        """Отправляет накопленные ссылки и возвращает в очередь выданный, но не начатый URL"""
+        self.flush()
+        if self.current:
+            self.shared.release(self.shard, self.current, requeue=self.next_item is not None)
+            self.current = None
+            self.next_item = None
+
+    def __contains__(self, url):
+        return url in self.outbox
+
+    def __len__(self):
+        return self.pending + len(self.outbox)
+
+
+def run_shard_worker(options):
+    """Процесс-воркер шарда (multiprocessing spawn): краулинг своей части сайта без вывода в консоль"""
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    audit = SEOAuditParser(**options)
+    try:
+        audit.crawl_shard()
+    finally:
+        audit.close()
+
+# ==================== ВЫБОРКА ПО ШАБЛОНАМ URL ====================
+
+# Сегменты пути, которые в шаблоне выборки сворачиваются: id/хэши → {id}, слаги из 3+ слов → {slug}
+SAMPLE_ID_SEGMENT = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|(?=[^/]*\d)[0-9a-f]{12,}', re.I)
+SAMPLE_SLUG_SEGMENT = re.compile(r'(?:[^\W_]+[-_]){2,}[^\W_]+(?:\.\w+)?')
+# Запасные URL шаблона (× размер выборки): заменяют URL выборки, которые не дошли до анализа
+SAMPLE_SPARE_FACTOR = 4
+# Метрики, распределение которых экстраполируется с выборки на шаблон и сайт
+SAMPLE_METRICS = ('site_health_score', 'words_count', 'unique_percent', 'html_quality_score', 'trust_score',
+                  'ttfb_ms', 'html_bytes')
+# Критические значения t-распределения для 95% интервала, df = 1..30 (дальше — 1.96)
+T_CRITICAL_95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+
+def mean_interval(values, population):
+    """Среднее выборки и 95% интервал среднего шаблона из population URL (с поправкой на конечность).
+
+    По одной странице дисперсию не оценить: интервал и дисперсия — None.
+    """
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, None, None, None
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    fpc = (population - n) / (population - 1) if population > n else 0.0
+    t = T_CRITICAL_95[n - 2] if n - 1 <= len(T_CRITICAL_95) else 1.96
+    half = t * sqrt(variance / n * fpc)
+    return mean, mean - half, mean + half, variance
+
+
+def share_interval(hits, n, population, z=1.96):
+    """Доля страниц с проблемой и её 95% интервал (Уилсон; вся совокупность в выборке — точно)"""
+    share = hits / n
+    if n >= population:
+        return share, share, share
+    center = (share + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * sqrt(share * (1 - share) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return share, max(0.0, center - half), min(1.0, center + half)
+
+
+# ==================== ЛОВУШКИ КРАУЛИНГА ====================
+
+# Сегмент пути с идентификатором сессии: ;jsessionid=..., /sid-3f9a.../, /PHPSESSID=...
+TRAP_SESSION_SEGMENT = re.compile(r';\s*(?:jsessionid|phpsessid|sid|sessionid)=|'
+                                  r'^(?:sid|sess|session|sessionid|phpsessid)[-_=]?[0-9a-z]{16,}$', re.I)
+TRAP_REASONS = {
+    'depth': 'Слишком глубокий путь',
+    'repeat': 'Повтор сегментов пути',
+    'session': 'ID сессии в пути',
+    'permutation': 'Те же сегменты в другом порядке (комбинации фильтров)',
+    'growth': 'Шаблон порождает сам себя (календарь, бесконечная пагинация)',
+}
+
+
+class CrawlTrapDetector:
+    """Ловушки краулинга: бесконечные календари и пагинация, сессии в пути, комбинации фильтров.
+
+    Правила на один URL: путь глубже max_segments, сегмент повторяется max_repeats раз
+    или блок сегментов идёт дважды подряд (/a/b/a/b), id сессии в пути, уже виденный
+    набор сегментов в другом порядке — когда под первым сегментом пути таких перестановок
+    набралось больше min_urls: одна-две (/news/05/2024 и /news/2024/05) — обычные
+    страницы, а не комбинации фильтров. Правило на шаблон URL (growth): найдено не меньше
+    min_urls его URL и больше, чем открыто, а за окно из последних min_crawled..2·min_crawled
+    открытых страниц шаблона его новые URL находятся в основном (self_ratio) на его же
+    страницах, не меньше growth_ratio на страницу — обход шаблона себя не исчерпывает.
+    Если не меньше duplicate_ratio открытых страниц оказались дублями, порог роста вдвое
+    ниже. Такой шаблон больше не попадает во фронтир, а уже стоящие в очереди URL
+    шаблона пропускаются.
+    """
+
+    def __init__(self, template, max_segments=10, max_repeats=3, min_urls=200, self_ratio=0.8,
+                 duplicate_ratio=0.5, min_crawled=10, growth_ratio=1.0, capacity=1_000_000):
+        self.template = template
+        self.max_segments = max_segments
+        self.max_repeats = max_repeats
+        self.min_urls = min_urls
+        self.self_ratio = self_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.min_crawled = min_crawled
+        self.growth_ratio = growth_ratio
+        self.seen = BloomFilter(capacity, error_rate=0.001)
+        # шаблон → [найдено, найдено на своих, открыто, дублей, и те же первые три за окно]
+        self.stats = defaultdict(lambda: [0, 0, 0, 0, 0, 0, 0])
+        self.blocked = {}
+        self.permutations = Counter()  # первый сегмент пути → найдено перестановок остальных
+        self.pruned = {}  # (шаблон, причина) → [отброшено URL, пример]
+        self._source = (None, None)  # ссылки страницы проверяются подряд — шаблон источника один
+
+    def url_reason(self, url):
+        """Причина-ловушка по самому URL ('' — нет)"""
+        segments = [segment for segment in urlsplit(url).path.split('/') if segment]
+        if len(segments) > self.max_segments:
+            return 'depth'
+        if len(set(segments)) < len(segments) and max(Counter(segments).values()) >= self.max_repeats:
+            return 'repeat'
+        for size in range(2, len(segments) // 2 + 1):
+            for i in range(len(segments) - 2 * size + 1):
+                if segments[i:i + size] == segments[i + size:i + 2 * size]:
+                    return 'repeat'
+        if any(TRAP_SESSION_SEGMENT.search(segment) for segment in segments):
+            return 'session'
+        # Фасеты в пути: /catalog/red/xl и /catalog/xl/red — одна страница в разных порядках
+        rest = segments[1:]
+        if len(rest) >= 2:
+            ordered = f'path {segments[0]}/' + '/'.join(rest)
+            unordered = f'set {segments[0]}/' + '/'.join(sorted(rest))
+            if unordered in self.seen and ordered not in self.seen:
+                # Фасеты обычно со второго сегмента, поэтому считаем по первому, а не по section()
+                self.permutations[segments[0]] += 1
+                if self.permutations[segments[0]] > self.min_urls:
+                    return 'permutation'
+            self.seen.add(ordered)
+            self.seen.add(unordered)
+        return ''
+
+    def check(self, url, source=None):
+        """Причина не ставить URL во фронтир ('' — можно); новые URL учитываются в шаблонах"""
+        is_new = self.seen.add(f'url {url}')
+        template = self.template(url) if is_new or self.blocked else None
+        reason = self.blocked.get(template)
+        if reason:
+            if is_new:
+                self._prune(template, reason, url)
+            return reason
+        # Повторно найденный URL проверяем заново, только если в первый раз он оказался ловушкой
+        reason = self.url_reason(url) if is_new or f'trap {url}' in self.seen else ''
+        if reason:
+            if is_new:
+                self.seen.add(f'trap {url}')
+                self._prune(self.section(url), reason, url)
+            return reason
+        if is_new:
+            stats = self.stats[template]
+            stats[0] += 1
+            stats[4] += 1
+            if source is not None:
+                if self._source[0] != source:
+                    self._source = (source, self.template(source))
+                if self._source[1] == template:
+                    stats[1] += 1
+                    stats[5] += 1
+            self._check_growth(template)
+        return ''
+
+    def section(self, url):
+        """Раздел сайта для ловушек по самому URL: шаблон первых двух сегментов пути"""
+        parts = urlsplit(url)
+        segments = [segment for segment in parts.path.split(';')[0].split('/') if segment][:2]
+        return self.template(parts._replace(path='/' + '/'.join(segments)).geturl()).rstrip('/') + '/*'
+
+    def blocked_reason(self, url):
+        """Причина пропустить URL из очереди: его шаблон признан ловушкой после постановки"""
+        if not self.blocked:
+            return None
+        template = self.template(url)
+        reason = self.blocked.get(template)
+        if reason and self.seen.add(f'pruned {url}'):
+            self._prune(template, reason, url)
+        return reason
+
+    def observe_page(self, url, duplicate):
+        """Учитывает открытую страницу шаблона и то, оказалась ли она дублем"""
+        template = self.template(url)
+        stats = self.stats[template]
+        stats[2] += 1
+        stats[3] += bool(duplicate)
+        stats[6] += 1
+        if stats[6] >= 2 * self.min_crawled:
+            # Окно: старая половина счётчиков отбрасывается, остаются последние страницы шаблона
+            stats[4:7] = [value // 2 for value in stats[4:7]]
+        self._check_growth(template)
+
+    def _check_growth(self, template):
+        if template in self.blocked:
+            return
+        found, own, crawled, duplicates, window_found, window_own, window_crawled = self.stats[template]
+        if found < self.min_urls or found <= crawled or crawled < self.min_crawled:
+            return
+        # Дубли снижают порог: шаблон, отдающий одинаковые страницы, — ловушка и при медленном росте
+        growth = self.growth_ratio / 2 if duplicates >= self.duplicate_ratio * crawled else self.growth_ratio
+        if window_own >= self.self_ratio * window_found and window_own >= growth * window_crawled:
+            self.blocked[template] = 'growth'
+            logging.warning(f"\n🪤 Ловушка краулинга: {template} — {TRAP_REASONS['growth']} "
+                            f"(найдено {found}, открыто {crawled}, дублей {duplicates})")
+
+    def _prune(self, template, reason, url):
+        entry = self.pruned.get((template, reason))
+        if entry:
+            entry[0] += 1
+            return
+        self.pruned[(template, reason)] = [1, url]
+        if reason != 'growth':
+            logging.warning(f"\n🪤 Ловушка краулинга: {template} — {TRAP_REASONS[reason]}: {url}")
+
+    def merge(self, pruned):
+        """Добавляет отброшенные URL другого воркера"""
+        for key, (count, example) in pruned.items():
+            if key in self.pruned:
+                self.pruned[key][0] += count
+            else:
+                self.pruned[key] = [count, example]
+
+    @property
+    def pruned_total(self):
+        return sum(count for count, _ in self.pruned.values())
+
+    def report(self):
+        """Ловушки по числу отброшенных URL"""
+        return [{'pattern': template, 'reason': reason, 'pruned': count, 'example': example}
+                for (template, reason), (count, example) in
+                sorted(self.pruned.items(), key=lambda item: -item[1][0])]
+
+
+# ==================== ИСТОРИЯ АУДИТОВ ====================
+
+# Поля страницы в истории: колонка SQLite → поле результата
+HISTORY_FIELDS = {'status': 'status', 'title': 'title', 'h1': 'h1_text', 'words': 'words_count',
+                  'health': 'site_health_score'}
+
+
+class AuditHistory:
+    """История аудитов в SQLite: прогоны по доменам и снимок ключевых полей каждой страницы.
+
+    pages хранится с ключом (run_id, url) без rowid, поэтому сравнение двух
+    прогонов — соединение по первичному ключу, а не перебор всех страниц.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY, domain TEXT NOT NULL, started TEXT NOT NULL, pages INTEGER);
+            CREATE INDEX IF NOT EXISTS runs_domain ON runs (domain, run_id);
+            CREATE TABLE IF NOT EXISTS pages (
+                run_id INTEGER NOT NULL, url TEXT NOT NULL, status INTEGER, title TEXT, h1 TEXT,
+                words INTEGER, health REAL, PRIMARY KEY (run_id, url)) WITHOUT ROWID;
+        ''')
+
+    def save(self, domain, started, results):
+        """Сохраняет прогон, возвращает его run_id"""
+        columns = ', '.join(HISTORY_FIELDS)
+        placeholders = ', '.join('?' * (len(HISTORY_FIELDS) + 2))
+        with self.conn:
+            run_id = self.conn.execute('INSERT INTO runs (domain, started, pages) VALUES (?, ?, ?)',
+                                       (domain, started, len(results))).lastrowid
+            self.conn.executemany(
+                f'INSERT OR REPLACE INTO pages (run_id, url, {columns}) VALUES ({placeholders})',
+                ((run_id, r['url'], *(r.get(field) for field in HISTORY_FIELDS.values())) for r in results))
+        return run_id
+
+    def runs(self, domain):
+        return self.conn.execute('SELECT run_id, started, pages FROM runs WHERE domain = ? ORDER BY run_id',
+                                 (domain,)).fetchall()
+
+    def diff(self, old_run, new_run, score_delta=1.0, words_ratio=0.1):
+        """Изменённые, новые и удалённые страницы между двумя прогонами.
+
+        Страница изменена, если поменялись статус, title или H1, health score
+        сдвинулся на score_delta и больше, а число слов — больше чем на
+        words_ratio от прежнего.
+        """
+        columns = ', '.join(f'o.{c}, n.{c}' for c in HISTORY_FIELDS)
+        rows = self.conn.execute(f'''
+            SELECT n.url, {columns}
+            FROM pages n JOIN pages o ON o.run_id = ? AND o.url = n.url
+            WHERE n.run_id = ? AND (
+                n.status IS NOT o.status OR n.title IS NOT o.title OR n.h1 IS NOT o.h1
+                OR ABS(COALESCE(n.words, 0) - COALESCE(o.words, 0)) > ? * MAX(COALESCE(o.words, 0), 1)
+                OR ABS(COALESCE(n.health, 0) - COALESCE(o.health, 0)) >= ?)
+            ORDER BY n.url''', (old_run, new_run, words_ratio, score_delta)).fetchall()
+        changed = []
+        for row in rows:
+            pairs = dict(zip(HISTORY_FIELDS, zip(row[1::2], row[2::2])))
+            fields = {name: (old, new) for name, (old, new) in pairs.items() if old != new}
+            changed.append({'url': row[0], 'fields': fields})
+        
+        def only_in(run, other):
+            return [dict(zip(('url',) + tuple(HISTORY_FIELDS), row)) for row in self.conn.execute(f'''
+                SELECT x.url, {', '.join(f'x.{c}' for c in HISTORY_FIELDS)} FROM pages x
+                WHERE x.run_id = ? AND NOT EXISTS (SELECT 1 FROM pages y WHERE y.run_id = ? AND y.url = x.url)
+                ORDER BY x.url''', (run, other))]
+        
+        return {'changed': changed, 'added': only_in(new_run, old_run), 'removed': only_in(old_run, new_run)}
+
+    def export_diff_excel(self, diff, filename):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Changed'
+        sheets = [(ws, ['URL', 'Field', 'Old', 'New'])]
+        sheets.append((wb.create_sheet('New Pages'), ['URL'] + [name.title() for name in HISTORY_FIELDS]))
+        sheets.append((wb.create_sheet('Removed Pages'), ['URL'] + [name.title() for name in HISTORY_FIELDS]))
+        for sheet, headers in sheets:
+            sheet.append(headers)
+            for cell in sheet[1]:
+                cell.font = Font(bold=True)
+                cell.fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
+        for page in diff['changed']:
+            for name, (old, new) in page['fields'].items():
+                ws.append([page['url'], name, old, new])
+        for sheet, key in ((sheets[1][0], 'added'), (sheets[2][0], 'removed')):
+            for page in diff[key]:
+                sheet.append([page['url']] + [page[name] for name in HISTORY_FIELDS])
+        for sheet, _ in sheets:
+            sheet.column_dimensions['A'].width = 70
+        wb.save(filename)
+        return filename
+
+    def close(self):
+        self.conn.close()
+
+# ==================== СЕТЕВАЯ ТЕЛЕМЕТРИЯ ====================
+
+# Границы корзин гистограммы времени ответа, мс (последняя корзина — всё, что больше)
+TIMING_BUCKETS_MS = (100, 200, 500, 1000, 2000)
+
+# Тайминги нового соединения текущего потока (DNS / TCP connect / TLS, секунды)
+_connection_timing = threading.local()
+
+
+class TimedConnectionMixin:
+    """Засекает DNS и TCP connect нового соединения urllib3.
+
+    Имя разрешается здесь, а соединение открывается уже по IP (_dns_host),
+    поэтому Host и SNI остаются прежними. Переиспользованное keep-alive
+    соединение не открывается заново — его DNS/connect/TLS равны нулю.
+    """
+
+    def _new_conn(self):
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(host, self.port, type=socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        self._dns_host = address
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        _connection_timing.dns = resolved - start
+        _connection_timing.connect = time.perf_counter() - resolved
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        elapsed = time.perf_counter() - start
+        _connection_timing.tls = max(0.0, elapsed - _connection_timing.dns - _connection_timing.connect)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, соединения которого отчитываются о DNS/connect/TLS"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+
+# Адреса, разрешённые один раз на домен при проверке внешних ссылок: хост → IP
+_pinned_addresses = {}
+
+
+class PinnedConnectionMixin:
+    """Открывает соединение по адресу из _pinned_addresses, без повторного DNS запроса.
+
+    Как в TimedConnectionMixin, подменяется только _dns_host — Host, SNI
+    и проверка сертификата идут по исходному имени.
+    """
+
+    def _new_conn(self):
+        address = _pinned_addresses.get(self._dns_host)
+        if address is None:
+            return super()._new_conn()
+        host, self._dns_host = self._dns_host, address
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+
+class PinnedHTTPConnection(PinnedConnectionMixin, HTTPConnection):
+    pass
+
+
+class PinnedHTTPSConnection(PinnedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class PinnedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PinnedHTTPConnection
+
+
+class PinnedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PinnedHTTPSConnection
+
+
+class PinnedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, соединения которого берут IP хоста из _pinned_addresses"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': PinnedHTTPConnectionPool,
+                                                   'https': PinnedHTTPSConnectionPool}
+
+# ==================== РЕЕСТР МЕТРИК ====================
+
+# Плагины метрик страницы. inputs — какие входы PageContext читает плагин,
+# outputs — поля результата и их значения, если плагин не выбран,
+# method — метод SEOAuditParser, который считает метрики,
+# stream — метод для страницы потокового разбора (StreamedPage), если method читает дерево soup.
+METRIC_PLUGINS = {
+    'meta': {
+        'inputs': ('soup', 'response'),
+        'stream': '_stream_meta',
+        'outputs': {'title': '', 'title_len': 0, 'description': '', 'desc_len': 0, 'canonical': 0, 'canonical_url': '',
+                    'og_tags': 0, 'meta_robots': 'default', 'mobile_friendly': 0, 'https_ok': False, 'hreflang': 0,
+                    'hreflang_links': []},
+        'method': '_metric_meta',
+    },
+    'headings': {
+        'inputs': ('soup', 'headers'),
+        'stream': '_stream_headings',
+        'outputs': {'h1_count': 0, 'h1_text': '', 'h_hierarchy': '-', 'h_errors': [], 'h_details': {},
+                    'heading_distribution': {}},
+        'method': '_metric_headings',
+    },
+    'text_basic': {
+        'inputs': ('words',),
+        'outputs': {'words_count': 0},
+        'method': '_metric_text_basic',
+    },
+    'links': {
+        'inputs': ('links',),
+        'outputs': {'int_links': 0, 'outgoing_links_internal': 0, 'follow_links': 0, 'nofollow_links': 0},
+        'method': '_metric_links',
+    },
+    'images': {
+        'inputs': ('images',),
+        'outputs': {'images_count': 0, 'images_no_alt': 0,
+                    'images_optimization': {'no_alt': 0, 'no_width_height': 0, 'no_lazy_load': 0, 'total': 0}},
+        'method': '_metric_images',
+    },
+    'http': {
+        'inputs': ('response',),
+        'outputs': {'last_modified': 'not set', 'compression': 'none', 'cache_control': 'not set',
+                    'content_freshness_days': None},
+        'method': '_metric_http',
+    },
+    'structure': {
+        'inputs': ('soup', 'structured_data'),
+        'stream': '_stream_structure',
+        'outputs': {'structured_data': 0, 'structured_data_detail': {}, 'schema': 0, 'schema_types': [],
+                    'schema_nested_types': [],
+                    'schema_missing': {}, 'breadcrumbs': 0, 'semantic_tags_count': 0, 'has_main_tag': 0},
+        'method': '_metric_structure',
+    },
+    'issues': {
+        'inputs': (),
+        'outputs': {'all_issues': []},
+        'method': '_metric_issues',
+    },
+    'readability': {
+        'inputs': ('text', 'text_stats', 'page_text'),
+        'outputs': {'unique_percent': 0, 'boilerplate_percent': 0, 'readability_score': None,
+                    'avg_sentence_length': 0, 'avg_word_length': 0, 'complex_words_percent': 0,
+                    'content_density': 0},
+        'method': '_metric_readability',
+    },
+    'toxicity': {
+        'inputs': ('text',),
+        'outputs': {'keyword_stuffing_score': 0, 'toxicity_score': 0, 'ai_markers': 0, 'filler_phrases': 0},
+        'method': '_metric_toxicity',
+    },
+    'keywords': {
+        'inputs': ('text',),
+        'outputs': {'top_keywords': [], 'keyword_density_profile': {}},
+        'method': '_metric_keywords',
+    },
+    'simhash': {
+        'inputs': ('text',),
+        'outputs': {'simhash': None},
+        'method': '_metric_simhash',
+    },
+    'html_quality': {
+        'inputs': ('soup', 'full_text'),
+        'outputs': {'dom_nodes': 0, 'html_quality_score': 0, 'deprecated_tags': 0, 'hidden_content': 0,
+                    'cloaking_detected': 0, 'js_dependence': 'Low'},
+        'method': '_metric_html_quality',
+    },
+    'trust': {
+        'inputs': ('trust_signals',),
+        'outputs': {'has_contact_info': 0, 'has_legal_docs': 0, 'has_author_info': 0, 'has_reviews': 0,
+                    'trust_badges': 0, 'trust_score': 0},
+        'method': '_metric_trust',
+    },
+    'eeat': {
+        'inputs': ('soup', 'full_text', 'links', 'trust_signals', 'structured_data'),
+        'outputs': {'eeat_score': 0, 'eeat_components': {}},
+        'method': '_metric_eeat',
+    },
+    'engagement': {
+        'inputs': ('soup',),
+        'outputs': {'cta_count': 0, 'cta_text_quality': 'Poor', 'lists_count': 0, 'tables_count': 0,
+                    'faq_count': 0},
+        'method': '_metric_engagement',
+    },
+}
+
+_QUICK_METRICS = ('meta', 'headings', 'text_basic', 'links', 'images', 'http', 'structure', 'issues')
+METRIC_PROFILES = {
+    'quick': _QUICK_METRICS,
+    'content': _QUICK_METRICS + ('readability', 'toxicity', 'keywords', 'simhash'),
+    'full': tuple(METRIC_PLUGINS),
+}
+
+# Поля, которые заполняются на уровне сайта после краулинга
+SITE_LEVEL_DEFAULTS = {
+    'duplicate_group': None, 'nearest_duplicate_url': '', 'nearest_duplicate_distance': None,
+    'links_expanded': True, 'site_health_score': 0, 'tf_idf_keywords': {}, 'page_authority': 0,
+    'incoming_links_count': 0, 'is_orphan': False, 'semantic_links': [], 'is_topic_hub': False,
+    'topic_cluster': None, 'anchor_text_quality_score': 0, 'total_links': 0, 'linking_quality_score': 0,
+    'exact_duplicate_of': '', 'crawl_priority': None, 'broken_outgoing_links': 0, 'broken_external_links': 0,
+    'canonical_status': None, 'canonical_issue': '', 'hreflang_issues': 0,
+    'html_bytes': 0, 'image_bytes': 0, 'script_bytes': 0, 'css_bytes': 0, 'resource_count': 0,
+    'missing_resources': 0, 'page_weight_bytes': 0,
+    'dns_ms': None, 'connect_ms': None, 'tls_ms': None, 'ttfb_ms': None, 'download_ms': None, 'total_ms': None,
+}
+
+# Этапы уровня сайта, которым нужны поля плагина страницы: этап → (плагин, поля, которые этап заполняет).
+# Если плагин не выбран, этап не запускается, а его поля остаются по умолчанию и не участвуют в правилах
+SITE_STAGES = {
+    'near_duplicates': ('simhash', ('duplicate_group', 'nearest_duplicate_url', 'nearest_duplicate_distance')),
+    'tf_idf': ('keywords', ('tf_idf_keywords',)),
+    'semantic_links': ('keywords', ('semantic_links',)),
+    'anchor_quality': ('engagement', ('anchor_text_quality_score', 'total_links')),
+    'topics': ('keywords', ('is_topic_hub', 'topic_cluster')),
+}
+
+# Входы PageContext, построенные на контентном тексте (без шаблонных блоков)
+CONTENT_TEXT_INPUTS = {'text', 'words', 'text_stats'}
+
+# ==================== ЛЕММАТИЗАЦИЯ ====================
+
+# Знаки препинания, которые срезаются с краёв слова: «кабеля,» и «кабеля» — одно слово
+WORD_PUNCTUATION = '.,;:!?()[]«»"\'—–-…'
+
+# Размер общего на процесс кэша слово → лемма: словарь сайта сильно повторяется между страницами
+LEMMA_CACHE_SIZE = 500_000
+_morph_analyzer = None
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_word(word):
+    """Нормальная форма русского слова (pymorphy); прочие токены возвращаются как есть"""
+    global _morph_analyzer
+    if not word.isalpha() or not re.search('[а-яё]', word):
+        return word
+    if _morph_analyzer is None:
+        _morph_analyzer = pymorphy.MorphAnalyzer()
+    return _morph_analyzer.parse(word)[0].normal_form
+
+# Ключевые свойства типов schema.org: 'a|b' — достаточно любого из вариантов,
+# 'offers.price' — свойство вложенной сущности
+_ARTICLE_PROPERTIES = ('headline', 'datePublished', 'dateModified')
+SCHEMA_KEY_PROPERTIES = {
+    'Product': ('name', 'offers.price|offers.lowPrice', 'offers.availability'),
+    'BreadcrumbList': ('itemListElement',),
+    'Article': _ARTICLE_PROPERTIES,
+    'NewsArticle': _ARTICLE_PROPERTIES,
+    'BlogPosting': _ARTICLE_PROPERTIES,
+}
+
+
+def resolve_metric_plugins(metrics):
+    """Профиль (quick/content/full) или список плагинов и профилей через запятую → плагины по порядку"""
+    selected = set()
+    for token in (t.strip() for t in metrics.split(',')):
+        if token in METRIC_PROFILES:
+            selected.update(METRIC_PROFILES[token])
+        elif token in METRIC_PLUGINS:
+            selected.add(token)
+        elif token:
+            raise ValueError(f"Неизвестный профиль или плагин метрик: {token}")
+    return [name for name in METRIC_PLUGINS if name in selected]
+
+
+# ==================== ПРАВИЛА ОЦЕНОК ====================
+
+# Правила оценок и проблем страниц (RulesEngine). Формат тот же, что у файла --rules:
+# scores     — оценка = base минус penalty каждого сработавшего правила, не ниже min;
+#              store — записать оценку в результат, issues_field — куда писать issue правил;
+# composites — взвешенная сумма оценок из scores или полей результата;
+# issues     — список сообщений сработавших правил (message форматируется полями страницы).
+# Правило срабатывает, когда выполнены все условия when: {field, op, value};
+# op: < <= > >= == != , between [a, b) и outside (меньше a или больше b).
+DEFAULT_RULES = {
+    'scores': {
+        'tech_health': {'base': 100, 'min': 0, 'rules': [
+            {'when': [{'field': 'html_quality_score', 'op': '<', 'value': 70}], 'penalty': 15},
+            {'when': [{'field': 'dom_nodes', 'op': '>', 'value': 1200}], 'penalty': 10},
+        ]},
+        'content_health': {'base': 100, 'min': 0, 'rules': [
+            {'when': [{'field': 'words_count', 'op': '<', 'value': 300}], 'penalty': 20},
+            {'when': [{'field': 'readability_score', 'op': '!=', 'value': 0},
+                      {'field': 'readability_score', 'op': '<', 'value': 40}], 'penalty': 15},
+            {'when': [{'field': 'unique_percent', 'op': '<', 'value': 50}], 'penalty': 20},
+            {'when': [{'field': 'toxicity_score', 'op': '>', 'value': 50}], 'penalty': 25},
+        ]},
+        'seo_health': {'base': 100, 'min': 0, 'rules': [
+            {'when': [{'field': 'h1_count', 'op': '!=', 'value': 1}], 'penalty': 25},
+            {'when': [{'field': 'h_hierarchy', 'op': '!=', 'value': 'Good'}], 'penalty': 15},
+            {'when': [{'field': 'title_len', 'op': 'outside', 'value': [30, 60]}], 'penalty': 10},
+            {'when': [{'field': 'canonical', 'op': '==', 'value': 0}], 'penalty': 10},
+        ]},
+        'linking_quality_score': {'base': 100, 'min': 0, 'store': True, 'issues_field': 'linking_issues', 'rules': [
+            {'when': [{'field': 'anchor_text_quality_score', 'op': '<', 'value': 50}], 'penalty': 30,
+             'issue': '❌ Generic'},
+            {'when': [{'field': 'anchor_text_quality_score', 'op': 'between', 'value': [50, 70]}], 'penalty': 15},
+            {'when': [{'field': 'total_links', 'op': '==', 'value': 0}], 'penalty': 20, 'issue': '❌ No links'},
+            {'when': [{'field': 'total_links', 'op': '>', 'value': 50}], 'penalty': 10},
+            {'when': [{'field': 'total_links', 'op': 'between', 'value': [1, 5]}], 'penalty': 15, 'issue': '⚠️ Few'},
+        ]},
+    },
+    'composites': {
+        'site_health_score': {'round': 1, 'weights': {
+            'tech_health': 0.25, 'content_health': 0.40, 'trust_score': 0.20, 'seo_health': 0.15}},
+    },
+    'issues': {
+        'all_issues': {'prepend': 'h_errors', 'limit': 10, 'ok': '✅ OK', 'rules': [
+            {'when': [{'field': 'h1_count', 'op': '!=', 'value': 1}], 'message': '⚠️ H1: {h1_count} (нужно 1)'},
+            {'when': [{'field': 'title_len', 'op': 'outside', 'value': [30, 60]}],
+             'message': '⚠️ Title: {title_len} (30-60)'},
+            {'when': [{'field': 'words_count', 'op': '<', 'value': 300}],
+             'message': '❌ Текст: {words_count} (нужно 300+)'},
+            {'when': [{'field': 'unique_percent', 'op': '<', 'value': 50}],
+             'message': '❌ Уник: {unique_percent:.0f}% (50%+)'},
+        ]},
+    },
+}
+
+
+class RulesEngine:
+    """Оценки и проблемы страниц по декларативным правилам (DEFAULT_RULES, --rules FILE).
+
+    Правила считаются по колонкам сразу для всех результатов: одно
+    сравнение NumPy на условие (без NumPy — проход по списку значений).
+    Пустое значение (None) не проходит ни одно условие, кроме !=. Правило
+    не срабатывает на странице, где плагин поля условия не считался; оценка,
+    у которой на странице посчитаны не все правила, пуста, а composite
+    делит сумму на веса только тех частей, что на странице есть.
+    """
+
+    OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+           '==': operator.eq, '!=': operator.ne}
+    RANGE_OPS = ('between', 'outside')
+
+    def __init__(self, rules=None):
+        self.rules = copy.deepcopy(DEFAULT_RULES)
+        for section, entries in (rules or {}).items():
+            if section not in self.rules:
+                raise ValueError(f'Неизвестный раздел правил: {section}')
+            self.rules[section].update(entries)
+        for section in ('scores', 'issues'):
+            for name, spec in self.rules[section].items():
+                for rule in spec.get('rules', ()):
+                    for condition in rule['when']:
+                        if condition['op'] not in self.OPS and condition['op'] not in self.RANGE_OPS:
+                            raise ValueError(f"{name}: неизвестная операция {condition['op']}")
+        self.columns = {}
+        self.available = {}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _test(op, value, v):
+        if v is None:
+            return op == '!='
+        if op == 'between':
+            return value[0] <= v < value[1]
+        if op == 'outside':
+            return v < value[0] or v > value[1]
+        return RulesEngine.OPS[op](v, value)
+
+    def _column(self, field):
+        if field not in self.columns:
+            try:
+                values = list(map(operator.itemgetter(field), self.results))
+            except KeyError:
+                values = [result.get(field) for result in self.results]
+            if np is not None:
+                try:
+                    # None → NaN: сравнения с NaN ложны, != истинно
+                    values = np.array(values, dtype=float)
+                except (TypeError, ValueError):
+                    values = np.array(values, dtype=object)
+            self.columns[field] = values
+        return self.columns[field]
+
+    def _condition(self, condition):
+        op, value = condition['op'], condition.get('value')
+        column = self._column(condition['field'])
+        if isinstance(column, list) or (column.dtype == object and op not in ('==', '!=')):
+            mask = [self._test(op, value, v) for v in column]
+            return np.array(mask, dtype=bool) if np is not None else mask
+        if column.dtype == object:
+            return self.OPS[op](column, value).astype(bool)
+        with np.errstate(invalid='ignore'):
+            if op == 'between':
+                return (column >= value[0]) & (column < value[1])
+            if op == 'outside':
+                return (column < value[0]) | (column > value[1])
+            return self.OPS[op](column, value)
+
+    def _rule_mask(self, rule):
+        mask = None
+        for condition in rule['when']:
+            parts = [self._condition(condition)]
+            if condition['field'] in self.available:
+                parts.append(self.available[condition['field']])
+            for part in parts:
+                if mask is None:
+                    mask = part
+                elif np is not None:
+                    mask = mask & part
+                else:
+                    mask = [a and b for a, b in zip(mask, part)]
+        return mask
+
+    def _both(self, a, b):
+        return a & b if np is not None else [x and y for x, y in zip(a, b)]
+
+    def _fields_available(self, fields):
+        """Маска страниц, где посчитаны все поля (None — на всех страницах)"""
+        mask = None
+        for field in fields:
+            part = self.available.get(field)
+            if part is not None:
+                mask = part if mask is None else self._both(mask, part)
+        return mask
+
+    def _score_available(self, name):
+        """Маска страниц, где посчитаны все правила оценки (None — на всех страницах).
+
+        Оценка, у которой часть правил не считалась, — это base без части штрафов,
+        а не оценка страницы: её нельзя сравнить с полной.
+        """
+        return self._fields_available(condition['field'] for rule in self.rules['scores'][name]['rules']
+                                      for condition in rule['when'])
+
+    def _score(self, name):
+        key = ('score', name)
+        if key not in self.columns:
+            spec = self.rules['scores'][name]
+            values = [float(spec.get('base', 100))] * len(self.results)
+            issues = [[] for _ in self.results] if spec.get('issues_field') else None
+            for rule in spec['rules']:
+                mask = self._rule_mask(rule)
+                if np is not None:
+                    values = np.asarray(values) - rule.get('penalty', 0) * mask
+                else:
+                    values = [v - rule.get('penalty', 0) if m else v for v, m in zip(values, mask)]
+                if rule.get('issue') and issues is not None:
+                    for i in (np.flatnonzero(mask) if np is not None else [i for i, m in enumerate(mask) if m]):
+                        issues[i].append(rule['issue'])
+            low = spec.get('min', 0)
+            values = [max(low, v) for v in values] if np is None else np.maximum(values, low)
+            available = self._score_available(name)
+            if available is not None:
+                values = (np.where(available, values, np.nan) if np is not None else
+                          [v if a else None for v, a in zip(values, available)])
+            self.columns[key] = (values, issues)
+        return self.columns[key]
+
+    def _composite(self, name):
+        """Взвешенная сумма частей; если часть на странице не посчитана, веса остальных
+        растягиваются на её долю. Страница без единой части — пустое значение.
+        """
+        spec = self.rules['composites'][name]
+        size = len(self.results)
+        total, weights = ([0.0] * size, [0.0] * size) if np is None else (np.zeros(size), np.zeros(size))
+        full = 0.0
+        for part, weight in spec['weights'].items():
+            full += weight
+            if part in self.rules['scores']:
+                values = self._score(part)[0]
+            else:
+                values = self._column(part)
+                available = self._fields_available([part])
+                if available is not None:
+                    values = (np.where(available, values, np.nan) if np is not None else
+                              [v if a else None for v, a in zip(values, available)])
+            if np is not None:
+                values = np.asarray(values, dtype=float)
+                present = ~np.isnan(values)
+                total = total + weight * np.where(present, values, 0.0)
+                weights = weights + weight * present
+            else:
+                total = [t + weight * v if v is not None else t for t, v in zip(total, values)]
+                weights = [w + weight * (v is not None) for w, v in zip(weights, values)]
+        if np is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                scaled = np.where(weights == full, total, total * full / weights)
+            return np.where(weights > 0, scaled, np.nan)
+        return [None if not w else t if w == full else t * full / w for t, w in zip(total, weights)]
+
+    def _issues(self, name):
+        spec = self.rules['issues'][name]
+        prepend = spec.get('prepend')
+        issues = [list(result.get(prepend) or []) if prepend else [] for result in self.results]
+        for rule in spec['rules']:
+            mask = self._rule_mask(rule)
+            for i in (np.flatnonzero(mask) if np is not None else [i for i, m in enumerate(mask) if m]):
+                issues[i].append(rule['message'].format_map(self.results[i]))
+        limit, ok = spec.get('limit', 10), spec.get('ok')
+        return [found[:limit] if found else ([ok] if ok else []) for found in issues]
+
+    @staticmethod
+    def _rounded(values, digits):
+        # round() Python, а не np.round: иначе x.x5 округляются иначе, чем раньше
+        values = values.tolist() if np is not None else values
+        return [None if v is None or v != v else round(v, digits) if digits else int(round(v)) for v in values]
+
+    def apply(self, results, outputs, available=None):
+        """Считает outputs (имена из scores со store, composites, issues) и пишет их в результаты.
+
+        available: поле → маска страниц, для которых поле посчитано.
+        """
+        self.results = results
+        self.columns = {}
+        self.available = {field: np.asarray(mask, dtype=bool) if np is not None else mask
+                          for field, mask in (available or {}).items()}
+        if not results:
+            return
+        for name in outputs:
+            if name in self.rules['scores']:
+                spec = self.rules['scores'][name]
+                values, issues = self._score(name)
+                for result, value in zip(results, self._rounded(values, spec.get('round', 0))):
+                    result[name] = value
+                if issues is not None:
+                    for result, found in zip(results, issues):
+                        result[spec['issues_field']] = found
+            elif name in self.rules['composites']:
+                values = self._rounded(self._composite(name), self.rules['composites'][name].get('round', 1))
+                for result, value in zip(results, values):
+                    result[name] = value
+            elif name in self.rules['issues']:
+                for result, found in zip(results, self._issues(name)):
+                    result[name] = found
+        self.results = None
+        self.columns = {}
+
+
+# ==================== ПОТОКОВЫЙ РАЗБОР HTML ====================
+
+# Как в дереве html.parser у BeautifulSoup: пустые элементы, контейнеры невидимого
+# текста (get_text их пропускает) и теги, где пробелы сохраняются
+STREAM_EMPTY_TAGS = {'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+                     'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+                     'spacer', 'track', 'wbr'}
+STREAM_HIDDEN_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+STREAM_PRESERVE_TAGS = {'pre', 'textarea'}
+STREAM_CHUNK_CHARS = 1 << 20
+STRUCTURED_ATTRS = ('itemscope', 'itemprop', 'typeof', 'property')
+
+
+class StreamTag(dict):
+    """Атрибуты тега из потокового разбора; get_text() — текст внутри тега (для ссылок)"""
+
+    text = ''
+
+    def get_text(self):
+        return self.text
+
+
+class StreamedPage(HTMLParser):
+    """Страница, разобранная потоково (html.parser) без дерева BeautifulSoup.
+
+    За один проход собирает то, что читает быстрый профиль метрик: счётчики
+    тегов, title и первый H1 (как .string в BeautifulSoup), meta и link,
+    ссылки с текстом, картинки, ресурсы, заголовки, структурированные данные
+    и видимый текст по блокам (как extract_text_blocks). Открытые элементы
+    лежат в стеке и закрываются так же, как в дереве html.parser.
+    """
+
+    def __init__(self, parser):
+        super().__init__(convert_charrefs=True)
+        self.parser = parser
+        self.tag_counts = Counter()
+        self.title = None
+        self.h1_string = None
+        self.metas = []
+        self.link_tags = []
+        self.links = []
+        self.images = []
+        self.resources = {'image': [], 'script': [], 'css': []}
+        self.headings = []
+        self.structured = {'json_ld': 0, 'microdata': 0, 'rdfa': 0, 'json_ld_errors': 0, 'items': [], 'types': set()}
+        self.breadcrumbs = 0
+        self.text_blocks = []
+        self._stack = []
+        self._blocks = []
+        self._data = []
+        self._open_text = []
+        self._texts = []
+        self._hidden = 0
+        self._preserve = 0
+        self._firsts = set()
+        self._block, self._block_parts = None, []
+
+    @classmethod
+    def parse(cls, parser, content):
+        """Разбирает байты страницы (кодировка — как у BeautifulSoup) кусками по STREAM_CHUNK_CHARS"""
+        page = cls(parser)
+        markup = UnicodeDammit(content, is_html=True).unicode_markup or ''
+        for start in range(0, len(markup), STREAM_CHUNK_CHARS):
+            page.feed(markup[start:start + STREAM_CHUNK_CHARS])
+        page.close()
+        return page
+
+    @property
+    def text(self):
+        return ' '.join(self.text_blocks)
+
+    def _child(self, string):
+        if self._stack:
+            parent = self._stack[-1]
+            parent['children'] += 1
+            parent['string'] = string
+
+    def _flush(self):
+        """Строка между тегами (как NavigableString в дереве): .string, тексты ссылок и заголовков, блоки"""
+        if not self._data:
+            return
+        text = ''.join(self._data)
+        self._data = []
+        if not self._preserve and not text.strip(' \t\n\r\f'):
+            text = '\n' if '\n' in text else ' '
+        self._child(text)
+        if not self._hidden:
+            self._add_visible(text)
+
+    def _add_visible(self, text):
+        for parts in self._open_text:
+            parts.append(text)
+        stripped = text.strip()
+        if not stripped:
+            return
+        block = self._blocks[-1] if self._blocks else None
+        if block is not self._block and self._block_parts:
+            self.text_blocks.append(' '.join(self._block_parts))
+            self._block_parts = []
+        self._block = block
+        self._block_parts.append(stripped)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        attrs = StreamTag((name, value or '') for name, value in attrs)
+        self.tag_counts[tag] += 1
+        self._child(None)
+        if tag in ('a', 'link') and 'rel' in attrs:
+            attrs['rel'] = attrs['rel'].split()
+        if tag == 'meta':
+            self.metas.append(attrs)
+        elif tag == 'link':
+            self.link_tags.append(attrs)
+            if 'href' in attrs and 'stylesheet' in [rel.lower() for rel in attrs.get('rel', [])]:
+                self.resources['css'].append(attrs['href'].strip())
+        elif tag == 'img':
+            self.images.append(attrs)
+            if 'src' in attrs:
+                self.resources['image'].append(attrs['src'].strip())
+        elif tag == 'script' and 'src' in attrs:
+            self.resources['script'].append(attrs['src'].strip())
+        if not self.breadcrumbs and re.search(r'breadcrumb', attrs.get('class', ''), re.I):
+            self.breadcrumbs = 1
+        
+        entry = {'name': tag, 'children': 0, 'string': None, 'text': None, 'scope': None, 'ld_json': False,
+                 'first': tag in ('title', 'h1') and tag not in self._firsts}
+        self._firsts.add(tag)
+        if tag == 'script' and (attrs.get('type') or '').strip().lower() == 'application/ld+json' and 'itemprop' not in attrs:
+            entry['ld_json'] = True
+        elif any(name in attrs for name in STRUCTURED_ATTRS):
+            parent = None
+            if 'itemprop' in attrs or 'property' in attrs:
+                parent = next((e['scope'] for e in reversed(self._stack) if e['scope']), None)
+            entry['scope'] = self.parser._structured_scope(self.structured, attrs, parent)
+        if tag == 'a' and 'href' in attrs:
+            self.links.append(attrs)
+            entry['text'] = []
+            self._texts.append((attrs, entry['text']))
+        elif tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            entry['text'] = []
+            self.headings.append((int(tag[1]), tag, entry['text']))
+        if tag in STREAM_EMPTY_TAGS:
+            return
+        
+        self._stack.append(entry)
+        if entry['text'] is not None:
+            self._open_text.append(entry['text'])
+        if tag in SEOAuditParser.TEXT_BLOCK_TAGS:
+            self._blocks.append(entry)
+        self._hidden += tag in STREAM_HIDDEN_TAGS
+        self._preserve += tag in STREAM_PRESERVE_TAGS
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in STREAM_EMPTY_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth]['name'] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > depth:
+            self._pop()
+
+    def _pop(self):
+        entry = self._stack.pop()
+        name = entry['name']
+        string = entry['string'] if entry['children'] == 1 else None
+        if self._stack:
+            self._stack[-1]['string'] = string
+        if entry['first']:
+            if name == 'title':
+                self.title = string
+            else:
+                self.h1_string = string
+        if entry['ld_json']:
+            self.parser._add_json_ld(self.structured, str(string or ''))
+        if entry['text'] is not None:
+            self._open_text.remove(entry['text'])
+        if self._blocks and self._blocks[-1] is entry:
+            self._blocks.pop()
+        self._hidden -= name in STREAM_HIDDEN_TAGS
+        self._preserve -= name in STREAM_PRESERVE_TAGS
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+        self._child(data)
+
+    def handle_decl(self, decl):
+        self._flush()
+        self._child(decl)
+
+    def handle_pi(self, data):
+        self._flush()
+        self._child(data)
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            data = data[len('CDATA['):]
+            self._child(data)
+            self._add_visible(data)
+        else:
+            self._child(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        while self._stack:
+            self._pop()
+        if self._block_parts:
+            self.text_blocks.append(' '.join(self._block_parts))
+            self._block_parts = []
+        for attrs, parts in self._texts:
+            attrs.text = ''.join(parts)
+        self.headings = [(level, name, ''.join(parts)[:50]) for level, name, parts in self.headings]
+        self._texts = []
+
+
+class PageContext:
+    """Входы метрик страницы: каждый считается один раз и только если его читает плагин.
+
+    text — контентный текст (без шаблонных блоков сайта, если детектор включён),
+    full_text — весь видимый текст страницы. Вместо soup может быть StreamedPage:
+    тогда links, headers, images и structured_data берутся из потокового разбора.
+    """
+
+    def __init__(self, parser, soup, url, response, text, full_text=None):
+        self.parser = parser
+        self.soup = soup
+        self.url = url
+        self.response = response
+        self.text = text
+        self.full_text = text if full_text is None else full_text
+
+    @cached_property
+    def words(self):
+        return self.text.split()
+
+    @cached_property
+    def streamed(self):
+        return isinstance(self.soup, StreamedPage)
+
+    @cached_property
+    def links(self):
+        if self.streamed:
+            return self.soup.links
+        return self.soup.find_all('a', href=True)
+
+    @cached_property
+    def headers(self):
+        return self.parser.analyze_h_hierarchy_detailed(self.soup, self.soup.headings if self.streamed else None)
+
+    @cached_property
+    def images(self):
+        return self.soup.images if self.streamed else self.soup.find_all('img')
+
+    @cached_property
+    def text_stats(self):
+        return self.parser.compute_text_stats(self.text)
+
+    @cached_property
+    def page_text(self):
+        return self.soup.get_text()
+
+    @cached_property
+    def structured_data(self):
+        if self.streamed:
+            return self.soup.structured
+        return self.parser.extract_structured_data(self.soup)
+
+    @cached_property
+    def trust_signals(self):
+        parser = self.parser
+        return {
+            'contact': parser.detect_contact_info(self.soup, self.full_text),
+            'legal': parser.detect_legal_docs(self.soup, self.links),
+            'author': parser.detect_author_info(self.soup, self.page_text),
+            'reviews': parser.detect_reviews(self.soup, self.page_text),
+            'badges': parser.detect_trust_badges(self.soup, self.page_text),
+        }
+
 # ==================== ОСНОВНОЙ КЛАСС ====================
 
 class SEOAuditParser:
-    def __init__(self, base_url, max_pages=50, max_depth=3):
+    def __init__(self, base_url, max_pages=50, max_depth=3, skip_duplicate_links=False, simhash_distance=3,
+                 partial_every=0, pagerank_every=25, disk_frontier=None, metrics='full',
+                 template_threshold=0, template_min_pages=20, content_cache_size=2000, crawl_order='priority',
+                 verify_links=False, link_workers=32, verify_external=False, external_workers=16,
+                 external_per_domain=2, page_weight=False, hreflang_fetch=False, shards=1, shard_id=None,
+                 shard_queue=None, shard_dir=None, remote_shards=0, page_budget=10.0,
+                 heavy_page_bytes=3_000_000, heavy_page_nodes=20_000, lemmatize=False, rules=None,
+                 sample_size=0, stream_page_bytes=3_000_000, trap_detection=True, trap_max_segments=10,
+                 trap_min_urls=200):
         """Инициализация"""
+        self.crawl_options = {name: value for name, value in locals().items() if name != 'self'}
         self.base_url = base_url if base_url.startswith(('http://', 'https://')) else f'https://{base_url}'
         self.domain = urlparse(self.base_url).netloc
         self.max_pages = max_pages
         self.max_depth = max_depth
-        self.visited = set()
-        self.to_visit = [(self.base_url, 0)]
+        self.crawl_state = None
+        self.crawl_order = crawl_order
+        score = self.crawl_priority if crawl_order == 'priority' else None
+        if disk_frontier:
+            self.crawl_state = DiskCrawlState(disk_frontier, capacity=max(100_000, max_pages * 2), score=score)
+            self.visited = self.crawl_state.visited
+            self.to_visit = self.crawl_state.queue
+        else:
+            self.visited = set()
+            self.to_visit = PriorityFrontier(score) if score else []
+        
+        # Шарды: общий фронтир у координатора и воркеров, у воркера он же — to_visit
+        self.shards = max(1, shards)
+        self.shard_id = shard_id
+        self.shard_dir = Path(shard_dir or f"{self.domain.replace('.', '_').replace(':', '_')}_shards")
+        self.remote_shards = remote_shards
+        self.shared_frontier = None
+        if self.shards > 1:
+            self.shared_frontier = open_shared_frontier(shard_queue or self.shard_dir / 'frontier.sqlite',
+                                                        f'seo:{self.domain}', self.shards)
+            if shard_id is not None:
+                self.to_visit = ShardFrontier(self.shared_frontier, shard_id, self.shards, max_pages)
         self.results = []
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        self.session.mount('http://', TimedHTTPAdapter())
+        self.session.mount('https://', TimedHTTPAdapter())
+        self.timings = []
         
         self.lightning = LightningAnimation()
         
         self.broken_links = []
         self.external_links = []
-        self.all_links = defaultdict(int)
+        self.all_links = self.crawl_state.link_counts if self.crawl_state else Counter()
         self.sitemap_urls = set()
+        self.sitemap_meta = {}
+        self.url_templates = Counter()
+        self.frontier_dropped = 0
+        
+        # Проверка ссылок по HTTP: кэш статусов общий для всех проверок аудита
+        self.verify_links = verify_links
+        self.link_workers = link_workers
+        self.link_status_cache = {}
+        self.link_checks = []
+        self._link_local = threading.local()
+        self.verify_external = verify_external
+        self.external_workers = external_workers
+        self.external_per_domain = max(1, external_per_domain)
+        self.external_checks = []
+        
+        # Редиректы: хоп → (статус, Location); каждый хоп запрашивается один раз за аудит
+        self.redirect_hops = {}
+        self.redirects = []
+        self.crawled_status = {}
+        
+        # Вес страниц: ресурсы страниц и их размеры (один HEAD на уникальный ресурс)
+        self.page_weight = page_weight
+        self.page_resources = {}
+        self.resource_sizes = {}
+        
+        # Hreflang: страница → [(язык, альтернатива)], собирается во время краулинга
+        self.hreflang_fetch = hreflang_fetch
+        self.hreflang_index = {}
+        self.hreflang_issues = []
         
         self.colors = {
             'green_light': 'C6EFCE', 'green_dark': '070000',
@@ -159,12 +2426,70 @@ class SEOAuditParser:
             'and', 'or', 'but', 'as', 'by', 'at', 'from', 'with', 'on'
         }
         
-        self.all_urls_data = {}
+        self.all_urls_data = self.crawl_state.page_texts if self.crawl_state else {}
         self.internal_links_graph = defaultdict(list)
         self.page_authority = {}
         self.page_title_keywords = {}
         self.topic_clusters = {}
         self.robots = None
+        
+        self.skip_duplicate_links = skip_duplicate_links
+        self.simhash_index = SimHashIndex(max_distance=simhash_distance)
+        self.duplicate_groups = {}
+        
+        # Инкрементальные агрегаты сайта (обновляются по мере краулинга)
+        self.word_doc_count = defaultdict(int)
+        self.incoming_links = defaultdict(set)
+        # Ссылки на свой сайт, которые краулер не открывает (параметры, файлы): цель → страницы-источники
+        self.uncrawlable_links = defaultdict(set)
+        self.partial_every = partial_every
+        self.pagerank_every = pagerank_every
+        self.partial_report_requested = False
+        self.audit_started = datetime.now()
+        self.metric_plugins = resolve_metric_plugins(metrics)
+        self.template_detector = TemplateBlockDetector(template_threshold, template_min_pages) if template_threshold else None
+        self.template_warmup = []
+        
+        # Бюджет анализа страницы (секунды, 0 — без бюджета) и пороги тяжёлых страниц:
+        # сверх бюджета или порогов считается только быстрый профиль метрик
+        self.page_budget = page_budget
+        self.heavy_page_bytes = heavy_page_bytes
+        self.heavy_page_nodes = heavy_page_nodes
+        self.slow_pages = []
+        # Страницы больше stream_page_bytes разбираются потоково (StreamedPage), без дерева
+        self.stream_page_bytes = stream_page_bytes
+        
+        # Ключевые слова, TF-IDF и семантические связи по леммам (нужен pymorphy)
+        if lemmatize and pymorphy is None:
+            raise RuntimeError('Для --lemmatize установите pymorphy3: pip install pymorphy3')
+        self.lemmatize = lemmatize
+        self.rules_engine = RulesEngine.from_file(rules) if rules else RulesEngine()
+        
+        # Частые би- и триграммы сайта и шаблонов URL в фиксированной памяти (SpaceSaving)
+        self.site_phrases = {n: SpaceSaving(PHRASE_SITE_CAPACITY) for n in PHRASE_SIZES}
+        self.template_phrases = {}
+        self.template_pages = Counter()
+        
+        # Выборка: до sample_size проанализированных страниц на шаблон URL, остальные URL шаблона
+        # только считаются (часть — в запасе на замену URL, которые не удалось проанализировать)
+        self.sample_size = sample_size
+        self.sample_population = Counter()
+        self.sample_discovered = set()
+        self.sample_pending = {}  # URL выборки во фронтире → шаблон
+        self.sample_queued = Counter()
+        self.sample_taken = Counter()
+        self.sample_spare = defaultdict(deque)
+        
+        # Ловушки краулинга: URL и шаблоны, которые не тратят бюджет (None — проверка выключена)
+        self.trap_detector = CrawlTrapDetector(self.sample_template, trap_max_segments,
+                                               min_urls=trap_min_urls) if trap_detection else None
+        
+        # Кэш по хэшу тела ответа: байт-в-байт одинаковые страницы не парсятся повторно
+        self.content_cache = OrderedDict()
+        self.content_cache_size = content_cache_size
+        self.exact_duplicates = 0
+        
+        self.to_visit.append((self.base_url, 0))
 
     # ==================== ВСЕ 30+ ФУНКЦИИ v4.2 ====================
     
@@ -232,6 +2557,20 @@ class SEOAuditParser:
                 soup = BeautifulSoup(response.content, 'xml')
                 for loc in soup.find_all('loc'):
                     self.sitemap_urls.add(loc.text.strip())
+                for entry in soup.find_all('url'):
+                    loc = entry.find('loc')
+                    if loc is None:
+                        continue
+                    priority, lastmod = entry.find('priority'), entry.find('lastmod')
+                    try:
+                        page_priority = min(1.0, max(0.0, float(priority.text))) if priority is not None else 0.5
+                    except ValueError:
+                        page_priority = 0.5
+                    try:
+                        age_days = max(0, (datetime.now() - datetime.fromisoformat(lastmod.text.strip()[:10])).days)
+                    except (AttributeError, ValueError):
+                        age_days = None
+                    self.sitemap_meta[loc.text.strip()] = {'priority': page_priority, 'age_days': age_days}
                 return True
         except:
             pass
@@ -244,22 +2583,22 @@ class SEOAuditParser:
         viewport = soup.find('meta', {'name': 'viewport'})
         return 1 if viewport else 0
 
-    def extract_external_links(self, soup, url):
+    def extract_external_links(self, soup, url, links=None):
         external = []
-        for link in soup.find_all('a', href=True):
+        for link in links if links is not None else soup.find_all('a', href=True):
             href = link.get('href', '')
             if href.startswith('http'):
                 parsed = urlparse(href)
                 if parsed.netloc != self.domain:
                     rel = link.get('rel', [])
                     follow = 'dofollow' if 'nofollow' not in rel else 'nofollow'
-                    external.append({'url': href, 'text': link.get_text()[:50], 'follow': follow})
+                    external.append({'url': href, 'text': link.get_text()[:50], 'follow': follow, 'source_url': url})
         return external
 
-    def count_follow_nofollow(self, soup):
+    def count_follow_nofollow(self, soup, links=None):
         follow = 0
         nofollow = 0
-        for link in soup.find_all('a', href=True):
+        for link in links if links is not None else soup.find_all('a', href=True):
             rel = link.get('rel', [])
             if 'nofollow' in rel:
                 nofollow += 1
@@ -267,18 +2606,160 @@ class SEOAuditParser:
                 follow += 1
         return follow, nofollow
 
-    def check_structured_data(self, soup):
-        data = {
-            'json_ld': len(soup.find_all('script', {'type': 'application/ld+json'})),
-            'microdata': len(soup.find_all(attrs={'itemscope': True})),
-            'rdfa': len(soup.find_all(attrs={'typeof': True}))
-        }
-        return sum(data.values()), data
+    def check_structured_data(self, soup, structured=None):
+        structured = structured or self.extract_structured_data(soup)
+        data = {key: structured[key] for key in ('json_ld', 'microdata', 'rdfa', 'json_ld_errors')}
+        return data['json_ld'] + data['microdata'] + data['rdfa'], data
+
+    @staticmethod
+    def _is_structured_node(tag):
+        return ((tag.name == 'script' and (tag.get('type') or '').strip().lower() == 'application/ld+json')
+                or tag.has_attr('itemscope') or tag.has_attr('itemprop')
+                or tag.has_attr('typeof') or tag.has_attr('property'))
+
+    @staticmethod
+    def _schema_type_names(value):
+        """'https://schema.org/Product schema:Offer' → ['Product', 'Offer']"""
+        return [t.rsplit('/', 1)[-1].rsplit(':', 1)[-1] for t in value.split() if t]
+
+    def _walk_json_ld(self, node, items):
+        """Сущности верхнего уровня JSON-LD (и @graph): (тип, свойства + свойства вложенных объектов)"""
+        if isinstance(node, list):
+            for child in node:
+                self._walk_json_ld(child, items)
+            return
+        if not isinstance(node, dict):
+            return
+        if '@graph' in node:
+            self._walk_json_ld(node['@graph'], items)
+        types = node.get('@type')
+        if not types:
+            return
+        props = set()
+        for key, value in node.items():
+            if key.startswith('@'):
+                continue
+            props.add(key)
+            for child in (value if isinstance(value, list) else [value]):
+                if isinstance(child, dict):
+                    props.update(f'{key}.{sub}' for sub in child if not sub.startswith('@'))
+        for name in self._schema_type_names(' '.join(t for t in types if isinstance(t, str)) if isinstance(types, list) else str(types)):
+            items.append((name, props))
+
+    def extract_structured_data(self, soup):
+        """JSON-LD, microdata и RDFa за один обход DOM.
+
+        Возвращает счётчики блоков, items — сущности верхнего уровня
+        [(тип, множество свойств)] и types — типы всех сущностей, включая
+        вложенные (publisher: Organization). Свойства вложенных сущностей
+        (itemprop + itemscope, property + typeof, вложенные объекты JSON-LD)
+        попадают к родителю как 'offers.price'.
+        """
+        loads = orjson.loads if orjson else json.loads
+        result = {'json_ld': 0, 'microdata': 0, 'rdfa': 0, 'json_ld_errors': 0, 'types': set()}
+        items = []
+        scopes = {}  # id(тег) → сущность microdata/RDFa
+        
+        result['items'] = items
+        for tag in soup.find_all(self._is_structured_node):
+            if tag.name == 'script' and not tag.has_attr('itemprop'):
+                self._add_json_ld(result, str(tag.string or ''), loads)
+                continue
+            parent = None
+            if tag.has_attr('itemprop') or tag.has_attr('property'):
+                for ancestor in tag.parents:
+                    parent = scopes.get(id(ancestor))
+                    if parent:
+                        break
+            scope = self._structured_scope(result, tag.attrs, parent)
+            if scope:
+                scopes[id(tag)] = scope
+        return result
+
+    def _add_json_ld(self, result, text, loads=None):
+        """Блок JSON-LD: счётчик блоков (и ошибок разбора) и сущности в result['items']"""
+        loads = loads or (orjson.loads if orjson else json.loads)
+        result['json_ld'] += 1
+        try:
+            data = loads(text.strip() or 'null')
+        except ValueError:
+            result['json_ld_errors'] += 1
+            return
+        self._walk_json_ld(data, result['items'])
+        self._json_ld_types(data, result['types'])
+
+    def _json_ld_types(self, node, types):
+        """Все @type JSON-LD на любой глубине"""
+        if isinstance(node, list):
+            for child in node:
+                self._json_ld_types(child, types)
+        elif isinstance(node, dict):
+            names = node.get('@type')
+            if names:
+                types.update(self._schema_type_names(' '.join(t for t in names if isinstance(t, str))
+                                                     if isinstance(names, list) else str(names)))
+            for value in node.values():
+                if isinstance(value, (list, dict)):
+                    self._json_ld_types(value, types)
+
+    def _structured_scope(self, result, attrs, parent):
+        """Узел microdata/RDFa: свойство ближайшей родительской сущности parent и/или новая сущность.
+
+        Возвращает сущность, которую открывает узел (itemscope/typeof), иначе None.
+        """
+        microdata = 'itemscope' in attrs
+        rdfa = 'typeof' in attrs
+        prop_attr = 'itemprop' if 'itemprop' in attrs else 'property' if 'property' in attrs else None
+        if parent:
+            for name in attrs[prop_attr].split():
+                parent['props'].add(name)
+                if parent['parent']:
+                    parent['parent']['props'].add(f"{parent['via']}.{name}")
+        if not (microdata or rdfa):
+            return None
+        result['microdata' if microdata else 'rdfa'] += 1
+        scope = {'props': set(), 'parent': parent, 'via': attrs[prop_attr].split()[0] if parent else None}
+        names = self._schema_type_names(attrs.get('itemtype' if microdata else 'typeof') or '')
+        result['types'].update(names)
+        if not parent:
+            for name in names:
+                result['items'].append((name, scope['props']))
+        return scope
+
+    def schema_completeness(self, items):
+        """Тип → недостающие ключевые свойства (по самой полной сущности типа на странице)"""
+        missing = {}
+        for name, props in items:
+            required = SCHEMA_KEY_PROPERTIES.get(name, ())
+            lacking = [req for req in required if not any(alt in props for alt in req.split('|'))]
+            if name not in missing or len(lacking) < len(missing[name]):
+                missing[name] = lacking
+        return {name: lacking for name, lacking in missing.items() if lacking}
 
     def check_hreflang(self, soup):
         hreflang = soup.find_all('link', {'rel': 'alternate', 'hreflang': True})
         return len(hreflang)
 
+    def extract_hreflang(self, soup, url, links=None):
+        """Альтернативы страницы: [(язык в нижнем регистре, абсолютный URL)]"""
+        alternates = []
+        for link in links if links is not None else soup.find_all('link', {'rel': 'alternate', 'hreflang': True}):
+            href = (link.get('href') or '').strip()
+            if href:
+                alternates.append((link['hreflang'].strip().lower(), urljoin(url, href).split('#')[0]))
+        return alternates
+
+    def extract_meta_refs(self, soup):
+        """Сырые href canonical и hreflang (до urljoin): кэш по хэшу тела разрешает их для каждого URL"""
+        if isinstance(soup, StreamedPage):
+            canonical = next((link for link in soup.link_tags if 'canonical' in link.get('rel', ())), None)
+            hreflang = [link for link in soup.link_tags if 'alternate' in link.get('rel', ()) and 'hreflang' in link]
+        else:
+            canonical = soup.find('link', {'rel': 'canonical'})
+            hreflang = soup.find_all('link', {'rel': 'alternate', 'hreflang': True})
+        return (canonical.get('href') if canonical else None,
+                [{'hreflang': link['hreflang'], 'href': link.get('href')} for link in hreflang])
+
     def check_breadcrumbs(self, soup):
         breadcrumbs = soup.find_all(class_=re.compile(r'breadcrumb', re.I))
         return 1 if breadcrumbs else 0
@@ -302,8 +2783,8 @@ class SEOAuditParser:
         cache_control = response.headers.get('Cache-Control', '')
         return cache_control if cache_control else 'not set'
 
-    def analyze_images_optimization(self, soup):
-        images = soup.find_all('img')
+    def analyze_images_optimization(self, soup, images=None):
+        images = images if images is not None else soup.find_all('img')
         issues = {
             'no_alt': 0,
             'no_width_height': 0,
@@ -333,27 +2814,29 @@ class SEOAuditParser:
                 return None
         return None
 
-    def detect_broken_internal_links(self, soup, page_url):
+    def detect_broken_internal_links(self, soup, page_url, hrefs=None):
         broken = []
-        for link in soup.find_all('a', href=True):
-            href = link.get('href', '')
+        if hrefs is None:
+            hrefs = [link.get('href', '') for link in soup.find_all('a', href=True)]
+        for href in hrefs:
             if href.startswith('/') or href.startswith(self.base_url):
                 try:
                     full_url = urljoin(page_url, href)
                     if urlparse(full_url).netloc == self.domain:
-                        self.all_links[full_url] += 1
+                        self.all_links.update((full_url,))
                 except:
                     broken.append(href)
         return broken
 
-    def analyze_h_hierarchy_detailed(self, soup):
+    def analyze_h_hierarchy_detailed(self, soup, headers=None):
         """Анализирует иерархию заголовков И ВОЗВРАЩАЕТ ДЕТАЛИ"""
-        headers = []
-        h_elements = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-        for h in h_elements:
-            level = int(h.name[1])
-            text = h.get_text()[:50]
-            headers.append((level, h.name, text))
+        if headers is None:
+            headers = []
+            h_elements = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+            for h in h_elements:
+                level = int(h.name[1])
+                text = h.get_text()[:50]
+                headers.append((level, h.name, text))
         
         errors = []
         details = {
@@ -391,38 +2874,15 @@ class SEOAuditParser:
         
         return 'Good', [], details
 
-    def collect_all_issues(self, soup, text, h_errors):
-        issues = []
-        if h_errors:
-            issues.extend(h_errors)
-        
-        h1_count = len(soup.find_all('h1'))
-        if h1_count != 1:
-            issues.append(f'⚠️ H1: {h1_count} (нужно 1)')
-        
-        title_len = len(soup.title.string) if soup.title else 0
-        if title_len < 30 or title_len > 60:
-            issues.append(f'⚠️ Title: {title_len} (30-60)')
-        
-        words = len(text.split())
-        if words < 300:
-            issues.append(f'❌ Текст: {words} (нужно 300+)')
-        
-        unique = self.calculate_unique_percent(text)
-        if unique < 50:
-            issues.append(f'❌ Уник: {unique:.0f}% (50%+)')
-        
-        return issues[:10] if issues else ['✅ OK']
-
     def analyze_heading_distribution(self, soup):
         dist = {}
         for tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
             dist[tag] = len(soup.find_all(tag))
         return dist
 
-    def calculate_content_density(self, soup, text):
+    def calculate_content_density(self, soup, text, page_text=None):
         text_words = len(text.split())
-        total_words = len(soup.get_text().split())
+        total_words = len((page_text if page_text is not None else soup.get_text()).split())
         return round(text_words / total_words * 100, 2) if total_words > 0 else 0
 
     def detect_keyword_stuffing(self, text):
@@ -462,10 +2922,10 @@ class SEOAuditParser:
         patterns = [r'!!!', r'\$\$\$', r'>>>', r'click here', r'best price']
         return sum(len(re.findall(p, text.lower())) for p in patterns)
 
-    def calculate_toxicity_score(self, text):
-        stuffing = self.detect_keyword_stuffing(text)
-        ai = self.detect_ai_markers(text)
-        filler = self.count_filler_phrases(text)
+    def calculate_toxicity_score(self, text, stuffing=None, ai=None, filler=None):
+        stuffing = self.detect_keyword_stuffing(text) if stuffing is None else stuffing
+        ai = self.detect_ai_markers(text) if ai is None else ai
+        filler = self.count_filler_phrases(text) if filler is None else filler
         spam = self.detect_spam_indicators(text)
         raw_score = (stuffing * 2 + min(ai * 3, 30) + filler * 5 + spam * 10)
         return round(min(100, raw_score), 1)
@@ -491,9 +2951,12 @@ class SEOAuditParser:
         words = [w for w in text.split() if w.isalpha()]
         return sum(len(w) for w in words) / len(words) if words else 0
 
+    VOWELS = 'аеиоуыэюяAEIOUYaeiou'
+    DELETE_VOWELS = str.maketrans('', '', VOWELS)
+
     def count_complex_words(self, text):
         def syllables(word):
-            vowels = 'аеиоуыэюяAEIOUYaeiou'
+            vowels = self.VOWELS
             return sum(1 for c in word if c in vowels) or 1
         words = text.split()
         complex_count = sum(1 for w in words if syllables(w) > 3)
@@ -503,35 +2966,44 @@ class SEOAuditParser:
         patterns = [r'\+7\d{10}', r'\+\d+\s?\(\d+\)', r'\b[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}\b']
         return 1 if any(re.search(p, text) for p in patterns) else 0
 
-    def detect_legal_docs(self, soup):
+    def detect_legal_docs(self, soup, links=None):
         keywords = ['политика', 'условия', 'privacy', 'terms', 'о нас', 'контакты']
-        for link in soup.find_all('a', href=True):
+        for link in links if links is not None else soup.find_all('a', href=True):
             if any(kw in link.get_text().lower() for kw in keywords):
                 return 1
         return 0
 
-    def detect_author_info(self, soup):
+    def detect_author_info(self, soup, page_text=None):
         if soup.find('meta', {'name': 'author'}):
             return 1
-        if re.search(r'автор:|написано:|by\s', soup.get_text(), re.I):
+        if re.search(r'автор:|написано:|by\s', page_text if page_text is not None else soup.get_text(), re.I):
             return 1
         return 0
 
-    def detect_reviews(self, soup):
-        if re.search(r'отзывы|рейтинг|review|rating|★|⭐', soup.get_text(), re.I):
+    def detect_reviews(self, soup, page_text=None):
+        if re.search(r'отзывы|рейтинг|review|rating|★|⭐', page_text if page_text is not None else soup.get_text(), re.I):
             return 1
         return 0
 
-    def detect_trust_badges(self, soup):
+    def detect_trust_badges(self, soup, page_text=None):
         keywords = ['verified', 'trusted', 'certified', 'award', 'проверено']
-        return sum(len(re.findall(kw, soup.get_text().lower())) for kw in keywords)
-
-    def calculate_trust_score(self, soup, text):
-        contact = self.detect_contact_info(soup, text)
-        legal = self.detect_legal_docs(soup)
-        author = self.detect_author_info(soup)
-        reviews = self.detect_reviews(soup)
-        badges = min(1, self.detect_trust_badges(soup) / 3)
+        page_text = (page_text if page_text is not None else soup.get_text()).lower()
+        return sum(len(re.findall(kw, page_text)) for kw in keywords)
+
+    def calculate_trust_score(self, soup, text, signals=None):
+        if signals is None:
+            signals = {
+                'contact': self.detect_contact_info(soup, text),
+                'legal': self.detect_legal_docs(soup),
+                'author': self.detect_author_info(soup),
+                'reviews': self.detect_reviews(soup),
+                'badges': self.detect_trust_badges(soup),
+            }
+        contact = signals['contact']
+        legal = signals['legal']
+        author = signals['author']
+        reviews = signals['reviews']
+        badges = min(1, signals['badges'] / 3)
         return round(min(100, (contact + legal + author + reviews + badges) * 20), 1)
 
     def count_ctas(self, soup):
@@ -553,21 +3025,22 @@ class SEOAuditParser:
     def count_dom_nodes(self, soup):
         return len(soup.find_all(True))
 
+    SEMANTIC_TAGS = ('header', 'nav', 'main', 'article', 'section', 'aside', 'footer')
+
     def count_semantic_tags(self, soup):
-        semantic = ['header', 'nav', 'main', 'article', 'section', 'aside', 'footer']
-        return sum(len(soup.find_all(tag)) for tag in semantic)
+        return sum(len(soup.find_all(tag)) for tag in self.SEMANTIC_TAGS)
 
     def detect_deprecated_tags(self, soup):
         deprecated = ['font', 'center', 'marquee', 'blink', 'strike', 'u', 'tt', 'applet', 'basefont']
         return sum(len(soup.find_all(tag)) for tag in deprecated)
 
-    def calculate_html_quality_score(self, soup):
+    def calculate_html_quality_score(self, soup, dom_nodes=None, deprecated=None):
         score = 100
-        if self.count_dom_nodes(soup) > 1200:
+        if (self.count_dom_nodes(soup) if dom_nodes is None else dom_nodes) > 1200:
             score -= 20
         if len(soup.find_all('script', {'src': False})) > 5:
             score -= 10
-        if self.detect_deprecated_tags(soup) > 0:
+        if (self.detect_deprecated_tags(soup) if deprecated is None else deprecated) > 0:
             score -= 15
         return max(0, score)
 
@@ -599,6 +3072,149 @@ class SEOAuditParser:
         top_20 = sum(count for _, count in Counter(filtered).most_common(20))
         return round(top_20 / len(filtered) * 100, 2)
 
+    def compute_text_stats(self, text):
+        """Читаемость и лексические метрики страницы: NumPy-ядро или построчные функции"""
+        if np is not None:
+            return self._text_stats_numpy(text)
+        return {
+            'unique_percent': self.calculate_unique_percent(text),
+            'boilerplate_percent': self.calculate_boilerplate(text),
+            'readability_score': self.analyze_readability(text),
+            'avg_sentence_length': self.get_avg_sentence_length(text),
+            'avg_word_length': self.get_avg_word_length(text),
+            'complex_words_percent': self.count_complex_words(text),
+        }
+
+    def _text_stats_numpy(self, text):
+        """Те же формулы, что в analyze_readability / count_complex_words / calculate_unique_percent
+        и т.д., но токены кодируются в массивы один раз: свойства слов (длина, гласные, isalpha,
+        стоп-слово) считаются по словарю страницы, а не по каждому вхождению.
+        """
+        words = text.split()
+        n = len(words)
+        sentences = sum(1 for s in text.split('.') if s.strip())
+        if not n:
+            return {'unique_percent': 0, 'boilerplate_percent': 0, 'readability_score': None,
+                    'avg_sentence_length': 0, 'avg_word_length': 0, 'complex_words_percent': 0}
+        
+        vocab_ids = {}
+        token_ids = np.fromiter((vocab_ids.setdefault(w, len(vocab_ids)) for w in words), dtype=np.int64, count=n)
+        vocab = list(vocab_ids)
+        size = len(vocab)
+        length = np.fromiter(map(len, vocab), dtype=np.int64, count=size)
+        consonants = np.fromiter((len(w.translate(self.DELETE_VOWELS)) for w in vocab), dtype=np.int64, count=size)
+        alpha = np.fromiter(map(str.isalpha, vocab), dtype=bool, count=size)
+        
+        lower_ids = {}
+        lower_of = np.fromiter((lower_ids.setdefault(w.lower(), len(lower_ids)) for w in vocab), dtype=np.int64, count=size)
+        lower_vocab = list(lower_ids)
+        lower_size = len(lower_vocab)
+        lower_len = np.fromiter(map(len, lower_vocab), dtype=np.int64, count=lower_size)
+        lower_alpha = np.fromiter(map(str.isalpha, lower_vocab), dtype=bool, count=lower_size)
+        lower_stop = np.fromiter((w in self.stop_words for w in lower_vocab), dtype=bool, count=lower_size)
+        
+        token_len = length[token_ids]
+        total_len = int(token_len.sum())
+        token_alpha = alpha[token_ids]
+        alpha_count = int(token_alpha.sum())
+        syllables = np.maximum(length - consonants, 1)
+        complex_count = int((syllables[token_ids] > 3).sum())
+        
+        token_lower = lower_of[token_ids]
+        unique_sel = token_lower[(lower_alpha & (lower_len > 2))[token_lower]]
+        boiler_sel = token_lower[(lower_alpha & (lower_len > 3) & ~lower_stop)[token_lower]]
+        
+        readability = None
+        if n >= 10 and sentences >= 2:
+            avg_words = n / sentences
+            avg_len = total_len / n
+            score = 206.835 - (1.3 * avg_words) - (60.1 * (avg_len / 5.5))
+            readability = max(0, min(100, score))
+        
+        boilerplate = 0
+        if boiler_sel.size >= 20:
+            top_20 = int(np.sort(np.bincount(boiler_sel))[-20:].sum())
+            boilerplate = round(top_20 / boiler_sel.size * 100, 2)
+        
+        return {
+            'unique_percent': round(np.unique(unique_sel).size / unique_sel.size * 100, 2) if unique_sel.size else 0,
+            'boilerplate_percent': boilerplate,
+            'readability_score': readability,
+            'avg_sentence_length': n / sentences if sentences else 0,
+            'avg_word_length': int(token_len[token_alpha].sum()) / alpha_count if alpha_count else 0,
+            'complex_words_percent': round(complex_count / n * 100, 2),
+        }
+
+    def compute_simhash(self, text, bits=64):
+        """SimHash по шинглам из 3 слов: похожие тексты дают близкие отпечатки"""
+        words = [w for w in text.lower().split() if w.isalnum()]
+        if len(words) < 3:
+            shingles = [' '.join(words)] if words else []
+        else:
+            shingles = [' '.join(words[i:i + 3]) for i in range(len(words) - 2)]
+        if not shingles:
+            return 0
+        counts = [0] * bits
+        total = 0
+        for shingle, weight in Counter(shingles).items():
+            h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=bits // 8).digest(), 'big')
+            total += weight
+            for bit in range(bits):
+                if h >> bit & 1:
+                    counts[bit] += weight
+        return sum(1 << bit for bit, count in enumerate(counts) if count * 2 > total)
+
+    def register_simhash(self, result):
+        """Добавляет страницу в индекс и возвращает URL уже виденного почти-дубля"""
+        fingerprint = result.get('simhash')
+        if fingerprint is None:
+            return None
+        near = self.simhash_index.find_near(fingerprint, exclude=result['url'])
+        self.simhash_index.add(result['url'], fingerprint)
+        return near[0][0] if near else None
+
+    def detect_near_duplicates(self):
+        """Группирует почти-дубли (union-find поверх SimHash индекса)"""
+        parent = {r['url']: r['url'] for r in self.results}
+        
+        def find(url):
+            while parent[url] != url:
+                parent[url] = parent[parent[url]]
+                url = parent[url]
+            return url
+        
+        nearest = {}
+        for result in self.results:
+            url = result['url']
+            if result.get('simhash') is None:
+                continue
+            near = [(u, d) for u, d in self.simhash_index.find_near(result['simhash'], exclude=url) if u in parent]
+            if not near:
+                continue
+            nearest[url] = near[0]
+            for other, _ in near:
+                root_a, root_b = find(url), find(other)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+        
+        members = defaultdict(list)
+        for url in nearest:
+            members[find(url)].append(url)
+        
+        self.duplicate_groups = {}
+        group_of = {}
+        for group_id, urls in enumerate(sorted(members.values(), key=len, reverse=True), 1):
+            self.duplicate_groups[group_id] = urls
+            for url in urls:
+                group_of[url] = group_id
+        
+        for result in self.results:
+            url = result['url']
+            result['duplicate_group'] = group_of.get(url)
+            near_url, distance = nearest.get(url, ('', None))
+            result['nearest_duplicate_url'] = near_url
+            result['nearest_duplicate_distance'] = distance
+
     def count_og_tags(self, soup):
         return len(soup.find_all('meta', property=re.compile(r'^og:', re.I)))
 
@@ -606,38 +3222,42 @@ class SEOAuditParser:
         scripts = len(soup.find_all('script'))
         return 'High' if scripts > 10 else 'Medium' if scripts > 5 else 'Low'
 
-    def calculate_eeat_score(self, soup, text):
-        exp = self._score_expertise(soup, text)
-        auth = self._score_authoritativeness(soup, text)
-        trust = self._score_trustworthiness(soup, text)
-        exp_score = self._score_experience(soup, text)
+    def calculate_eeat_score(self, soup, text, components=None):
+        if components is None:
+            components = self.analyze_eeat_components(soup, text)
+        exp = components['expertise']
+        auth = components['authoritativeness']
+        trust = components['trustworthiness']
+        exp_score = components['experience']
         weights = {'expertise': 0.25, 'authoritativeness': 0.30, 'trustworthiness': 0.35, 'experience': 0.10}
         return round(exp * weights['expertise'] + auth * weights['authoritativeness'] + trust * weights['trustworthiness'] + exp_score * weights['experience'], 1)
 
-    def _score_expertise(self, soup, text):
+    def _score_expertise(self, soup, text, signals=None):
         score = 0
-        if self.detect_author_info(soup):
+        if signals['author'] if signals else self.detect_author_info(soup):
             score += 30
         score += min(20, len(re.findall(r'\[\d+\]', text)) * 2)
         if re.search(r'PhD|Doctorate|Специалист|Эксперт', text):
             score += 15
         return min(100, score)
 
-    def _score_authoritativeness(self, soup, text):
+    def _score_authoritativeness(self, soup, text, links=None, structured=None):
         score = 0
-        if soup.find('script', string=re.compile(r'Organization', re.I)):
+        structured = structured or self.extract_structured_data(soup)
+        if any('Organization' in name for name in structured['types']):
             score += 25
-        external = len([a for a in soup.find_all('a', href=True) if urlparse(a.get('href', '')).netloc != self.domain and a.get('href', '').startswith('http')])
+        links = links if links is not None else soup.find_all('a', href=True)
+        external = len([a for a in links if urlparse(a.get('href', '')).netloc != self.domain and a.get('href', '').startswith('http')])
         score += min(30, external * 2)
         return min(100, score)
 
-    def _score_trustworthiness(self, soup, text):
+    def _score_trustworthiness(self, soup, text, signals=None):
         score = 0
-        if self.detect_contact_info(soup, text):
+        if signals['contact'] if signals else self.detect_contact_info(soup, text):
             score += 20
-        if self.detect_legal_docs(soup):
+        if signals['legal'] if signals else self.detect_legal_docs(soup):
             score += 20
-        if self.detect_reviews(soup):
+        if signals['reviews'] if signals else self.detect_reviews(soup):
             score += 20
         score += 15
         return min(100, score)
@@ -650,62 +3270,47 @@ class SEOAuditParser:
             score += 25
         return min(100, score)
 
-    def analyze_eeat_components(self, soup, text):
+    def analyze_eeat_components(self, soup, text, signals=None, links=None, structured=None):
         return {
-            'expertise': self._score_expertise(soup, text),
-            'authoritativeness': self._score_authoritativeness(soup, text),
-            'trustworthiness': self._score_trustworthiness(soup, text),
+            'expertise': self._score_expertise(soup, text, signals),
+            'authoritativeness': self._score_authoritativeness(soup, text, links, structured),
+            'trustworthiness': self._score_trustworthiness(soup, text, signals),
             'experience': self._score_experience(soup, text)
         }
 
-    def calculate_site_health_scores(self):
-        for result in self.results:
-            tech = self._calculate_tech_health(result)
-            content = self._calculate_content_health(result)
-            trust = result.get('trust_score', 0)
-            seo = self._calculate_seo_health(result)
-            weights = {'tech': 0.25, 'content': 0.40, 'trust': 0.20, 'seo': 0.15}
-            result['site_health_score'] = round(tech * weights['tech'] + content * weights['content'] + trust * weights['trust'] + seo * weights['seo'], 1)
-
-    def _calculate_tech_health(self, result):
-        score = 100
-        if result['html_quality_score'] < 70:
-            score -= 15
-        if result['dom_nodes'] > 1200:
-            score -= 10
-        return max(0, score)
-
-    def _calculate_content_health(self, result):
-        score = 100
-        if result['words_count'] < 300:
-            score -= 20
-        if result['readability_score'] and result['readability_score'] < 40:
-            score -= 15
-        if result['unique_percent'] < 50:
-            score -= 20
-        if result['toxicity_score'] > 50:
-            score -= 25
-        return max(0, score)
+    def rule_availability(self):
+        """Поле → маска страниц, для которых его плагин считался (для RulesEngine)"""
+        available = {}
+        skipped = any(result.get('analysis_skipped') for result in self.results)
+        for name, plugin in METRIC_PLUGINS.items():
+            if name not in self.metric_plugins:
+                mask = [False] * len(self.results)
+            elif skipped:
+                mask = [name not in result.get('analysis_skipped', ()) for result in self.results]
+            else:
+                continue
+            for field in plugin['outputs']:
+                available[field] = mask
+        for stage, (_, fields) in SITE_STAGES.items():
+            if not self.site_stage_enabled(stage):
+                for field in fields:
+                    available[field] = [False] * len(self.results)
+        return available
 
-    def _calculate_seo_health(self, result):
-        score = 100
-        if result['h1_count'] != 1:
-            score -= 25
-        if result['h_hierarchy'] != 'Good':
-            score -= 15
-        if result['title_len'] < 30 or result['title_len'] > 60:
-            score -= 10
-        if result['canonical'] == 0:
-            score -= 10
-        return max(0, score)
+    def calculate_site_health_scores(self):
+        """Health score и проблемы страниц по правилам (RulesEngine)"""
+        outputs = list(self.rules_engine.rules['composites'])
+        if 'issues' in self.metric_plugins:
+            outputs += list(self.rules_engine.rules['issues'])
+        self.rules_engine.apply(self.results, outputs, self.rule_availability())
 
     def extract_top_keywords(self, text):
-        words = text.lower().split()
+        words = self.page_terms(text)
         filtered = [w for w in words if w.isalpha() and len(w) > 3 and w not in self.stop_words]
         return Counter(filtered).most_common(10)
 
     def get_keyword_density_profile(self, text):
-        words = text.lower().split()
+        words = self.page_terms(text)
         if not words:
             return {}
         profile = {}
@@ -718,15 +3323,11 @@ class SEOAuditParser:
     def _calculate_tf_idf(self):
         if not self.all_urls_data:
             return
-        word_doc_count = defaultdict(int)
-        for text in self.all_urls_data.values():
-            for word in set(text.lower().split()):
-                if len(word) > 3:
-                    word_doc_count[word] += 1
+        word_doc_count = self.word_doc_count
         total_docs = len(self.all_urls_data)
         for result in self.results:
             text = self.all_urls_data.get(result['url'], '')
-            words = text.lower().split()
+            words = self.page_terms(text)
             tf_idf = {}
             for word, freq in Counter(words).most_common(20):
                 if len(word) > 3:
@@ -737,32 +3338,37 @@ class SEOAuditParser:
                         tf_idf[word] = round(score, 4)
             result['tf_idf_keywords'] = dict(sorted(tf_idf.items(), key=lambda x: x[1], reverse=True)[:10])
 
-    def _calculate_internal_pagerank(self):
-        for url in self.visited:
-            self.page_authority[url] = 1.0
-        for _ in range(10):
+    def update_pagerank(self, max_iterations=10, tolerance=1e-4):
+        """PageRank с тёплым стартом: итерации продолжаются от прошлых значений"""
+        authority = {url: self.page_authority.get(url, 1.0) for url in self.visited}
+        for _ in range(max_iterations):
             new_authority = {}
-            for url in self.visited:
+            delta = 0
+            for url in authority:
                 rank = 0.15
-                for source, targets in self.internal_links_graph.items():
-                    if url in targets and len(targets) > 0:
-                        rank += 0.85 * (self.page_authority.get(source, 1.0) / len(targets))
+                for source in self.incoming_links.get(url, ()):
+                    rank += 0.85 * (authority.get(source, 1.0) / len(self.internal_links_graph[source]))
                 new_authority[url] = rank
-            self.page_authority = new_authority
+                delta = max(delta, abs(rank - authority[url]))
+            authority = new_authority
+            if delta < tolerance:
+                break
+        self.page_authority = authority
+
+    def _calculate_internal_pagerank(self):
+        self.update_pagerank(max_iterations=50)
         for result in self.results:
             url = result['url']
             result['page_authority'] = round(self.page_authority.get(url, 0), 2)
-            incoming = sum(1 for targets in self.internal_links_graph.values() if url in targets)
+            incoming = len(self.incoming_links.get(url, ()))
             result['incoming_links_count'] = incoming
-            if incoming == 0 and url != self.base_url:
-                result['is_orphan'] = True
+            result['is_orphan'] = incoming == 0 and url != self.base_url
 
     def build_semantic_linking_map(self):
         for result in self.results:
             title_str = result.get('title', '') or ''
             h1_str = result.get('h1_text', '') or ''
-            title = (title_str + ' ' + h1_str).lower()
-            title_words = [w for w in title.split() if len(w) > 3 and w.isalpha()]
+            title_words = [w for w in self.page_terms(title_str + ' ' + h1_str) if len(w) > 3 and w.isalpha()]
             self.page_title_keywords[result['url']] = title_words[:5]
         for result in self.results:
             url = result['url']
@@ -804,6 +3410,10 @@ class SEOAuditParser:
                 result['anchor_text_quality_score'] = 0
 
     def cluster_by_topics(self):
+        self.topic_clusters = {}
+        for result in self.results:
+            result['is_topic_hub'] = False
+            result['topic_cluster'] = None
         page_topics = {}
         for r in self.results:
                 topics = r.get('tf_idf_keywords', {})
@@ -834,53 +3444,846 @@ class SEOAuditParser:
                     result['topic_cluster'] = cluster_name
 
     def calculate_linking_quality_score(self):
+        """Оценки со store (по умолчанию — качество перелинковки) по правилам (RulesEngine)"""
+        outputs = [name for name, spec in self.rules_engine.rules['scores'].items() if spec.get('store')]
+        self.rules_engine.apply(self.results, outputs, self.rule_availability())
+
+    # ==================== ПРОВЕРКА ССЫЛОК ====================
+
+    # На эти ответы HEAD часто отдаёт не то же, что GET — перепроверяем GET
+    HEAD_FALLBACK_STATUSES = {400, 403, 405, 501}
+
+    def _link_check_session(self):
+        """Своя Session на поток проверки (requests.Session не потокобезопасна)"""
+        session = getattr(self._link_local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.session.headers)
+            self._link_local.session = session
+        return session
+
+    def check_url_status(self, url, timeout=10, session=None):
+        """HEAD (GET при ошибке или HEAD_FALLBACK_STATUSES) с кэшем: статус, финальный URL, цепочка редиректов"""
+        cached = self.link_status_cache.get(url)
+        if cached is not None:
+            return cached
+        session = session or self._link_check_session()
+        record = {'url': url, 'status': None, 'final_url': url, 'chain': [], 'error': ''}
+        try:
+            try:
+                response = session.head(url, timeout=timeout, allow_redirects=True)
+            except requests.RequestException:
+                response = None
+            if response is None or response.status_code in self.HEAD_FALLBACK_STATUSES:
+                response = session.get(url, timeout=timeout, allow_redirects=True, stream=True)
+                response.close()
+            record['status'] = response.status_code
+            record['final_url'] = response.url
+            record['chain'] = [(hop.url, hop.status_code) for hop in response.history]
+            for hop in response.history:
+                self.redirect_hops[hop.url] = (hop.status_code, urljoin(hop.url, hop.headers.get('location', '')))
+        except requests.RequestException as e:
+            record['error'] = type(e).__name__
+        self.link_status_cache[url] = record
+        return record
+
+    def verify_internal_links(self):
+        """Проверяет все уникальные цели внутренних ссылок, которые краулер не открыл.
+
+        Статусы просканированных страниц берутся из результатов, остальные
+        цели (включая ссылки с параметрами и на файлы) проверяются параллельно
+        (link_workers потоков). Битые ссылки с их страницами-источниками
+        попадают в broken_links.
+        """
+        crawled = {r['url'].split('#')[0]: r['status'] for r in self.results}
+        links = dict(self.uncrawlable_links)
+        links.update(self.incoming_links)
+        targets = [url for url in links if url not in crawled]
+        to_check = []
+        for url in targets:
+            if url in self.link_status_cache:
+                continue
+            if self.is_url_allowed(url):
+                to_check.append(url)
+            else:
+                self.link_status_cache[url] = {'url': url, 'status': None, 'final_url': url,
+                                               'chain': [], 'error': 'robots.txt'}
+        
+        with ThreadPoolExecutor(max_workers=self.link_workers) as pool:
+            for done, _ in enumerate(pool.map(self.check_url_status, to_check), 1):
+                if done % 50 == 0:
+                    self.lightning.update_status(f'🔗 Проверено ссылок: {done}/{len(to_check)}')
+        
+        self.link_checks = []
+        broken_per_page = Counter()
+        for url, sources in links.items():
+            if url in crawled:
+                record = {'url': url, 'status': crawled[url], 'final_url': url, 'chain': [], 'error': ''}
+            else:
+                record = self.link_status_cache[url]
+            broken = (record['status'] or 0) >= 400 or (record['status'] is None and record['error'] != 'robots.txt')
+            check = dict(record, crawled=url in crawled, broken=broken, sources=sorted(sources))
+            self.link_checks.append(check)
+            if broken:
+                self.broken_links.append(check)
+                broken_per_page.update(sources)
+        for result in self.results:
+            result['broken_outgoing_links'] = broken_per_page[result['url']]
+        return len(to_check)
+
+    # ==================== РЕДИРЕКТЫ И CANONICAL ====================
+
+    def fetch_page(self, url, max_hops=10):
+        """GET с ручным следованием редиректам через кэш хопов redirect_hops.
+
+        Возвращает (response, chain, final_url, error). chain — [(url, статус)]
+        пройденных редиректов. response = None, если финальный URL уже
+        просканирован, внешний, закрыт в robots.txt или цепочка зациклилась.
+        """
+        chain = []
+        current = url
+        while True:
+            if chain:
+                if urlparse(current).netloc != self.domain:
+                    return None, chain, current, 'external'
+                if current in self.visited:
+                    return None, chain, current, ''
+                if not self.is_url_allowed(current):
+                    return None, chain, current, 'robots.txt'
+            hop = self.redirect_hops.get(current)
+            if hop is None:
+                response = self.timed_get(current, 'page')
+                if not response.is_redirect:
+                    return response, chain, current, ''
+                response.timing['kind'] = 'redirect'
+                hop = (response.status_code, urljoin(current, response.headers['location']).split('#')[0])
+                self.redirect_hops[current] = hop
+            chain.append((current, hop[0]))
+            current = hop[1]
+            if any(current == hop_url for hop_url, _ in chain):
+                return None, chain, current, 'loop'
+            if len(chain) >= max_hops:
+                return None, chain, current, 'too many redirects'
+
+    def _remember_redirect(self, url, chain, final_url, response, error):
+        """Запоминает редирект краулинга и кладёт его в общий кэш статусов ссылок"""
+        self.redirects.append({'url': url, 'chain': chain, 'final_url': final_url, 'error': error})
+        if response is not None:
+            status = response.status_code
+        else:
+            status = self.crawled_status.get(final_url)
+        if error != 'external':
+            self.link_status_cache[url] = {'url': url, 'status': status, 'final_url': final_url,
+                                           'chain': chain, 'error': error}
+
+    def _target_status(self, url):
+        """(статус, цепочка редиректов, ошибка) цели из краулинга или кэша проверок ссылок"""
+        if url in self.crawled_status:
+            return self.crawled_status[url], [], ''
+        record = self.link_status_cache.get(url)
+        if record is None:
+            return None, [], 'not checked'
+        return record['status'], record['chain'], record['error']
+
+    def _may_check(self, url):
+        """Можно ли запросить URL ради проверки: свой сайт — с --verify-links, чужой — с --verify-external"""
+        if urlparse(url).netloc == self.domain:
+            return self.verify_links
+        return self.verify_external
+
+    def analyze_redirects_and_canonicals(self):
+        """Ищет многохоповые цепочки и петли редиректов и canonical на редирект, 4xx/5xx,
+        noindex, закрытые в robots.txt или сами канонизированные на другой URL страницы.
+
+        Неизвестные краулингу цели запрашиваются только с --verify-links (свои)
+        и --verify-external (чужие), иначе остаются непроверенными.
+        Возвращает (проблемных редиректов, страниц с проблемным canonical).
+        """
+        by_url = {r['url']: r for r in self.results}
+        for redirect in self.redirects:
+            final_url = redirect['final_url']
+            final_status = self.crawled_status.get(final_url)
+            if final_status is None and redirect['error'] in ('', 'external'):
+                record = self.link_status_cache.get(final_url)
+                if record is None and self._may_check(final_url):
+                    record = self.check_url_status(final_url)
+                final_status = record['status'] if record else None
+            redirect['final_status'] = final_status
+            redirect['sources'] = sorted(self.incoming_links.get(redirect['url'], ()))
+            if redirect['error'] in ('loop', 'too many redirects'):
+                redirect['issue'] = '❌ Петля редиректов' if redirect['error'] == 'loop' else '❌ Слишком длинная цепочка'
+            elif final_status is not None and final_status >= 400:
+                redirect['issue'] = f'❌ Редирект на {final_status}'
+            elif redirect['error'] == 'robots.txt':
+                redirect['issue'] = '⚠️ Редирект на закрытый в robots.txt URL'
+            elif len(redirect['chain']) > 1:
+                redirect['issue'] = f"⚠️ Цепочка из {len(redirect['chain'])} редиректов"
+            else:
+                redirect['issue'] = ''
+        
+        targets = {r['canonical_url'] for r in self.results if r['canonical_url'] and r['canonical_url'] != r['url']}
+        unknown = [url for url in targets if url not in self.crawled_status and url not in self.link_status_cache
+                   and self._may_check(url) and self.is_url_allowed(url)]
+        with ThreadPoolExecutor(max_workers=self.link_workers) as pool:
+            list(pool.map(self.check_url_status, unknown))
+        
+        canonical_issues = 0
+        for result in self.results:
+            target = result['canonical_url']
+            if not target:
+                continue
+            if target == result['url']:
+                result['canonical_status'] = result['status']
+                continue
+            if not self.is_url_allowed(target):
+                status, chain, error = None, [], 'robots.txt'
+            else:
+                status, chain, error = self._target_status(target)
+            result['canonical_status'] = status
+            target_result = by_url.get(target)
+            if error == 'robots.txt':
+                issue = '❌ Canonical на закрытый в robots.txt URL'
+            elif error == 'not checked':
+                issue = ''
+            elif status is None:
+                issue = f'❌ Canonical недоступен ({error})'
+            elif chain:
+                issue = f'❌ Canonical на редирект ({chain[0][1]})'
+            elif status >= 400:
+                issue = f'❌ Canonical на {status}'
+            elif target_result and 'noindex' in str(target_result['meta_robots']).lower():
+                issue = '❌ Canonical на noindex'
+            elif target_result and target_result['canonical_url'] not in ('', target):
+                issue = '⚠️ Цепочка canonical'
+            else:
+                issue = ''
+            result['canonical_issue'] = issue
+            if issue:
+                canonical_issues += 1
+        return sum(1 for r in self.redirects if r['issue']), canonical_issues
+
+    def _resolve(self, host):
+        """IP хоста (один DNS запрос на домен) или None, если имя не разрешается"""
+        try:
+            return socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)[0][4][0]
+        except (OSError, UnicodeError, IndexError):
+            return None
+
+    def _check_external_lane(self, urls, max_failures=3):
+        """Проверяет URL одного домена подряд через одно keep-alive соединение.
+
+        После max_failures подряд ошибок соединения остальные URL домена
+        не запрашиваются и помечаются как недоступные.
+        """
+        session = requests.Session()
+        session.headers.update(self.session.headers)
+        session.mount('http://', PinnedHTTPAdapter())
+        session.mount('https://', PinnedHTTPAdapter())
+        failures = 0
+        try:
+            for url in urls:
+                if failures >= max_failures:
+                    self.link_status_cache[url] = {'url': url, 'status': None, 'final_url': url,
+                                                   'chain': [], 'error': 'domain unreachable'}
+                    continue
+                record = self.check_url_status(url, session=session)
+                failures = failures + 1 if record['status'] is None else 0
+        finally:
+            session.close()
+
+    def verify_external_links(self):
+        """Проверяет уникальные внешние ссылки с группировкой по доменам.
+
+        DNS разрешается один раз на домен (не разрешился — домен мёртвый,
+        его URL не запрашиваются), соединения открываются по этому IP
+        (PinnedHTTPAdapter). На домен не больше external_per_domain
+        одновременных соединений, каждое со своей keep-alive Session.
+        Возвращает множество мёртвых доменов.
+        """
+        sources = defaultdict(set)
+        for link in self.external_links:
+            sources[link['url'].split('#')[0]].add(link['source_url'])
+        by_domain = defaultdict(list)
+        for url in sources:
+            by_domain[urlparse(url).netloc.lower()].append(url)
+        
+        domains = list(by_domain)
+        hosts = [urlparse(f'//{domain}').hostname or '' for domain in domains]
+        with ThreadPoolExecutor(max_workers=self.external_workers) as pool:
+            resolved = dict(zip(domains, pool.map(self._resolve, hosts)))
+        _pinned_addresses.update((host, resolved[domain]) for domain, host in zip(domains, hosts) if resolved[domain])
+        
+        lanes = []
+        for domain in sorted(domains, key=lambda d: -len(by_domain[d])):
+            urls = [url for url in by_domain[domain] if url not in self.link_status_cache]
+            if not resolved[domain]:
+                for url in urls:
+                    self.link_status_cache[url] = {'url': url, 'status': None, 'final_url': url,
+                                                   'chain': [], 'error': 'DNS'}
+                continue
+            lane_count = min(self.external_per_domain, len(urls))
+            lanes.extend(urls[i::lane_count] for i in range(lane_count))
+        
+        with ThreadPoolExecutor(max_workers=self.external_workers) as pool:
+            for done, _ in enumerate(pool.map(self._check_external_lane, lanes), 1):
+                self.lightning.update_status(f'🌐 Проверено доменных потоков: {done}/{len(lanes)}')
+        
+        dead_domains = set()
+        for domain, urls in by_domain.items():
+            if all(self.link_status_cache[url]['status'] is None for url in urls):
+                dead_domains.add(domain)
+        
+        self.external_checks = []
+        broken_per_page = Counter()
+        for url, pages in sources.items():
+            record = self.link_status_cache[url]
+            domain = urlparse(url).netloc.lower()
+            broken = record['status'] is None or record['status'] >= 400
+            self.external_checks.append(dict(record, domain=domain, dead_domain=domain in dead_domains,
+                                             broken=broken, sources=sorted(pages)))
+            if broken:
+                broken_per_page.update(pages)
+        for result in self.results:
+            result['broken_external_links'] = broken_per_page[result['url']]
+        return dead_domains
+
+    # ==================== СЕТЕВАЯ ТЕЛЕМЕТРИЯ ====================
+
+    def timed_get(self, url, kind):
+        """GET краулера с телеметрией: DNS/connect/TLS/TTFB/загрузка/всего (мс) и размер ответа.
+
+        TTFB — ожидание первого байта после установки соединения
+        (response.elapsed без DNS/connect/TLS). Запись кладётся в
+        self.timings и в response.timing.
+        """
+        _connection_timing.dns = _connection_timing.connect = _connection_timing.tls = 0.0
+        start = time.perf_counter()
+        response = self.session.get(url, timeout=10, allow_redirects=False)
+        size = len(response.content)
+        total = time.perf_counter() - start
+        dns, connect, tls = _connection_timing.dns, _connection_timing.connect, _connection_timing.tls
+        headers_at = response.elapsed.total_seconds()
+        record = {
+            'url': url, 'kind': kind, 'template': self.url_template(url), 'status': response.status_code,
+            'dns': round(dns * 1000, 1),
+            'connect': round(connect * 1000, 1),
+            'tls': round(tls * 1000, 1),
+            'ttfb': round(max(0.0, headers_at - dns - connect - tls) * 1000, 1),
+            'download': round(max(0.0, total - headers_at) * 1000, 1),
+            'total': round(total * 1000, 1),
+            'bytes': size,
+        }
+        self.timings.append(record)
+        response.timing = record
+        return response
+
+    def _percentile(self, values, q):
+        """Перцентиль по методу ближайшего ранга"""
+        ordered = sorted(values)
+        return ordered[max(0, ceil(q / 100 * len(ordered)) - 1)]
+
+    def timing_summary(self):
+        """Перцентили и гистограммы времени ответа: весь сайт, шаблоны URL страниц, коды статуса"""
+        groups = [('Все', 'all', self.timings)]
+        by_template = defaultdict(list)
+        by_status = defaultdict(list)
+        for record in self.timings:
+            if record['kind'] == 'page':
+                by_template[record['template']].append(record)
+            by_status[record['status']].append(record)
+        groups += [('Шаблон', template, records) for template, records in sorted(by_template.items())]
+        groups += [('Статус', status, records) for status, records in sorted(by_status.items())]
+        
+        summary = []
+        for group, key, records in groups:
+            if not records:
+                continue
+            ttfb = [r['ttfb'] for r in records]
+            total = [r['total'] for r in records]
+            histogram = [0] * (len(TIMING_BUCKETS_MS) + 1)
+            for value in total:
+                histogram[sum(1 for bound in TIMING_BUCKETS_MS if value >= bound)] += 1
+            summary.append({
+                'group': group, 'key': key, 'requests': len(records),
+                'ttfb_mean': round(sum(ttfb) / len(ttfb), 1),
+                'ttfb_p50': self._percentile(ttfb, 50), 'ttfb_p90': self._percentile(ttfb, 90),
+                'ttfb_p95': self._percentile(ttfb, 95), 'ttfb_p99': self._percentile(ttfb, 99),
+                'total_p50': self._percentile(total, 50), 'total_p95': self._percentile(total, 95),
+                'bytes_mean': round(sum(r['bytes'] for r in records) / len(records)),
+                'histogram': histogram,
+            })
+        return summary
+
+    def export_timing_json(self, filename=None):
+        """Сырые тайминги каждого запроса краулера и сводка по шаблонам/статусам в JSON"""
+        if filename is None:
+            filename = f"{self.domain.replace('.', '_')}_TIMING_{self.audit_started.strftime('%Y%m%d_%H%M%S')}.json"
+        data = {
+            'domain': self.domain,
+            'audit_started': self.audit_started.isoformat(timespec='seconds'),
+            'buckets_ms': list(TIMING_BUCKETS_MS),
+            'summary': self.timing_summary(),
+            'requests': self.timings,
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        return filename
+
+    # ==================== ИНДЕКС SCHEMA.ORG ====================
+
+    def schema_type_index(self):
+        """@type → страницы, число неполных и частота недостающих ключевых свойств.
+
+        nested — страницы, где тип есть только как вложенная сущность (publisher: Organization):
+        её полнота не проверяется.
+        """
+        index = defaultdict(lambda: {'pages': [], 'incomplete': 0, 'nested': 0, 'missing': Counter()})
+        for result in self.results:
+            for name in result['schema_types']:
+                entry = index[name]
+                entry['pages'].append(result['url'])
+                lacking = result['schema_missing'].get(name)
+                if lacking:
+                    entry['incomplete'] += 1
+                    entry['missing'].update(lacking)
+            for name in result.get('schema_nested_types', ()):
+                entry = index[name]
+                entry['pages'].append(result['url'])
+                entry['nested'] += 1
+        return dict(sorted(index.items(), key=lambda item: -len(item[1]['pages'])))
+
+    def schema_template_coverage(self):
+        """Покрытие типами по шаблонам URL.
+
+        lacking — типы, которые есть на части страниц шаблона, и общесайтовые
+        типы (на половине страниц сайта и больше), которых у шаблона нет вовсе:
+        тип → число страниц шаблона без него.
+        """
+        by_template = defaultdict(list)
+        for result in self.results:
+            by_template[self.url_template(result['url'])].append(result)
+        site_counts = Counter(name for result in self.results for name in result['schema_types'])
+        site_wide = {name for name, count in site_counts.items() if count * 2 >= len(self.results)}
+        
+        coverage = []
+        for template, pages in sorted(by_template.items(), key=lambda item: -len(item[1])):
+            counts = Counter(name for result in pages for name in result['schema_types'])
+            lacking = {name: len(pages) - counts[name] for name in set(counts) | site_wide
+                       if counts[name] < len(pages)}
+            coverage.append({'template': template, 'pages': len(pages), 'types': counts, 'lacking': lacking})
+        return coverage
+
+    # ==================== HREFLANG ====================
+
+    HREFLANG_CODE = re.compile(r'^(x-default|[a-z]{2,3}(-[a-z]{4})?(-([a-z]{2}|\d{3}))?)$')
+
+    def fetch_hreflang_alternates(self, url):
+        """GET цели hreflang вне краулинга: статус, цепочка редиректов и её собственные альтернативы"""
+        session = self._link_check_session()
+        record = {'url': url, 'status': None, 'final_url': url, 'chain': [], 'error': '', 'alternates': None}
+        try:
+            response = session.get(url, timeout=10, allow_redirects=True)
+            record['status'] = response.status_code
+            record['final_url'] = response.url
+            record['chain'] = [(hop.url, hop.status_code) for hop in response.history]
+            if 'text/html' in response.headers.get('content-type', '').lower():
+                soup = BeautifulSoup(response.content, 'html.parser')
+                record['alternates'] = self.extract_hreflang(soup, response.url)
+        except requests.RequestException as e:
+            record['error'] = type(e).__name__
+        self.link_status_cache.setdefault(url, {k: record[k] for k in ('url', 'status', 'final_url', 'chain', 'error')})
+        return record
+
+    def validate_hreflang(self):
+        """Проверка кластеров hreflang за один проход по индексу (линейно по числу альтернатив).
+
+        Для каждой страницы: коды языков, ссылка на себя, x-default, конфликты
+        языков; для каждой альтернативы — статус цели и обратная ссылка.
+        Цели вне краулинга при hreflang_fetch запрашиваются параллельно,
+        иначе для них берётся только уже известный статус.
+        """
+        alternates = dict(self.hreflang_index)
+        # Просканированная страница без тегов hreflang тоже альтернатива — без обратных ссылок
+        for result in self.results:
+            if 'meta' not in result.get('analysis_skipped', ()):
+                alternates.setdefault(result['url'], [])
+        statuses = {}
+        unknown = sorted({target for links in self.hreflang_index.values() for _, target in links
+                          if target not in self.hreflang_index and target not in self.crawled_status})
+        if self.hreflang_fetch:
+            to_fetch = [url for url in unknown if urlparse(url).netloc != self.domain or self.is_url_allowed(url)]
+            with ThreadPoolExecutor(max_workers=self.link_workers) as pool:
+                for record in pool.map(self.fetch_hreflang_alternates, to_fetch):
+                    statuses[record['url']] = (record['status'], record['chain'], record['error'])
+                    if record['alternates'] is not None:
+                        alternates[record['url']] = record['alternates']
+        
+        def target_status(url):
+            if url in statuses:
+                return statuses[url]
+            if url in self.crawled_status:
+                return self.crawled_status[url], [], ''
+            record = self.link_status_cache.get(url)
+            if record:
+                return record['status'], record['chain'], record['error']
+            return None, [], 'не проверено'
+        
+        targets_of = {page: {target for _, target in links} for page, links in alternates.items()}
+        issues = []
+        for page, links in self.hreflang_index.items():
+            def issue(lang, target, text):
+                issues.append({'page': page, 'lang': lang, 'target': target, 'issue': text})
+            
+            langs = defaultdict(set)
+            for lang, target in links:
+                langs[lang].add(target)
+                if not self.HREFLANG_CODE.match(lang):
+                    issue(lang, target, '❌ Некорректный код языка')
+                if target == page:
+                    continue
+                status, chain, error = target_status(target)
+                if chain:
+                    issue(lang, target, f'❌ Альтернатива — редирект ({chain[0][1]})')
+                elif status is not None and status >= 400:
+                    issue(lang, target, f'❌ Альтернатива отдаёт {status}')
+                elif status is None and error != 'не проверено':
+                    issue(lang, target, f'❌ Альтернатива недоступна ({error})')
+                elif target in targets_of and page not in targets_of[target]:
+                    issue(lang, target, '❌ Нет обратной ссылки')
+            if page not in targets_of[page]:
+                issue('', page, '⚠️ Нет ссылки на себя')
+            if 'x-default' not in langs:
+                issue('x-default', '', '⚠️ Нет x-default')
+            for lang, targets in langs.items():
+                if len(targets) > 1:
+                    issue(lang, ', '.join(sorted(targets)), '❌ Разные URL для одного языка')
+        
+        self.hreflang_issues = issues
+        per_page = Counter(item['page'] for item in issues)
+        for result in self.results:
+            result['hreflang_issues'] = per_page[result['url']]
+        return issues
+
+    # ==================== ВЕС СТРАНИЦ ====================
+
+    def extract_resource_refs(self, soup):
+        """Картинки, скрипты и стили страницы: [(адрес как в HTML, тип)]"""
+        if isinstance(soup, StreamedPage):
+            refs = [(ref, kind) for kind in ('image', 'script', 'css') for ref in soup.resources[kind]]
+        else:
+            refs = [(img['src'].strip(), 'image') for img in soup.find_all('img', src=True)]
+            refs += [(script['src'].strip(), 'script') for script in soup.find_all('script', src=True)]
+            refs += [(link['href'].strip(), 'css') for link in soup.find_all('link', href=True)
+                     if 'stylesheet' in [rel.lower() for rel in link.get('rel', [])]]
+        return [(ref, kind) for ref, kind in refs if ref and not ref.startswith('data:')]
+
+    def fetch_resource_size(self, url, timeout=10, max_bytes=20_000_000):
+        """HEAD ресурса → статус, Content-Type и размер. Без Content-Length — GET с подсчётом байт"""
+        session = self._link_check_session()
+        record = {'url': url, 'status': None, 'content_type': '', 'bytes': None, 'error': ''}
+        try:
+            response = session.head(url, timeout=timeout, allow_redirects=True)
+            length = response.headers.get('content-length')
+            if response.status_code in self.HEAD_FALLBACK_STATUSES or length is None:
+                response = session.get(url, timeout=timeout, allow_redirects=True, stream=True)
+                length = response.headers.get('content-length')
+                if length is None and response.status_code < 400:
+                    length = 0
+                    for chunk in response.iter_content(65536):
+                        length += len(chunk)
+                        if length >= max_bytes:
+                            break
+                response.close()
+            record['status'] = response.status_code
+            record['content_type'] = response.headers.get('content-type', '').split(';')[0].strip()
+            record['bytes'] = int(length) if length is not None and response.status_code < 400 else 0
+        except (requests.RequestException, ValueError) as e:
+            record['error'] = type(e).__name__
+        return record
+
+    def measure_resource_weights(self):
+        """Размеры всех уникальных ресурсов сайта (параллельно, link_workers потоков) → вес каждой страницы"""
+        urls = sorted({res for resources in self.page_resources.values() for res, _ in resources}
+                      - set(self.resource_sizes))
+        with ThreadPoolExecutor(max_workers=self.link_workers) as pool:
+            for done, record in enumerate(pool.map(self.fetch_resource_size, urls), 1):
+                self.resource_sizes[record['url']] = record
+                if done % 50 == 0:
+                    self.lightning.update_status(f'⚖️ Ресурсов: {done}/{len(urls)}')
+        
+        for result in self.results:
+            resources = self.page_resources.get(result['url'], set())
+            totals = {'image': 0, 'script': 0, 'css': 0}
+            missing = 0
+            for res, kind in resources:
+                record = self.resource_sizes[res]
+                if record['status'] is None or record['status'] >= 400:
+                    missing += 1
+                totals[kind] += record['bytes'] or 0
+            result['image_bytes'] = totals['image']
+            result['script_bytes'] = totals['script']
+            result['css_bytes'] = totals['css']
+            result['resource_count'] = len(resources)
+            result['missing_resources'] = missing
+            result['page_weight_bytes'] = result['html_bytes'] + sum(totals.values())
+        return len(urls)
+
+    def heaviest_resources(self, limit=100):
+        """Самые тяжёлые ресурсы сайта с типом и числом страниц, где они подключены"""
+        usage = Counter()
+        kinds = {}
+        for resources in self.page_resources.values():
+            for res, kind in resources:
+                usage[res] += 1
+                kinds[res] = kind
+        measured = [record for record in self.resource_sizes.values() if record['url'] in usage]
+        measured.sort(key=lambda record: -(record['bytes'] or 0))
+        return [dict(record, kind=kinds[record['url']], pages=usage[record['url']]) for record in measured[:limit]]
+
+    # ==================== БЮДЖЕТ КРАУЛИНГА ====================
+
+    def url_template(self, url):
+        """Шаблон URL: числа в пути → {n}, от запроса остаются только имена параметров"""
+        parsed = urlparse(url)
+        template = re.sub(r'\d+', '{n}', parsed.path)
+        if parsed.query:
+            template += '?' + '&'.join(sorted({k for k, _ in parse_qsl(parsed.query, keep_blank_values=True)}))
+        return template
+
+    def sample_template(self, url):
+        """Шаблон URL для выборки: как url_template, но id, хэши и слаги в пути тоже свёрнуты"""
+        parsed = urlparse(url)
+        segments = []
+        for segment in (parsed.path or '/').split('/'):
+            if SAMPLE_ID_SEGMENT.fullmatch(segment):
+                segment = '{id}'
+            elif SAMPLE_SLUG_SEGMENT.fullmatch(segment):
+                segment = '{slug}'
+            segments.append(segment)
+        return self.url_template(parsed._replace(path='/'.join(segments)).geturl())
+
+    def sample_admit(self, url, depth):
+        """Учитывает URL в совокупности шаблона; True, если он попадает в выборку.
+
+        Место в выборке занимают проанализированные страницы и URL выборки во фронтире;
+        URL, которому места нет, остаётся в запасе шаблона.
+        """
+        if url in self.sample_pending:
+            return True
+        new = url not in self.sample_discovered
+        template = self.sample_template(url)
+        if new:
+            self.sample_discovered.add(url)
+            self.sample_population[template] += 1
+        if self.sample_taken[template] + self.sample_queued[template] < self.sample_size:
+            self.sample_pending[url] = template
+            self.sample_queued[template] += 1
+            return True
+        spare = self.sample_spare[template]
+        if new and len(spare) < SAMPLE_SPARE_FACTOR * self.sample_size:
+            spare.append((url, depth))
+        return False
+
+    def sample_release(self, url, analysed=False, refill=True):
+        """URL выборки ушёл из фронтира: проанализирован — место занято, иначе его берёт запасной URL"""
+        template = self.sample_pending.pop(url, None)
+        if template is None:
+            return
+        self.sample_queued[template] -= 1
+        if analysed:
+            self.sample_taken[template] += 1
+            return
+        spare = self.sample_spare[template]
+        while refill and spare and self.sample_taken[template] + self.sample_queued[template] < self.sample_size:
+            next_url, depth = spare.popleft()
+            if next_url not in self.visited:
+                self.enqueue(next_url, depth)
+
+    def seed_sample_from_sitemap(self):
+        """В режиме выборки URL из sitemap идут в совокупность шаблонов и во фронтир (в случайном порядке)"""
+        urls = sorted(self.sitemap_urls)
+        random.Random(self.domain).shuffle(urls)
+        for url in urls:
+            if self.is_valid_url_to_crawl(url):
+                self.enqueue(url, 1)
+
+    def sample_estimates(self):
+        """Экстраполяция выборки: по шаблонам и по сайту (стратифицированно по шаблонам).
+
+        Если в каком-то шаблоне проанализирована одна страница из нескольких, дисперсия
+        этого слоя неизвестна, и для сайта дано только среднее (интервал — None).
+        """
+        pages = defaultdict(list)
         for result in self.results:
-            score = 100
-            issues = []
-            quality = result.get('anchor_text_quality_score', 0)
-            if quality < 50:
-                score -= 30
-                issues.append('❌ Generic')
-            elif quality < 70:
-                score -= 15
-            total = result.get('total_links', 0)
-            if total == 0:
-                score -= 20
-                issues.append('❌ No links')
-            elif total > 50:
-                score -= 10
-            elif total < 5:
-                score -= 15
-                issues.append('⚠️ Few')
-            result['linking_quality_score'] = max(0, score)
-            result['linking_issues'] = issues
+            pages[self.sample_template(result['url'])].append(result)
+        templates = []
+        site = {metric: [0.0, 0.0, 0] for metric in SAMPLE_METRICS}
+        site_issues = defaultdict(lambda: [0.0, 0.0])
+        issues_unknown = False
+        total = 0
+        for template, rows in sorted(pages.items(), key=lambda item: -self.sample_population[item[0]]):
+            n = len(rows)
+            population = max(n, self.sample_population[template])
+            total += population
+            metrics = {}
+            for metric in SAMPLE_METRICS:
+                values = [row[metric] for row in rows if isinstance(row.get(metric), (int, float))]
+                if not values:
+                    continue
+                mean, low, high, variance = mean_interval(values, population)
+                metrics[metric] = (mean, low, high)
+                site[metric][0] += population * mean
+                if variance is None and population > len(values):
+                    site[metric][1] = None
+                elif variance is not None and site[metric][1] is not None:
+                    site[metric][1] += population ** 2 * (1 - len(values) / population) * variance / len(values)
+                site[metric][2] += population
+            issues = Counter(issue.split(':')[0] for row in rows for issue in set(row.get('all_issues') or ())
+                             if not issue.startswith('✅'))
+            estimated = {}
+            issues_unknown = issues_unknown or (n < 2 and population > n)
+            for label, hits in issues.most_common():
+                share, low, high = share_interval(hits, n, population)
+                estimated[label] = (round(share * population), round(low * population), round(high * population))
+                site_issues[label][0] += share * population
+                site_issues[label][1] += population ** 2 * (1 - n / population) * share * (1 - share) / max(1, n - 1)
+            templates.append({'template': template, 'population': population, 'sampled': n,
+                              'metrics': metrics, 'issues': estimated})
+        site_metrics = {}
+        for metric, (weighted, variance, covered) in site.items():
+            if covered and variance is None:
+                site_metrics[metric] = (weighted / covered, None, None)
+            elif covered:
+                mean, half = weighted / covered, 1.96 * sqrt(variance) / covered
+                site_metrics[metric] = (mean, mean - half, mean + half)
+        site_estimates = {}
+        for label, (count, variance) in sorted(site_issues.items(), key=lambda item: -item[1][0]):
+            if issues_unknown:
+                site_estimates[label] = (round(count), None, None)
+                continue
+            half = 1.96 * sqrt(variance)
+            site_estimates[label] = (round(count), max(0, round(count - half)), round(count + half))
+        return {'population': total, 'sampled': len(self.results), 'templates': templates,
+                'metrics': site_metrics, 'issues': site_estimates}
+
+    def crawl_priority(self, url, depth):
+        """Оценка ценности URL для бюджета краулинга (веса — CRAWL_PRIORITY_WEIGHTS)"""
+        weights = CRAWL_PRIORITY_WEIGHTS
+        url = url.split('#')[0]
+        inlinks = len(self.incoming_links.get(url, ()))
+        template_count = self.url_templates.get(self.url_template(url), 0)
+        score = weights['depth'] / (1 + depth)
+        score += weights['inlinks'] * min(1.0, log(1 + inlinks) / log(51))
+        score += weights['rarity'] / max(1, template_count) ** 0.5
+        meta = self.sitemap_meta.get(url)
+        if meta:
+            score += weights['sitemap_priority'] * meta['priority']
+            if meta['age_days'] is not None:
+                score += weights['freshness'] / (1 + meta['age_days'] / 30)
+        return score
+
+    def enqueue(self, url, depth, source=None):
+        """Добавляет URL во фронтир; URL ловушек краулинга (source — страница, где нашли ссылку) не ставятся.
+
+        В заполненном приоритетном фронтире новый URL вытесняет наименее ценный, если ценнее его;
+        вытесненный или не принятый URL считается отброшенным.
+        """
+        limit = self.max_pages * 2
+        if self.trap_detector and self.trap_detector.check(url, source):
+            return
+        if self.sample_size and not self.sample_admit(url, depth):
+            return
+        if self.crawl_order == 'priority':
+            if url not in self.to_visit:
+                if len(self.to_visit) >= limit:
+                    self.frontier_dropped += 1
+                    if (not isinstance(self.to_visit, (PriorityFrontier, DiskPriorityQueue))
+                            or self.crawl_priority(url, depth) <= self.to_visit.min_score()):
+                        self.sample_release(url, refill=False)
+                        return
+                    self.sample_release(self.to_visit.pop_min()[0], refill=False)
+                self.url_templates[self.url_template(url)] += 1
+        elif len(self.to_visit) >= limit:
+            self.frontier_dropped += 1
+            self.sample_release(url, refill=False)
+            return
+        self.to_visit.append((url, depth))
+
+    def frontier_summary(self, limit=500):
+        """Сколько обнаруженного фронтира осталось непросканированным и самые ценные из оставшихся URL"""
+        if isinstance(self.to_visit, list):
+            candidates = self.to_visit
+            pending = len({url for url, _ in self.to_visit if url not in self.visited})
+        else:
+            candidates = self.to_visit.top(limit)
+            pending = len(self.to_visit)
+        seen = set()
+        top = []
+        for url, depth in candidates:
+            if len(top) >= limit:
+                break
+            if url in seen or url in self.visited:
+                continue
+            seen.add(url)
+            top.append({
+                'url': url, 'depth': depth,
+                'priority': round(self.crawl_priority(url, depth), 3),
+                'inlinks': len(self.incoming_links.get(url.split('#')[0], ())),
+                'in_sitemap': url in self.sitemap_meta,
+            })
+        if not isinstance(self.to_visit, list):
+            top.sort(key=lambda row: -row['priority'])
+        crawled = len(self.visited)
+        discovered = crawled + pending
+        return {
+            'crawled': crawled,
+            'pending': pending,
+            'dropped_links': self.frontier_dropped,
+            'uncrawled_percent': round(pending / discovered * 100, 1) if discovered else 0,
+            'top': top,
+        }
 
     # ==================== КРАУЛИНГ ====================
 
     def crawl(self):
         """Краулинг с анимацией молнии"""
+        if self.shared_frontier and self.shard_id is None:
+            self.crawl_sharded()
+        else:
+            self.crawl_pages()
+        self.finish_crawl()
+
+    def crawl_pages(self):
+        """Обход страниц из фронтира с анализом каждой"""
         self.lightning.start_animation('lightning')
         
         self.load_robots_txt()
         self.load_sitemap()
+        if self.sample_size:
+            self.seed_sample_from_sitemap()
         
         self.lightning.stop_animation()
         print("\n🕷️ Начинаю краулинг сайта...\n")
         self.lightning.start_animation('bars')
         
+        self._install_partial_report_signal()
+        
+        # Бюджет max_pages — URL, взятые из фронтира: финальный URL редиректа отдельного слота не занимает
         page_count = 0
-        while self.to_visit and len(self.visited) < self.max_pages:
-            url, depth = self.to_visit.pop(0)
-            
-            if url in self.visited or depth > self.max_depth:
-                continue
+        while self.to_visit and page_count < self.max_pages:
+            if self.partial_report_requested:
+                self.write_partial_report()
             
-            if not self.is_valid_url_to_crawl(url):
-                continue
+            url, depth = self.to_visit.pop(0)
             
-            if not self.is_url_allowed(url):
+            # Место в выборке занимает только проанализированная страница, иначе — запасной URL шаблона
+            if (url in self.visited or depth > self.max_depth
+                    or (self.trap_detector and self.trap_detector.blocked_reason(url))
+                    or not self.is_valid_url_to_crawl(url) or not self.is_url_allowed(url)):
+                self.sample_release(url)
                 continue
             
+            origin = url
             self.visited.add(url)
             page_count += 1
             
@@ -889,165 +4292,802 @@ class SEOAuditParser:
             self.lightning.print_progress_bar(page_count, min(len(self.visited), self.max_pages), status)
             
             try:
-                response = self.session.get(url, timeout=10, allow_redirects=True)
+                response, chain, final_url, error = self.fetch_page(url)
+                if chain or error:
+                    self._remember_redirect(url, chain, final_url, response, error)
+                if response is None:
+                    self.sample_release(origin)
+                    continue
+                if chain:
+                    self.visited.add(final_url)
+                    url = final_url
+                self.crawled_status[url] = response.status_code
                 response.encoding = 'utf-8'
                 
                 if 'text/html' not in response.headers.get('content-type', '').lower():
+                    self.sample_release(origin)
                     continue
                 
-                soup = BeautifulSoup(response.content, 'html.parser')
-                analysis = self.analyze_page(soup, url, response)
+                body_hash = hashlib.blake2b(response.content, digest_size=16).digest()
+                entry = self.content_cache.get(body_hash)
+                if entry:
+                    self.content_cache.move_to_end(body_hash)
+                    analysis = self.reuse_cached_analysis(entry, url, response)
+                    hrefs = entry['hrefs']
+                    external = [dict(link, source_url=url) for link in entry['external']]
+                    resource_refs = entry['resources']
+                else:
+                    started = time.perf_counter()
+                    if self.stream_page_bytes and len(response.content) > self.stream_page_bytes:
+                        soup = StreamedPage.parse(self, response.content)
+                        links = soup.links
+                        heavy = 'stream'
+                    else:
+                        soup = BeautifulSoup(response.content, 'html.parser')
+                        links = soup.find_all('a', href=True)
+                        heavy = self.heavy_page_reason(response.content)
+                    analysis = self.analyze_page(soup, url, response, heavy, started)
+                    hrefs = [link['href'] for link in links]
+                    external = self.extract_external_links(soup, url, links)
+                    resource_refs = self.extract_resource_refs(soup) if self.page_weight else None
+                    self._cache_content(body_hash, {'url': url, 'result': analysis, 'hrefs': hrefs, 'external': external,
+                                                    'resources': resource_refs, 'meta_refs': self.extract_meta_refs(soup)})
+                analysis['html_bytes'] = len(response.content)
+                analysis.update({f'{phase}_ms': response.timing[phase] for phase in
+                                 ('dns', 'connect', 'tls', 'ttfb', 'download', 'total')})
+                if resource_refs is not None:
+                    self.page_resources[url] = {(urljoin(url, ref).split('#')[0], kind) for ref, kind in resource_refs}
+                if self.crawl_order == 'priority':
+                    analysis['crawl_priority'] = round(self.crawl_priority(url, depth), 3)
+                if analysis['hreflang_links']:
+                    self.hreflang_index[url] = analysis['hreflang_links']
                 self.results.append(analysis)
+                self.sample_release(origin, analysed=True)
+                if self.template_warmup and self.template_detector.ready:
+                    self.reanalyze_template_warmup()
+                
+                if self.pagerank_every and len(self.results) % self.pagerank_every == 0:
+                    self.update_pagerank(max_iterations=2)
+                if self.partial_every and len(self.results) % self.partial_every == 0:
+                    self.partial_report_requested = True
                 
-                external = self.extract_external_links(soup, url)
                 self.external_links.extend(external)
                 
-                broken = self.detect_broken_internal_links(soup, url)
-                if broken:
-                    self.broken_links.extend(broken)
+                for href in self.detect_broken_internal_links(None, url, hrefs):
+                    self.broken_links.append({'url': href, 'status': None, 'error': 'invalid url',
+                                              'chain': [], 'sources': [url]})
                 
-                if depth < self.max_depth:
-                    for link in soup.find_all('a', href=True):
+                duplicate_of = self.register_simhash(analysis)
+                if self.trap_detector:
+                    self.trap_detector.observe_page(url, duplicate_of or analysis.get('exact_duplicate_of'))
+                if duplicate_of and self.skip_duplicate_links:
+                    analysis['links_expanded'] = False
+                elif depth < self.max_depth:
+                    for href in hrefs:
                         try:
-                            next_url = urljoin(url, link['href'])
-                            if (self.is_valid_url_to_crawl(next_url) and
-                                next_url not in self.visited and
-                                len(self.to_visit) < self.max_pages * 2):
-                                self.to_visit.append((next_url, depth + 1))
-                        except:
+                            next_url = urljoin(url, href)
+                            if self.is_valid_url_to_crawl(next_url) and next_url not in self.visited:
+                                self.enqueue(next_url, depth + 1, url)
+                        except Exception:
                             pass
                 
                 time.sleep(0.2)
-            except:
-                pass
+            except Exception:
+                self.sample_release(origin)
         
         self.lightning.stop_animation()
+        self.print_crawl_summary()
+        
+        # Сайт меньше min_pages: учим шаблон по всем страницам, что есть
+        if self.template_warmup and self.template_detector.pages >= 2:
+            self.template_detector.min_pages = self.template_detector.pages
+            self.reanalyze_template_warmup()
+
+    def print_crawl_summary(self):
         print(f"\n✅ Краулинг завершён: {len(self.results)} страниц проанализировано\n")
+        if self.exact_duplicates:
+            print(f"♻️ Точных дублей (анализ переиспользован): {self.exact_duplicates}\n")
+        if self.shard_id is None and (self.to_visit or self.frontier_dropped):
+            budget = self.frontier_summary(limit=0)
+            print(f"📭 Осталось во фронтире: {budget['pending']} URL ({budget['uncrawled_percent']}%), "
+                  f"отброшено ссылок сверх лимита: {budget['dropped_links']}\n")
+        if self.sample_size:
+            print(f"🎯 Выборка: {len(self.results)} страниц из {len(self.sample_discovered)} найденных URL, "
+                  f"шаблонов: {len(self.sample_population)}\n")
+        if self.trap_detector and self.trap_detector.pruned:
+            print(f"🪤 Ловушки краулинга: {len({template for template, _ in self.trap_detector.pruned})} шаблонов, "
+                  f"отброшено URL: {self.trap_detector.pruned_total}\n")
+
+    # ==================== ШАРДЫ ====================
+
+    def crawl_shard(self):
+        """Воркер шарда: краулинг своей части сайта и сохранение состояния для координатора"""
+        try:
+            self.crawl_pages()
+        finally:
+            self.to_visit.close()
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        path = self.shard_dir / f'shard_{self.shard_id}.pkl'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.shard_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+        return path
+
+    def shard_state(self):
+        state = {name: getattr(self, name) for name in SHARD_STATE_FIELDS}
+        state['visited'] = set(self.visited)
+        state['all_links'] = Counter(dict(self.all_links.items()))
+        state['all_urls_data'] = dict(self.all_urls_data.items())
+        state['crawl_traps'] = self.trap_detector.pruned if self.trap_detector else {}
+        return state
+
+    def merge_shard_state(self, state):
+        """Сливает состояние воркера в координатор.
+
+        Страница, которую открыли два шарда (редирект на URL чужого шарда),
+        берётся один раз; индексы SimHash и TF-IDF строятся заново по слитым страницам.
+        """
+        known = {result['url'] for result in self.results}
+        accepted = set()
+        for result in state['results']:
+            url = result['url']
+            if url in known:
+                continue
+            known.add(url)
+            accepted.add(url)
+            self.results.append(result)
+            self.register_simhash(result)
+            self._index_page_text(url, state['all_urls_data'].get(url, ''))
+        for url, targets in state['internal_links_graph'].items():
+            if url in accepted:
+                self.internal_links_graph[url].extend(targets)
+        for url, sources in state['incoming_links'].items():
+            self.incoming_links[url].update(sources)
+        for url, sources in state['uncrawlable_links'].items():
+            self.uncrawlable_links[url].update(sources)
+        self.external_links.extend(link for link in state['external_links'] if link['source_url'] in accepted)
+        self.broken_links.extend(state['broken_links'])
+        self.redirects.extend(state['redirects'])
+        self.timings.extend(state['timings'])
+        self.slow_pages.extend(page for page in state['slow_pages'] if page['url'] in accepted)
+        for n, sketch in state['site_phrases'].items():
+            self.site_phrases[n].merge(sketch)
+        for template, sketch in state['template_phrases'].items():
+            if template in self.template_phrases:
+                self.template_phrases[template].merge(sketch)
+            elif len(self.template_phrases) < PHRASE_TEMPLATE_LIMIT:
+                self.template_phrases[template] = sketch
+            else:
+                self.template_phrases.setdefault(PHRASE_OTHER_TEMPLATE, SpaceSaving(PHRASE_TEMPLATE_CAPACITY)).merge(sketch)
+        self.template_pages.update(state['template_pages'])
+        for name in ('crawled_status', 'redirect_hops', 'link_status_cache', 'page_resources', 'hreflang_index'):
+            getattr(self, name).update(state[name])
+        self.exact_duplicates += state['exact_duplicates']
+        self.frontier_dropped += state['frontier_dropped']
+        if self.trap_detector:
+            self.trap_detector.merge(state['crawl_traps'])
+        self.url_templates.update(state['url_templates'])
+        self.all_links.update(state['all_links'])
+        for url in state['visited']:
+            self.visited.add(url)
+
+    def crawl_sharded(self):
+        """Координатор: запускает воркеры шардов, ждёт их и сливает результаты и графы ссылок"""
+        self.lightning.start_animation('lightning')
+        self.load_robots_txt()
+        self.load_sitemap()
+        self.lightning.stop_animation()
+        
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.shard_dir.glob('shard_*.pkl'):
+            path.unlink()
+        self.shared_frontier.reset([(self.base_url, 0)])
+        local_shards = range(self.shards - self.remote_shards)
+        print(f"\n🕷️ Шардированный краулинг: {self.shards} воркеров, локально {len(local_shards)}...\n")
+        
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=run_shard_worker, args=(dict(self.crawl_options, shard_id=shard),))
+                   for shard in local_shards]
+        for worker in workers:
+            worker.start()
+        
+        states = [self.shard_dir / f'shard_{shard}.pkl' for shard in range(self.shards)]
+        remote_states = states[len(local_shards):]
+        lost = []
+        self.lightning.start_animation('bars')
+        while any(worker.is_alive() for worker in workers) or not all(path.exists() for path in remote_states):
+            # Упавший воркер унёс свои страницы: отчёт без шарда был бы неполным
+            failed = [shard for shard, worker in zip(local_shards, workers) if worker.exitcode not in (None, 0)]
+            lost = failed or self.shared_frontier.lost()
+            if lost:
+                break
+            claimed = self.shared_frontier.claimed()
+            status = f"Шарды: выдано {claimed} страниц"
+            self.lightning.update_status(status)
+            self.lightning.print_progress_bar(min(claimed, self.max_pages), self.max_pages, status)
+            time.sleep(0.5)
+        self.lightning.stop_animation()
+        
+        if lost:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        codes = {shard: worker.exitcode for shard, worker in zip(local_shards, workers) if worker.exitcode != 0}
+        missing = [shard for shard, path in enumerate(states) if not path.exists()]
+        if codes or missing or lost:
+            raise RuntimeError(f"Шарды потеряны: {sorted(set(lost) or set(missing) | set(codes))} "
+                               f"(коды выхода воркеров: {codes or '—'}); отчёт без них был бы неполным")
+        
+        for path in states:
+            with open(path, 'rb') as f:
+                self.merge_shard_state(pickle.load(f))
+        self.to_visit = self.shared_frontier.remaining()
+        self.print_crawl_summary()
+
+    def finish_crawl(self):
+        """Проверки и метрики уровня сайта после краулинга"""
+        if self.verify_links:
+            print("🔗 Проверяю внутренние ссылки...")
+            self.lightning.update_status('🔗 Проверка ссылок...')
+            self.lightning.start_animation('dots')
+            checked = self.verify_internal_links()
+            self.lightning.stop_animation()
+            broken_count = sum(1 for link in self.broken_links if link['error'] != 'invalid url')
+            print(f"✅ Проверено ссылок: {checked}, битых: {broken_count}\n")
+        
+        if self.verify_external and self.external_links:
+            print("🌐 Проверяю внешние ссылки...")
+            self.lightning.update_status('🌐 Проверка внешних ссылок...')
+            self.lightning.start_animation('dots')
+            dead_domains = self.verify_external_links()
+            self.lightning.stop_animation()
+            broken_count = sum(1 for link in self.external_checks if link['broken'])
+            print(f"✅ Внешних ссылок: {len(self.external_checks)}, битых: {broken_count}, "
+                  f"мёртвых доменов: {len(dead_domains)}\n")
+        
+        if self.page_weight and self.page_resources:
+            print("⚖️ Измеряю вес ресурсов страниц...")
+            self.lightning.update_status('⚖️ Вес ресурсов...')
+            self.lightning.start_animation('dots')
+            measured = self.measure_resource_weights()
+            self.lightning.stop_animation()
+            print(f"✅ Уникальных ресурсов проверено: {measured}\n")
+        
+        if self.hreflang_index:
+            self.lightning.update_status('🌍 Проверка hreflang...')
+            self.lightning.start_animation('dots')
+            self.validate_hreflang()
+            self.lightning.stop_animation()
+            if self.hreflang_issues:
+                print(f"🌍 Ошибок hreflang: {len(self.hreflang_issues)}\n")
+        
+        self.lightning.update_status('↪️ Редиректы и canonical...')
+        self.lightning.start_animation('dots')
+        redirect_issues, canonical_issues = self.analyze_redirects_and_canonicals()
+        self.lightning.stop_animation()
+        if redirect_issues or canonical_issues:
+            print(f"↪️ Проблемных редиректов: {redirect_issues}, проблемных canonical: {canonical_issues}\n")
         
         print("🔥 Вычисляю рейтинги и кластеры...")
         self.lightning.start_animation('dots')
         
-        self._calculate_internal_pagerank()
-        self._calculate_tf_idf()
-        self.calculate_site_health_scores()
-        self.build_semantic_linking_map()
-        self.analyze_anchor_text_quality()
-        self.cluster_by_topics()
-        self.calculate_linking_quality_score()
+        self.compute_site_aggregates(final=True)
         
         self.lightning.stop_animation()
         print("✅ Анализ завершён!\n")
 
-    def analyze_page(self, soup, url, response):
-        """ПОЛНЫЙ анализ страницы"""
-        text = soup.get_text(separator=' ', strip=True)
-        self.all_urls_data[url] = text
+    def compute_site_aggregates(self, final=False):
+        """Пересчитывает метрики уровня сайта из текущего состояния краулинга.
+
+        Промежуточный пересчёт (final=False) не перезапрашивает страницы
+        для анализа анкоров — это делается только в конце краулинга.
+        """
+        self._calculate_internal_pagerank()
+        if self.site_stage_enabled('near_duplicates'):
+            self.detect_near_duplicates()
+        if self.site_stage_enabled('tf_idf'):
+            self._calculate_tf_idf()
+        self.calculate_site_health_scores()
+        if self.site_stage_enabled('semantic_links'):
+            self.build_semantic_linking_map()
+        if final and self.site_stage_enabled('anchor_quality'):
+            self.analyze_anchor_text_quality()
+        if self.site_stage_enabled('topics'):
+            self.cluster_by_topics()
+        self.calculate_linking_quality_score()
+
+    def site_stage_enabled(self, stage):
+        """Выбран ли плагин, поля которого нужны этапу уровня сайта (SITE_STAGES)"""
+        return SITE_STAGES[stage][0] in self.metric_plugins
+
+    def _install_partial_report_signal(self):
+        """SIGUSR1 (Windows: SIGBREAK) запрашивает промежуточный отчёт"""
+        sig = getattr(signal, 'SIGUSR1', None) or getattr(signal, 'SIGBREAK', None)
+        if sig is None:
+            return
+        try:
+            signal.signal(sig, lambda signum, frame: setattr(self, 'partial_report_requested', True))
+        except ValueError:
+            pass
+
+    def write_partial_report(self):
+        """Пишет промежуточный Excel отчёт из текущего состояния, не останавливая краулинг"""
+        self.partial_report_requested = False
+        if not self.results:
+            return None
+        self.lightning.update_status('📊 Промежуточный отчёт...')
+        filename = f"{self.domain.replace('.', '_')}_PARTIAL_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        try:
+            self.compute_site_aggregates(final=False)
+            self.generate_excel_report(filename)
+        except Exception as e:
+            logging.warning(f"\n⚠️ Промежуточный отчёт не записан: {e}")
+            return None
+        logging.info(f"\n📊 Промежуточный отчёт ({len(self.results)} страниц): {filename}")
+        return filename
+
+    def heavy_page_reason(self, content):
+        """Почему страницу сразу анализировать быстрым профилем: 'size', 'dom' или '' — не нужно.
+
+        Число элементов оценивается по числу открывающих тегов в байтах, до разбора HTML.
+        """
+        if self.heavy_page_bytes and len(content) > self.heavy_page_bytes:
+            return 'size'
+        if self.heavy_page_nodes and content.count(b'<') - content.count(b'</') > self.heavy_page_nodes:
+            return 'dom'
+        return ''
+
+    def analyze_page(self, soup, url, response, heavy='', started=None):
+        """Анализ страницы выбранными плагинами метрик (METRIC_PLUGINS).
+
+        Тяжёлая страница (heavy) считается только быстрым профилем. Если с
+        started (начало разбора) прошло больше page_budget секунд, оставшиеся
+        плагины вне быстрого профиля пропускаются — их поля остаются по умолчанию.
+        soup может быть StreamedPage: тогда плагины считаются методами stream.
+        """
+        started = started or time.perf_counter()
+        streamed = isinstance(soup, StreamedPage)
+        blocks = None
+        if self.template_detector:
+            blocks = self.hash_text_blocks(soup.text_blocks) if streamed else self.extract_text_blocks(soup)
+            self.template_detector.observe(h for h, _ in blocks)
+            if not self.template_detector.ready:
+                self.template_warmup.append((url, soup, response, blocks))
+            text, full_text = self.split_template_text(blocks)
+        else:
+            text = full_text = soup.text if streamed else soup.get_text(separator=' ', strip=True)
+        ctx = PageContext(self, soup, url, response, text, full_text)
+        self._index_page_text(url, text)
+        # Страницы прогрева детектора шаблонов считаются после обучения, уже без шаблонного текста
+        if not (self.template_detector and not self.template_detector.ready):
+            self._count_phrases(url, text)
+        self._add_link_graph(url, [link['href'] for link in ctx.links])
+        
+        result = {'url': url, 'status': response.status_code}
+        for plugin in METRIC_PLUGINS.values():
+            result.update(self._copy_defaults(plugin['outputs']))
+        result.update(self._copy_defaults(SITE_LEVEL_DEFAULTS))
+        result.update(self._template_fields(text, full_text))
+        mode = heavy
+        skipped = []
+        for name in self.metric_plugins:
+            if name not in _QUICK_METRICS:
+                if not mode and self.page_budget and time.perf_counter() - started > self.page_budget:
+                    mode = 'budget'
+                if mode:
+                    skipped.append(name)
+                    continue
+            plugin = METRIC_PLUGINS[name]
+            result.update(getattr(self, plugin.get('stream', plugin['method']) if streamed else plugin['method'])(ctx))
         
-        for link in soup.find_all('a', href=True):
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        result.update({'analysis_mode': f'reduced: {mode}' if mode else 'full', 'analysis_ms': elapsed_ms,
+                       'analysis_skipped': skipped})
+        if mode or (self.page_budget and elapsed_ms > self.page_budget * 1000):
+            self.slow_pages.append({'url': url, 'ms': elapsed_ms, 'mode': result['analysis_mode'],
+                                    'bytes': len(response.content) if response.content else 0})
+            logging.warning(f"\n🐢 {url}: анализ {elapsed_ms} мс, режим {result['analysis_mode']}")
+        return result
+
+    def _add_link_graph(self, url, hrefs):
+        for href in hrefs:
             try:
-                next_url = urljoin(url, link['href']).split('#')[0]
-                if urlparse(next_url).netloc == self.domain and self.is_valid_url_to_crawl(next_url):
+                next_url = urljoin(url, href).split('#')[0]
+                if urlparse(next_url).netloc != self.domain:
+                    continue
+                if self.is_valid_url_to_crawl(next_url):
                     self.internal_links_graph[url].append(next_url)
+                    self.incoming_links[next_url].add(url)
+                else:
+                    self.uncrawlable_links[next_url].add(url)
             except:
                 pass
+
+    def reuse_cached_analysis(self, entry, url, response):
+        """Результат для страницы, байт-в-байт совпадающей с уже проанализированной.
+
+        Копируются метрики контента, а поля, зависящие от URL и ответа
+        (статус, HTTP-заголовки, внутренние ссылки, canonical, hreflang, граф), пересчитываются.
+        """
+        analysis = copy.deepcopy(entry['result'])
+        analysis.update(self._copy_defaults(SITE_LEVEL_DEFAULTS))
+        analysis['url'] = url
+        analysis['status'] = response.status_code
+        analysis['exact_duplicate_of'] = entry['url']
+        if 'http' in self.metric_plugins:
+            analysis.update(self._metric_http(PageContext(self, None, url, response, '')))
+        if 'links' in self.metric_plugins:
+            analysis['outgoing_links_internal'] = len([h for h in entry['hrefs'] if self.is_valid_url_to_crawl(urljoin(url, h))])
+        if 'meta' in self.metric_plugins:
+            # Относительные canonical и hreflang указывают от этого URL, а не от страницы в кэше
+            canonical, hreflang = entry['meta_refs']
+            analysis['canonical_url'] = urljoin(url, canonical.strip()).split('#')[0] if canonical else ''
+            analysis['hreflang_links'] = self.extract_hreflang(None, url, hreflang)
+        self._index_page_text(url, self.all_urls_data.get(entry['url'], ''))
+        if not (self.template_detector and not self.template_detector.ready):
+            self._count_phrases(url, self.all_urls_data.get(entry['url'], ''))
+        self._add_link_graph(url, entry['hrefs'])
+        self.exact_duplicates += 1
+        return analysis
+
+    def _cache_content(self, body_hash, entry):
+        self.content_cache[body_hash] = entry
+        if len(self.content_cache) > self.content_cache_size:
+            self.content_cache.popitem(last=False)
+
+    def page_terms(self, text, breaks=False):
+        """Слова текста в нижнем регистре; с lemmatize — их леммы (через общий кэш lemmatize_word)
+        без знаков препинания по краям, чтобы «кабеля,» и «кабеля» были одним словом.
+        breaks — токены для фраз: пунктуация срезается всегда, '' остаётся на месте токенов из неё.
+        """
+        words = text.lower().split()
+        if breaks or self.lemmatize:
+            words = [word.strip(WORD_PUNCTUATION) for word in words]
+            if not breaks:
+                words = [word for word in words if word]
+        if self.lemmatize:
+            return [lemmatize_word(word) for word in words]
+        return words
+
+    def _count_phrases(self, url, text):
+        """Добавляет би- и триграммы контентного текста страницы в таблицы частых фраз.
+
+        Фраза не пересекает знаки препинания и не начинается и не кончается стоп-словом.
+        """
+        if 'keywords' not in self.metric_plugins:
+            return
+        words = self.page_terms(text, breaks=True)
+        page = {n: Counter() for n in PHRASE_SIZES}
+        run = []
+        for word in words + ['']:
+            if word.isalpha() and len(word) > 1:
+                run.append(word)
+                continue
+            for n in PHRASE_SIZES:
+                for i in range(len(run) - n + 1):
+                    first, last = run[i], run[i + n - 1]
+                    if first not in self.stop_words and last not in self.stop_words and len(first) > 2 and len(last) > 2:
+                        page[n][' '.join(run[i:i + n])] += 1
+            run = []
         
-        h_hierarchy, h_errors, h_details = self.analyze_h_hierarchy_detailed(soup)
-        all_issues = self.collect_all_issues(soup, text, h_errors)
-        
-        https_ok = self.check_https(response)
-        mobile_friendly = self.check_mobile_friendly(soup)
-        structured_total, structured_data = self.check_structured_data(soup)
-        hreflang = self.check_hreflang(soup)
-        breadcrumbs = self.check_breadcrumbs(soup)
-        meta_robots = self.check_meta_robots(soup)
-        last_modified = self.check_last_modified(response)
-        compression = self.check_compression(response)
-        cache_control = self.check_cache_headers(response)
-        images_opt = self.analyze_images_optimization(soup)
-        freshness = self.calculate_content_freshness(response)
-        follow_count, nofollow_count = self.count_follow_nofollow(soup)
-        
+        template = self.url_template(url)
+        if template not in self.template_phrases and len(self.template_phrases) >= PHRASE_TEMPLATE_LIMIT:
+            template = PHRASE_OTHER_TEMPLATE
+        template_sketch = self.template_phrases.setdefault(template, SpaceSaving(PHRASE_TEMPLATE_CAPACITY))
+        self.template_pages[template] += 1
+        for n, phrases in page.items():
+            self.site_phrases[n].update(phrases)
+            template_sketch.update(phrases)
+
+    def _index_page_text(self, url, text):
+        """Запоминает текст страницы и обновляет документные частоты слов для TF-IDF"""
+        if not self.site_stage_enabled('tf_idf'):
+            return
+        old_text = self.all_urls_data.get(url)
+        if old_text is not None:
+            for word in set(self.page_terms(old_text)):
+                if len(word) > 3:
+                    self.word_doc_count[word] -= 1
+        self.all_urls_data[url] = text
+        for word in set(self.page_terms(text)):
+            if len(word) > 3:
+                self.word_doc_count[word] += 1
+
+    # ==================== ШАБЛОННЫЕ БЛОКИ ====================
+
+    TEXT_BLOCK_TAGS = {
+        'html', 'body', 'head', 'title', 'header', 'footer', 'nav', 'main', 'aside', 'section', 'article',
+        'div', 'p', 'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'table', 'thead', 'tbody', 'tr', 'td', 'th',
+        'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'form', 'fieldset', 'blockquote', 'pre', 'figure',
+        'figcaption', 'address', 'details', 'summary',
+    }
+
+    def extract_text_blocks(self, soup):
+        """Видимый текст, разбитый по ближайшему блочному предку: [(hash, text)].
+
+        Склейка текстов блоков через пробел совпадает с soup.get_text(separator=' ', strip=True).
+        """
+        texts = []
+        current, parts = None, []
+        for string in soup.find_all(string=True):
+            if type(string) not in (NavigableString, CData):
+                continue
+            stripped = string.strip()
+            if not stripped:
+                continue
+            block = string.parent
+            while block is not None and block.name not in self.TEXT_BLOCK_TAGS:
+                block = block.parent
+            if block is not current and parts:
+                texts.append(' '.join(parts))
+                parts = []
+            current = block
+            parts.append(stripped)
+        if parts:
+            texts.append(' '.join(parts))
+        return self.hash_text_blocks(texts)
+
+    def hash_text_blocks(self, texts):
+        return [(int.from_bytes(hashlib.blake2b(t.lower().encode('utf-8'), digest_size=8).digest(), 'big'), t)
+                for t in texts]
+
+    def split_template_text(self, blocks):
+        """(контентный текст без шаблонных блоков, весь текст)"""
+        detector = self.template_detector
+        content = ' '.join(t for h, t in blocks if not detector.is_template(h))
+        return content, ' '.join(t for _, t in blocks)
+
+    def _template_fields(self, text, full_text):
+        if text is full_text:
+            return {'template_words': 0, 'template_percent': 0}
+        full_words = len(full_text.split())
+        template_words = full_words - len(text.split())
+        return {
+            'template_words': template_words,
+            'template_percent': round(template_words / full_words * 100, 2) if full_words else 0,
+        }
+
+    def reanalyze_template_warmup(self):
+        """Пересчитывает текстовые метрики страниц, проанализированных до обучения детектора шаблонов"""
+        if not self.template_warmup:
+            return
+        by_url = {r['url']: r for r in self.results}
+        reanalyzed = {}
+        rerun = [name for name in self.metric_plugins
+                 if set(METRIC_PLUGINS[name]['inputs']) & CONTENT_TEXT_INPUTS]
+        for url, soup, response, blocks in self.template_warmup:
+            result = by_url.get(url)
+            if result is None:
+                continue
+            text, full_text = self.split_template_text(blocks)
+            self._index_page_text(url, text)
+            self._count_phrases(url, text)
+            ctx = PageContext(self, soup, url, response, text, full_text)
+            result.update(self._template_fields(text, full_text))
+            for name in rerun:
+                if name not in result.get('analysis_skipped', ()):
+                    result.update(getattr(self, METRIC_PLUGINS[name]['method'])(ctx))
+            if result.get('simhash') is not None:
+                self.simhash_index.add(url, result['simhash'])
+            reanalyzed[url] = result
+        # Точные дубли страниц прогрева получают пересчитанные метрики оригинала
+        keys = {'template_words', 'template_percent'}
+        for name in rerun:
+            keys.update(METRIC_PLUGINS[name]['outputs'])
+        for result in self.results:
+            original = reanalyzed.get(result.get('exact_duplicate_of'))
+            if original is None:
+                continue
+            result.update(copy.deepcopy({k: original[k] for k in keys if k in original}))
+            self._index_page_text(result['url'], self.all_urls_data.get(original['url'], ''))
+            self._count_phrases(result['url'], self.all_urls_data.get(original['url'], ''))
+            if result.get('simhash') is not None:
+                self.simhash_index.add(result['url'], result['simhash'])
+        self.template_warmup = []
+
+    def _copy_defaults(self, defaults):
+        return {k: v.copy() if isinstance(v, (dict, list)) else v for k, v in defaults.items()}
+
+    # ==================== ПЛАГИНЫ МЕТРИК ====================
+
+    def _metric_meta(self, ctx):
+        soup = ctx.soup
+        description = soup.find('meta', {'name': 'description'})
+        canonical = soup.find('link', {'rel': 'canonical'})
         return {
-            'url': url,
-            'status': response.status_code,
             'title': soup.title.string if soup.title else '',
             'title_len': len(soup.title.string) if soup.title else 0,
-            'description': soup.find('meta', {'name': 'description'})['content'] if soup.find('meta', {'name': 'description'}) else '',
-            'desc_len': len(soup.find('meta', {'name': 'description'})['content']) if soup.find('meta', {'name': 'description'}) else 0,
-            'h1_count': len(soup.find_all('h1')),
-            'h1_text': soup.find('h1').string if soup.find('h1') else '',
+            'description': description['content'] if description else '',
+            'desc_len': len(description['content']) if description else 0,
+            'canonical': 1 if canonical else 0,
+            'canonical_url': urljoin(ctx.url, canonical['href'].strip()).split('#')[0] if canonical and canonical.get('href') else '',
+            'og_tags': self.count_og_tags(soup),
+            'meta_robots': self.check_meta_robots(soup),
+            'mobile_friendly': self.check_mobile_friendly(soup),
+            'https_ok': self.check_https(ctx.response),
+            'hreflang': self.check_hreflang(soup),
+            'hreflang_links': self.extract_hreflang(soup, ctx.url),
+        }
+
+    def _stream_meta(self, ctx):
+        page = ctx.soup
+        metas = {}
+        for meta in page.metas:
+            metas.setdefault(meta.get('name'), meta)
+        description = metas.get('description')
+        robots = metas.get('robots')
+        canonical = next((link for link in page.link_tags if 'canonical' in link.get('rel', ())), None)
+        hreflang = [link for link in page.link_tags if 'alternate' in link.get('rel', ()) and 'hreflang' in link]
+        title = page.title or ''
+        return {
+            'title': title,
+            'title_len': len(title),
+            'description': description.get('content', '') if description else '',
+            'desc_len': len(description.get('content', '')) if description else 0,
+            'canonical': 1 if canonical else 0,
+            'canonical_url': urljoin(ctx.url, canonical['href'].strip()).split('#')[0] if canonical and canonical.get('href') else '',
+            'og_tags': sum(1 for meta in page.metas if re.match(r'og:', meta.get('property', ''), re.I)),
+            'meta_robots': robots.get('content', '') if robots else 'default',
+            'mobile_friendly': 1 if 'viewport' in metas else 0,
+            'https_ok': self.check_https(ctx.response),
+            'hreflang': len(hreflang),
+            'hreflang_links': self.extract_hreflang(None, ctx.url, hreflang),
+        }
+
+    def _metric_headings(self, ctx):
+        h1 = ctx.soup.find('h1')
+        return self._heading_fields(ctx, h1.string if h1 else '')
+
+    def _stream_headings(self, ctx):
+        return self._heading_fields(ctx, ctx.soup.h1_string if ctx.soup.tag_counts['h1'] else '')
+
+    def _heading_fields(self, ctx, h1_text):
+        h_hierarchy, h_errors, h_details = ctx.headers
+        distribution = {f'h{level}': 0 for level in range(1, 7)}
+        for _, name, _ in h_details['header_structure']:
+            distribution[name] += 1
+        return {
+            'h1_count': h_details['h1_count'],
+            'h1_text': h1_text,
             'h_hierarchy': h_hierarchy,
             'h_errors': h_errors,
             'h_details': h_details,
-            'heading_distribution': self.analyze_heading_distribution(soup),
-            'words_count': len(text.split()),
-            'unique_percent': self.calculate_unique_percent(text),
-            'boilerplate_percent': self.calculate_boilerplate(text),
-            'readability_score': self.analyze_readability(text),
-            'avg_sentence_length': self.get_avg_sentence_length(text),
-            'avg_word_length': self.get_avg_word_length(text),
-            'complex_words_percent': self.count_complex_words(text),
-            'content_density': self.calculate_content_density(soup, text),
-            'keyword_stuffing_score': self.detect_keyword_stuffing(text),
-            'toxicity_score': self.calculate_toxicity_score(text),
-            'ai_markers': self.detect_ai_markers(text),
-            'filler_phrases': self.count_filler_phrases(text),
-            'images_count': len(soup.find_all('img')),
-            'images_no_alt': len([img for img in soup.find_all('img') if not img.get('alt')]),
-            'int_links': len(soup.find_all('a', href=True)),
+            'heading_distribution': distribution,
+        }
+
+    def _metric_text_basic(self, ctx):
+        return {'words_count': len(ctx.words)}
+
+    def _metric_links(self, ctx):
+        follow_count, nofollow_count = self.count_follow_nofollow(ctx.soup, ctx.links)
+        return {
+            'int_links': len(ctx.links),
+            'outgoing_links_internal': len([l for l in ctx.links if self.is_valid_url_to_crawl(urljoin(ctx.url, l['href']))]),
+            'follow_links': follow_count,
+            'nofollow_links': nofollow_count,
+        }
+
+    def _metric_images(self, ctx):
+        images_opt = self.analyze_images_optimization(ctx.soup, ctx.images)
+        return {
+            'images_count': images_opt['total'],
+            'images_no_alt': images_opt['no_alt'],
+            'images_optimization': images_opt,
+        }
+
+    def _metric_http(self, ctx):
+        response = ctx.response
+        return {
+            'last_modified': self.check_last_modified(response),
+            'compression': self.check_compression(response),
+            'cache_control': self.check_cache_headers(response),
+            'content_freshness_days': self.calculate_content_freshness(response),
+        }
+
+    def _metric_structure(self, ctx):
+        soup = ctx.soup
+        return {
+            **self._schema_fields(ctx),
+            'breadcrumbs': self.check_breadcrumbs(soup),
             'semantic_tags_count': self.count_semantic_tags(soup),
-            'canonical': 1 if soup.find('link', {'rel': 'canonical'}) else 0,
-            'schema': 1 if soup.find('script', {'type': 'application/ld+json'}) else 0,
-            'og_tags': self.count_og_tags(soup),
-            'js_dependence': self.check_js_dependence(soup),
-            'dom_nodes': self.count_dom_nodes(soup),
             'has_main_tag': 1 if soup.find('main') else 0,
-            'html_quality_score': self.calculate_html_quality_score(soup),
-            'deprecated_tags': self.detect_deprecated_tags(soup),
+        }
+
+    def _stream_structure(self, ctx):
+        page = ctx.soup
+        return {
+            **self._schema_fields(ctx),
+            'breadcrumbs': page.breadcrumbs,
+            'semantic_tags_count': sum(page.tag_counts[tag] for tag in self.SEMANTIC_TAGS),
+            'has_main_tag': 1 if page.tag_counts['main'] else 0,
+        }
+
+    def _schema_fields(self, ctx):
+        structured = ctx.structured_data
+        structured_total, structured_data = self.check_structured_data(None, structured)
+        schema_types = sorted({name for name, _ in structured['items']})
+        return {
+            'structured_data': structured_total,
+            'structured_data_detail': structured_data,
+            'schema': 1 if schema_types else 0,
+            'schema_types': schema_types,
+            'schema_nested_types': sorted(structured['types'].difference(schema_types)),
+            'schema_missing': self.schema_completeness(structured['items']),
+        }
+
+    def _metric_issues(self, ctx):
+        # Проблемы страниц считаются по правилам после краулинга (calculate_site_health_scores)
+        return {}
+
+    def _metric_readability(self, ctx):
+        return {
+            **ctx.text_stats,
+            'content_density': self.calculate_content_density(ctx.soup, ctx.text, ctx.page_text),
+        }
+
+    def _metric_toxicity(self, ctx):
+        text = ctx.text
+        stuffing = self.detect_keyword_stuffing(text)
+        ai = self.detect_ai_markers(text)
+        filler = self.count_filler_phrases(text)
+        return {
+            'keyword_stuffing_score': stuffing,
+            'toxicity_score': self.calculate_toxicity_score(text, stuffing, ai, filler),
+            'ai_markers': ai,
+            'filler_phrases': filler,
+        }
+
+    def _metric_keywords(self, ctx):
+        return {
+            'top_keywords': self.extract_top_keywords(ctx.text),
+            'keyword_density_profile': self.get_keyword_density_profile(ctx.text),
+        }
+
+    def _metric_simhash(self, ctx):
+        return {'simhash': self.compute_simhash(ctx.text)}
+
+    def _metric_html_quality(self, ctx):
+        soup = ctx.soup
+        dom_nodes = self.count_dom_nodes(soup)
+        deprecated = self.detect_deprecated_tags(soup)
+        return {
+            'dom_nodes': dom_nodes,
+            'html_quality_score': self.calculate_html_quality_score(soup, dom_nodes, deprecated),
+            'deprecated_tags': deprecated,
             'hidden_content': self.detect_hidden_content(soup),
-            'cloaking_detected': self.detect_cloaking(soup, text),
-            'has_contact_info': self.detect_contact_info(soup, text),
-            'has_legal_docs': self.detect_legal_docs(soup),
-            'has_author_info': self.detect_author_info(soup),
-            'has_reviews': self.detect_reviews(soup),
-            'trust_badges': self.detect_trust_badges(soup),
-            'trust_score': self.calculate_trust_score(soup, text),
-            'eeat_score': self.calculate_eeat_score(soup, text),
-            'eeat_components': self.analyze_eeat_components(soup, text),
+            'cloaking_detected': self.detect_cloaking(soup, ctx.full_text),
+            'js_dependence': self.check_js_dependence(soup),
+        }
+
+    def _metric_trust(self, ctx):
+        signals = ctx.trust_signals
+        return {
+            'has_contact_info': signals['contact'],
+            'has_legal_docs': signals['legal'],
+            'has_author_info': signals['author'],
+            'has_reviews': signals['reviews'],
+            'trust_badges': signals['badges'],
+            'trust_score': self.calculate_trust_score(ctx.soup, ctx.full_text, signals),
+        }
+
+    def _metric_eeat(self, ctx):
+        components = self.analyze_eeat_components(ctx.soup, ctx.full_text, ctx.trust_signals, ctx.links,
+                                                  ctx.structured_data)
+        return {
+            'eeat_score': self.calculate_eeat_score(ctx.soup, ctx.full_text, components),
+            'eeat_components': components,
+        }
+
+    def _metric_engagement(self, ctx):
+        soup = ctx.soup
+        return {
             'cta_count': self.count_ctas(soup),
             'cta_text_quality': self.evaluate_cta_text(soup),
             'lists_count': len(soup.find_all(['ul', 'ol'])),
             'tables_count': len(soup.find_all('table')),
             'faq_count': self.count_faq(soup),
-            'site_health_score': 0,
-            'top_keywords': self.extract_top_keywords(text),
-            'keyword_density_profile': self.get_keyword_density_profile(text),
-            'tf_idf_keywords': {},
-            'page_authority': 0,
-            'incoming_links_count': 0,
-            'outgoing_links_internal': len([l for l in soup.find_all('a', href=True) if self.is_valid_url_to_crawl(urljoin(url, l['href']))]),
-            'is_orphan': False,
-            'semantic_links': [],
-            'is_topic_hub': False,
-            'topic_cluster': None,
-            'anchor_text_quality_score': 0,
-            'total_links': 0,
-            'linking_quality_score': 0,
-            'all_issues': all_issues,
-            'https_ok': https_ok,
-            'mobile_friendly': mobile_friendly,
-            'structured_data': structured_total,
-            'structured_data_detail': structured_data,
-            'hreflang': hreflang,
-            'breadcrumbs': breadcrumbs,
-            'meta_robots': meta_robots,
-            'last_modified': last_modified,
-            'compression': compression,
-            'cache_control': cache_control,
-            'images_optimization': images_opt,
-            'content_freshness_days': freshness,
-            'follow_links': follow_count,
-            'nofollow_links': nofollow_count,
         }
 
     # ==================== ФОРМАТИРОВАНИЕ EXCEL ====================
@@ -1092,9 +5132,10 @@ class SEOAuditParser:
 
     # ==================== ГЕНЕРАЦИЯ EXCEL (16 ВКЛАДОК) ====================
 
-    def generate_excel_report(self):
+    def generate_excel_report(self, filename=None):
         """Генерирует ПОЛНЫЙ Excel отчёт с 16+ вкладками"""
-        filename = f"{self.domain.replace('.', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        if filename is None:
+            filename = f"{self.domain.replace('.', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         wb = Workbook()
         
         if 'Sheet' in wb.sheetnames:
@@ -1102,7 +5143,7 @@ class SEOAuditParser:
         
         # ВКЛАДКА 1: ОСНОВНОЙ ОТЧЁТ
         ws = wb.create_sheet('1. Основной отчёт', 0)
-        headers = ['URL', 'Title', 'H1', 'Токсичность', 'Иерархия', 'Статус', 'Проблемы']
+        headers = ['URL', 'Title', 'H1', 'Токсичность', 'Иерархия', 'Статус', 'Проблемы', 'Точный дубль']
         for col, header in enumerate(headers, 1):
             self.apply_header_style(ws.cell(row=1, column=col), header)
         
@@ -1120,11 +5161,13 @@ class SEOAuditParser:
             self.apply_cell_color(ws.cell(row=row, column=5), bg, fg, hier)
             
             health = result['site_health_score']
-            bg, fg, icon = self.get_status_color(health)
-            self.apply_cell_color(ws.cell(row=row, column=6), bg, fg, f"{icon} {health:.0f}")
+            if health is not None:
+                bg, fg, icon = self.get_status_color(health)
+                self.apply_cell_color(ws.cell(row=row, column=6), bg, fg, f"{icon} {health:.0f}")
             
             issues = result.get('all_issues', [])[:2]
             ws.cell(row=row, column=7).value = '\n'.join(issues) if issues else '✅'
+            ws.cell(row=row, column=8).value = result['exact_duplicate_of'] or '-'
         
         self.auto_width_columns(ws)
         
@@ -1191,7 +5234,7 @@ class SEOAuditParser:
         
         # ВКЛАДКА 4: CONTENT
         ws_content = wb.create_sheet('4. Content', 3)
-        headers_content = ['URL', 'Words', 'Unique %', 'Readability', 'Toxicity', 'AI Markers', 'Filler']
+        headers_content = ['URL', 'Words', 'Unique %', 'Readability', 'Toxicity', 'AI Markers', 'Filler', 'Template %']
         for col, header in enumerate(headers_content, 1):
             self.apply_header_style(ws_content.cell(row=1, column=col), header)
         
@@ -1211,12 +5254,14 @@ class SEOAuditParser:
             
             ws_content.cell(row=row, column=6).value = result['ai_markers']
             ws_content.cell(row=row, column=7).value = result['filler_phrases']
+            ws_content.cell(row=row, column=8).value = f"{result['template_percent']:.0f}%"
         
         self.auto_width_columns(ws_content)
         
         # ВКЛАДКА 5: TECHNICAL
         ws_tech = wb.create_sheet('5. Technical', 4)
-        headers_tech = ['URL', 'DOM', 'HTML Score', 'HTTPS', 'Compression', 'Cache', 'Deprecated']
+        headers_tech = ['URL', 'DOM', 'HTML Score', 'HTTPS', 'Compression', 'Cache', 'Deprecated', 'TTFB ms', 'Total ms',
+                        'Analysis ms', 'Analysis']
         for col, header in enumerate(headers_tech, 1):
             self.apply_header_style(ws_tech.cell(row=1, column=col), header)
         
@@ -1235,6 +5280,15 @@ class SEOAuditParser:
             ws_tech.cell(row=row, column=5).value = 'Yes' if result['compression'] else 'No'
             ws_tech.cell(row=row, column=6).value = 'Set' if result['cache_control'] != 'not set' else 'No'
             ws_tech.cell(row=row, column=7).value = result['deprecated_tags']
+            ws_tech.cell(row=row, column=8).value = result['ttfb_ms']
+            ws_tech.cell(row=row, column=9).value = result['total_ms']
+            ws_tech.cell(row=row, column=10).value = result.get('analysis_ms')
+            mode = result.get('analysis_mode', 'full')
+            if mode == 'full':
+                ws_tech.cell(row=row, column=11).value = mode
+            else:
+                self.apply_cell_color(ws_tech.cell(row=row, column=11), self.colors['yellow_light'],
+                                      self.colors['yellow_dark'], f'⚠️ {mode}')
         
         self.auto_width_columns(ws_tech)
         
@@ -1285,8 +5339,9 @@ class SEOAuditParser:
         for row, result in enumerate(self.results, 2):
             ws_health.cell(row=row, column=1).value = result['url']
             health = result['site_health_score']
-            bg, fg, icon = self.get_status_color(health)
-            self.apply_cell_color(ws_health.cell(row=row, column=2), bg, fg, f"{icon} {health:.0f}")
+            if health is not None:
+                bg, fg, icon = self.get_status_color(health)
+                self.apply_cell_color(ws_health.cell(row=row, column=2), bg, fg, f"{icon} {health:.0f}")
             ws_health.cell(row=row, column=3).value = result['words_count']
             ws_health.cell(row=row, column=4).value = f"{result['unique_percent']:.1f}%"
             
@@ -1298,7 +5353,7 @@ class SEOAuditParser:
         
         # ВКЛАДКА 9: INTERNAL LINKS
         ws_links = wb.create_sheet('9. Internal Links', 8)
-        headers_links = ['URL', 'Authority', 'Incoming', 'Outgoing', 'Is Orphan']
+        headers_links = ['URL', 'Authority', 'Incoming', 'Outgoing', 'Is Orphan', 'Broken Out']
         for col, header in enumerate(headers_links, 1):
             self.apply_header_style(ws_links.cell(row=1, column=col), header)
         
@@ -1308,6 +5363,7 @@ class SEOAuditParser:
             ws_links.cell(row=row, column=3).value = result['incoming_links_count']
             ws_links.cell(row=row, column=4).value = result['outgoing_links_internal']
             ws_links.cell(row=row, column=5).value = '❌ ORPHAN' if result['is_orphan'] else '✅'
+            ws_links.cell(row=row, column=6).value = result['broken_outgoing_links']
         
         self.auto_width_columns(ws_links)
         
@@ -1337,7 +5393,7 @@ class SEOAuditParser:
         
         # ВКЛАДКА 11: EXTERNAL LINKS
         ws_ext = wb.create_sheet('11. External Links', 10)
-        headers_ext = ['URL', 'Total External', 'Follow', 'NoFollow', 'Follow %']
+        headers_ext = ['URL', 'Total External', 'Follow', 'NoFollow', 'Follow %', 'Broken External']
         for col, header in enumerate(headers_ext, 1):
             self.apply_header_style(ws_ext.cell(row=1, column=col), header)
         
@@ -1350,12 +5406,33 @@ class SEOAuditParser:
             
             follow_pct = (result['follow_links'] / total * 100) if total > 0 else 0
             ws_ext.cell(row=row, column=5).value = f"{follow_pct:.0f}%"
+            ws_ext.cell(row=row, column=6).value = result['broken_external_links']
+        
+        # Проверенные внешние ссылки (--verify-external)
+        if self.external_checks:
+            row_e = len(self.results) + 3
+            headers_checks = ['External URL', 'Domain', 'Status', 'Final URL', 'Error', 'Dead Domain', 'Sources']
+            for col, header in enumerate(headers_checks, 1):
+                self.apply_header_style(ws_ext.cell(row=row_e, column=col), header)
+            for link in sorted(self.external_checks, key=lambda l: (not l['broken'], l['domain'])):
+                row_e += 1
+                ws_ext.cell(row=row_e, column=1).value = link['url']
+                ws_ext.cell(row=row_e, column=2).value = link['domain']
+                ws_ext.cell(row=row_e, column=4).value = link['final_url']
+                ws_ext.cell(row=row_e, column=5).value = link['error'] or '-'
+                ws_ext.cell(row=row_e, column=6).value = '❌ DEAD' if link['dead_domain'] else '✅'
+                ws_ext.cell(row=row_e, column=7).value = len(link['sources'])
+                if link['broken']:
+                    bg, font, _ = self.get_status_color_bool(False)
+                    self.apply_cell_color(ws_ext.cell(row=row_e, column=3), bg, font, link['status'] or '❌')
+                else:
+                    ws_ext.cell(row=row_e, column=3).value = link['status']
         
         self.auto_width_columns(ws_ext)
         
         # ВКЛАДКА 12: STRUCTURED DATA
         ws_struct = wb.create_sheet('12. Structured Data', 11)
-        headers_struct = ['URL', 'Total', 'JSON-LD', 'Microdata', 'RDFa', 'Hreflang', 'Meta Robots']
+        headers_struct = ['URL', 'Total', 'JSON-LD', 'Microdata', 'RDFa', 'Hreflang', 'Meta Robots', 'Schema Types']
         for col, header in enumerate(headers_struct, 1):
             self.apply_header_style(ws_struct.cell(row=1, column=col), header)
         
@@ -1369,6 +5446,7 @@ class SEOAuditParser:
             ws_struct.cell(row=row, column=5).value = detail.get('rdfa', 0)
             ws_struct.cell(row=row, column=6).value = result['hreflang']
             ws_struct.cell(row=row, column=7).value = result['meta_robots']
+            ws_struct.cell(row=row, column=8).value = ', '.join(result['schema_types']) or '-'
         
         self.auto_width_columns(ws_struct)
         
@@ -1442,8 +5520,9 @@ class SEOAuditParser:
             ws_lq.cell(row=row, column=1).value = result['url']
             
             score = result['linking_quality_score']
-            bg, fg, icon = self.get_status_color(score)
-            self.apply_cell_color(ws_lq.cell(row=row, column=2), bg, fg, f"{icon} {score}")
+            if score is not None:
+                bg, fg, icon = self.get_status_color(score)
+                self.apply_cell_color(ws_lq.cell(row=row, column=2), bg, fg, f"{icon} {score}")
             
             ws_lq.cell(row=row, column=3).value = result.get('total_links', 0)
             ws_lq.cell(row=row, column=4).value = f"{result['anchor_text_quality_score']:.0f}%"
@@ -1453,6 +5532,282 @@ class SEOAuditParser:
         
         self.auto_width_columns(ws_lq)
         
+        # ВКЛАДКА 17: NEAR DUPLICATES
+        ws_dup = wb.create_sheet('17. Near Duplicates', 16)
+        headers_dup = ['Group', 'URL', 'Title', 'Nearest Duplicate', 'Distance', 'Words', 'Links Expanded']
+        for col, header in enumerate(headers_dup, 1):
+            self.apply_header_style(ws_dup.cell(row=1, column=col), header)
+        
+        by_url = {r['url']: r for r in self.results}
+        row_d = 2
+        for group_id, urls in self.duplicate_groups.items():
+            for url in urls:
+                result = by_url[url]
+                ws_dup.cell(row=row_d, column=1).value = group_id
+                ws_dup.cell(row=row_d, column=2).value = url
+                ws_dup.cell(row=row_d, column=3).value = result['title'] if result['title'] else '-'
+                ws_dup.cell(row=row_d, column=4).value = result['nearest_duplicate_url']
+                ws_dup.cell(row=row_d, column=5).value = result['nearest_duplicate_distance']
+                ws_dup.cell(row=row_d, column=6).value = result['words_count']
+                ws_dup.cell(row=row_d, column=7).value = '✅' if result['links_expanded'] else '⏭️ Пропущено'
+                row_d += 1
+        
+        self.auto_width_columns(ws_dup, 80)
+        
+        # ЛИСТ 18: Бюджет краулинга
+        ws_budget = wb.create_sheet('18. Crawl Budget', 17)
+        summary = self.frontier_summary()
+        summary_rows = [
+            ('Порядок обхода', self.crawl_order),
+            ('Просканировано URL', summary['crawled']),
+            ('Осталось во фронтире', summary['pending']),
+            ('Не просканировано, %', summary['uncrawled_percent']),
+            ('Отброшено ссылок сверх лимита фронтира', summary['dropped_links']),
+        ]
+        for row_b, (label, value) in enumerate(summary_rows, 1):
+            ws_budget.cell(row=row_b, column=1).value = label
+            ws_budget.cell(row=row_b, column=2).value = value
+        
+        headers_budget = ['Непросканированный URL', 'Depth', 'Priority', 'Inlinks', 'In Sitemap']
+        header_row = len(summary_rows) + 2
+        for col, header in enumerate(headers_budget, 1):
+            self.apply_header_style(ws_budget.cell(row=header_row, column=col), header)
+        for row_b, item in enumerate(summary['top'], header_row + 1):
+            ws_budget.cell(row=row_b, column=1).value = item['url']
+            ws_budget.cell(row=row_b, column=2).value = item['depth']
+            ws_budget.cell(row=row_b, column=3).value = item['priority']
+            ws_budget.cell(row=row_b, column=4).value = item['inlinks']
+            ws_budget.cell(row=row_b, column=5).value = '✅' if item['in_sitemap'] else '-'
+        
+        self.auto_width_columns(ws_budget, 80)
+        
+        # ЛИСТ 19: Битые ссылки и редиректы (--verify-links)
+        ws_bl = wb.create_sheet('19. Broken Links', 18)
+        headers_bl = ['URL', 'Status', 'Error', 'Final URL', 'Redirect Chain', 'Sources', 'Source Pages']
+        for col, header in enumerate(headers_bl, 1):
+            self.apply_header_style(ws_bl.cell(row=1, column=col), header)
+        
+        problem_links = [link for link in self.broken_links if link['error'] == 'invalid url']
+        problem_links += [link for link in self.link_checks if link['broken'] or link['chain']]
+        for row_bl, link in enumerate(problem_links, 2):
+            ws_bl.cell(row=row_bl, column=1).value = link['url']
+            ws_bl.cell(row=row_bl, column=2).value = link['status']
+            ws_bl.cell(row=row_bl, column=3).value = link['error'] or '-'
+            ws_bl.cell(row=row_bl, column=4).value = link.get('final_url', '-')
+            ws_bl.cell(row=row_bl, column=5).value = ' → '.join(f'{hop} ({code})' for hop, code in link['chain']) or '-'
+            ws_bl.cell(row=row_bl, column=6).value = len(link['sources'])
+            ws_bl.cell(row=row_bl, column=7).value = '\n'.join(link['sources'][:10])
+            if link['error'] == 'invalid url' or link.get('broken'):
+                bg, font, _ = self.get_status_color_bool(False)
+                self.apply_cell_color(ws_bl.cell(row=row_bl, column=2), bg, font, link['status'] or '❌')
+        
+        self.auto_width_columns(ws_bl, 80)
+        
+        # ЛИСТ 20: Редиректы и canonical
+        ws_rd = wb.create_sheet('20. Redirects & Canonical', 19)
+        headers_rd = ['Redirect URL', 'Hops', 'Chain', 'Final URL', 'Final Status', 'Issue', 'Linked From']
+        for col, header in enumerate(headers_rd, 1):
+            self.apply_header_style(ws_rd.cell(row=1, column=col), header)
+        row_r = 1
+        for redirect in sorted(self.redirects, key=lambda r: (not r.get('issue'), r['url'])):
+            row_r += 1
+            ws_rd.cell(row=row_r, column=1).value = redirect['url']
+            ws_rd.cell(row=row_r, column=2).value = len(redirect['chain'])
+            ws_rd.cell(row=row_r, column=3).value = ' → '.join(f'{hop} ({code})' for hop, code in redirect['chain'])
+            ws_rd.cell(row=row_r, column=4).value = redirect['final_url']
+            ws_rd.cell(row=row_r, column=5).value = redirect.get('final_status')
+            ws_rd.cell(row=row_r, column=6).value = redirect.get('issue') or '✅'
+            ws_rd.cell(row=row_r, column=7).value = len(redirect.get('sources', []))
+        
+        row_r += 2
+        headers_can = ['Page', 'Canonical URL', 'Canonical Status', 'Issue']
+        for col, header in enumerate(headers_can, 1):
+            self.apply_header_style(ws_rd.cell(row=row_r, column=col), header)
+        for result in self.results:
+            if not result['canonical_issue']:
+                continue
+            row_r += 1
+            ws_rd.cell(row=row_r, column=1).value = result['url']
+            ws_rd.cell(row=row_r, column=2).value = result['canonical_url']
+            ws_rd.cell(row=row_r, column=3).value = result['canonical_status']
+            ws_rd.cell(row=row_r, column=4).value = result['canonical_issue']
+        
+        self.auto_width_columns(ws_rd, 80)
+        
+        # ЛИСТ 21: Вес страниц (--page-weight)
+        ws_pw = wb.create_sheet('21. Page Weight', 20)
+        headers_pw = ['URL', 'Total KB', 'HTML KB', 'Images KB', 'Scripts KB', 'CSS KB', 'Resources', 'Missing']
+        for col, header in enumerate(headers_pw, 1):
+            self.apply_header_style(ws_pw.cell(row=1, column=col), header)
+        by_weight = sorted(self.results, key=lambda r: -r['page_weight_bytes'])
+        for row_w, result in enumerate(by_weight, 2):
+            ws_pw.cell(row=row_w, column=1).value = result['url']
+            ws_pw.cell(row=row_w, column=2).value = round(result['page_weight_bytes'] / 1024, 1)
+            ws_pw.cell(row=row_w, column=3).value = round(result['html_bytes'] / 1024, 1)
+            ws_pw.cell(row=row_w, column=4).value = round(result['image_bytes'] / 1024, 1)
+            ws_pw.cell(row=row_w, column=5).value = round(result['script_bytes'] / 1024, 1)
+            ws_pw.cell(row=row_w, column=6).value = round(result['css_bytes'] / 1024, 1)
+            ws_pw.cell(row=row_w, column=7).value = result['resource_count']
+            ws_pw.cell(row=row_w, column=8).value = result['missing_resources']
+        
+        row_w = len(self.results) + 3
+        templates = defaultdict(list)
+        for result in self.results:
+            templates[self.url_template(result['url'])].append(result['page_weight_bytes'])
+        for col, header in enumerate(['URL Template', 'Pages', 'Avg KB', 'Max KB'], 1):
+            self.apply_header_style(ws_pw.cell(row=row_w, column=col), header)
+        for template, weights in sorted(templates.items(), key=lambda item: -sum(item[1]) / len(item[1])):
+            row_w += 1
+            ws_pw.cell(row=row_w, column=1).value = template
+            ws_pw.cell(row=row_w, column=2).value = len(weights)
+            ws_pw.cell(row=row_w, column=3).value = round(sum(weights) / len(weights) / 1024, 1)
+            ws_pw.cell(row=row_w, column=4).value = round(max(weights) / 1024, 1)
+        
+        row_w += 2
+        for col, header in enumerate(['Heaviest Resource', 'Type', 'Content-Type', 'KB', 'Status', 'Pages'], 1):
+            self.apply_header_style(ws_pw.cell(row=row_w, column=col), header)
+        for resource in self.heaviest_resources():
+            row_w += 1
+            ws_pw.cell(row=row_w, column=1).value = resource['url']
+            ws_pw.cell(row=row_w, column=2).value = resource['kind']
+            ws_pw.cell(row=row_w, column=3).value = resource['content_type'] or '-'
+            ws_pw.cell(row=row_w, column=4).value = round((resource['bytes'] or 0) / 1024, 1)
+            ws_pw.cell(row=row_w, column=5).value = resource['status'] or resource['error']
+            ws_pw.cell(row=row_w, column=6).value = resource['pages']
+        
+        self.auto_width_columns(ws_pw, 80)
+        
+        # ЛИСТ 22: Тайминги запросов
+        ws_tm = wb.create_sheet('22. Timing', 21)
+        bucket_names = [f'<{TIMING_BUCKETS_MS[0]}'] + [f'{low}-{high}' for low, high in zip(TIMING_BUCKETS_MS, TIMING_BUCKETS_MS[1:])]
+        bucket_names.append(f'{TIMING_BUCKETS_MS[-1]}+')
+        headers_tm = ['Group', 'Key', 'Requests', 'TTFB mean', 'TTFB p50', 'TTFB p90', 'TTFB p95', 'TTFB p99',
+                      'Total p50', 'Total p95', 'Avg KB'] + [f'Total {name} ms' for name in bucket_names]
+        for col, header in enumerate(headers_tm, 1):
+            self.apply_header_style(ws_tm.cell(row=1, column=col), header)
+        for row_t, item in enumerate(self.timing_summary(), 2):
+            values = [item['group'], item['key'], item['requests'], item['ttfb_mean'], item['ttfb_p50'],
+                      item['ttfb_p90'], item['ttfb_p95'], item['ttfb_p99'], item['total_p50'], item['total_p95'],
+                      round(item['bytes_mean'] / 1024, 1)] + item['histogram']
+            for col, value in enumerate(values, 1):
+                ws_tm.cell(row=row_t, column=col).value = value
+        
+        self.auto_width_columns(ws_tm, 60)
+        
+        # ЛИСТ 23: Hreflang
+        ws_hl = wb.create_sheet('23. Hreflang', 22)
+        headers_hl = ['Page', 'Lang', 'Target', 'Issue']
+        for col, header in enumerate(headers_hl, 1):
+            self.apply_header_style(ws_hl.cell(row=1, column=col), header)
+        for row_h, item in enumerate(self.hreflang_issues, 2):
+            ws_hl.cell(row=row_h, column=1).value = item['page']
+            ws_hl.cell(row=row_h, column=2).value = item['lang'] or '-'
+            ws_hl.cell(row=row_h, column=3).value = item['target'] or '-'
+            ws_hl.cell(row=row_h, column=4).value = item['issue']
+        
+        self.auto_width_columns(ws_hl, 80)
+        
+        # ЛИСТ 24: Schema Types
+        ws_sc = wb.create_sheet('24. Schema Types', 23)
+        headers_sc = ['Type', 'Pages', 'Complete', 'Incomplete', 'Nested Only', 'Missing Properties', 'Example URL']
+        for col, header in enumerate(headers_sc, 1):
+            self.apply_header_style(ws_sc.cell(row=1, column=col), header)
+        row_s = 2
+        for name, entry in self.schema_type_index().items():
+            ws_sc.cell(row=row_s, column=1).value = name
+            ws_sc.cell(row=row_s, column=2).value = len(entry['pages'])
+            ws_sc.cell(row=row_s, column=3).value = len(entry['pages']) - entry['incomplete'] - entry['nested']
+            ws_sc.cell(row=row_s, column=4).value = entry['incomplete']
+            ws_sc.cell(row=row_s, column=5).value = entry['nested']
+            ws_sc.cell(row=row_s, column=6).value = ', '.join(f'{prop} ({count})' for prop, count
+                                                               in entry['missing'].most_common()) or '-'
+            ws_sc.cell(row=row_s, column=7).value = entry['pages'][0]
+            row_s += 1
+        
+        row_s += 1
+        headers_tpl = ['Template', 'Pages', 'Types (pages)', 'Lacking (pages without)']
+        for col, header in enumerate(headers_tpl, 1):
+            self.apply_header_style(ws_sc.cell(row=row_s, column=col), header)
+        for item in self.schema_template_coverage():
+            row_s += 1
+            ws_sc.cell(row=row_s, column=1).value = item['template']
+            ws_sc.cell(row=row_s, column=2).value = item['pages']
+            ws_sc.cell(row=row_s, column=3).value = ', '.join(f'{name} ({count})' for name, count
+                                                               in item['types'].most_common()) or '❌ Нет разметки'
+            ws_sc.cell(row=row_s, column=4).value = ', '.join(f'{name} ({count})' for name, count
+                                                               in sorted(item['lacking'].items())) or '-'
+        
+        self.auto_width_columns(ws_sc, 80)
+        
+        # ЛИСТ 25: Phrases
+        ws_ph = wb.create_sheet('25. Phrases', 24)
+        headers_ph = ['Words', 'Phrase', 'Count', 'Error ±']
+        for col, header in enumerate(headers_ph, 1):
+            self.apply_header_style(ws_ph.cell(row=1, column=col), header)
+        row_p = 1
+        for n, sketch in self.site_phrases.items():
+            for phrase, count, error in sketch.top(100):
+                row_p += 1
+                ws_ph.cell(row=row_p, column=1).value = n
+                ws_ph.cell(row=row_p, column=2).value = phrase
+                ws_ph.cell(row=row_p, column=3).value = count
+                ws_ph.cell(row=row_p, column=4).value = error
+        
+        row_p += 2
+        headers_tp = ['Template', 'Pages', 'Top Phrases']
+        for col, header in enumerate(headers_tp, 1):
+            self.apply_header_style(ws_ph.cell(row=row_p, column=col), header)
+        for template, pages in self.template_pages.most_common():
+            row_p += 1
+            ws_ph.cell(row=row_p, column=1).value = template
+            ws_ph.cell(row=row_p, column=2).value = pages
+            ws_ph.cell(row=row_p, column=3).value = ', '.join(
+                f'{phrase} ({count})' for phrase, count, _ in self.template_phrases[template].top(10)) or '-'
+        
+        self.auto_width_columns(ws_ph, 100)
+        
+        # ЛИСТ 26: Sample
+        ws_sa = wb.create_sheet('26. Sample', 25)
+        estimates = self.sample_estimates() if self.sample_size else None
+        headers_sa = ['Template', 'URLs', 'Sampled', 'Sampled %'] + [
+            f'{metric} (95% CI)' for metric in SAMPLE_METRICS] + ['Issues (est. pages, 95% CI)']
+        for col, header in enumerate(headers_sa, 1):
+            self.apply_header_style(ws_sa.cell(row=1, column=col), header)
+        
+        def interval(value):
+            mean, low, high = value
+            return f'{mean:.1f}' if low is None else f'{mean:.1f} [{low:.1f}; {high:.1f}]'
+        
+        rows_sa = []
+        if estimates:
+            rows_sa = [{'template': 'Весь сайт', 'population': estimates['population'], 'sampled': estimates['sampled'],
+                        'metrics': estimates['metrics'], 'issues': estimates['issues']}] + estimates['templates']
+        for row_a, item in enumerate(rows_sa, 2):
+            values = [item['template'], item['population'], item['sampled'],
+                      round(item['sampled'] / item['population'] * 100, 1) if item['population'] else 0]
+            values += [interval(item['metrics'][metric]) if metric in item['metrics'] else '-' for metric in SAMPLE_METRICS]
+            values.append('\n'.join(f'{label}: {count}' + ('' if low is None else f' [{low}; {high}]')
+                                    for label, (count, low, high) in item['issues'].items()) or '-')
+            for col, value in enumerate(values, 1):
+                ws_sa.cell(row=row_a, column=col).value = value
+        
+        self.auto_width_columns(ws_sa, 60)
+        
+        # ЛИСТ 27: Ловушки краулинга
+        ws_tr = wb.create_sheet('27. Crawl Traps', 26)
+        headers_tr = ['Pattern', 'Reason', 'Pruned URLs', 'Example']
+        for col, header in enumerate(headers_tr, 1):
+            self.apply_header_style(ws_tr.cell(row=1, column=col), header)
+        
+        traps = self.trap_detector.report() if self.trap_detector else []
+        for row_t, trap in enumerate(traps, 2):
+            ws_tr.cell(row=row_t, column=1).value = trap['pattern']
+            ws_tr.cell(row=row_t, column=2).value = TRAP_REASONS[trap['reason']]
+            ws_tr.cell(row=row_t, column=3).value = trap['pruned']
+            ws_tr.cell(row=row_t, column=4).value = trap['example']
+        
+        self.auto_width_columns(ws_tr, 80)
+        
         wb.save(filename)
         return filename
 
@@ -1512,11 +5867,20 @@ class SEOAuditParser:
         doc.add_paragraph('✅ Уникальность минимум 50%', style='List Bullet')
         doc.add_paragraph('✅ Читаемость от 60 баллов', style='List Bullet')
         doc.add_paragraph('✅ Без keyword stuffing (максимум 3% плотность)', style='List Bullet')
+        if self.duplicate_groups:
+            dup_pages = sum(len(urls) for urls in self.duplicate_groups.values())
+            doc.add_paragraph(f'Почти-дубли (SimHash): {len(self.duplicate_groups)} групп, {dup_pages} страниц')
         
         # РАЗДЕЛ 4
         doc.add_heading('3️⃣ 4. ОПТИМИЗАЦИЯ КАРТИНОК', level=1)
         img_issues = sum(r['images_no_alt'] for r in self.results)
         doc.add_paragraph(f'Всего картинок без ALT: {img_issues}')
+        if self.resource_sizes:
+            avg_weight = sum(r['page_weight_bytes'] for r in self.results) / len(self.results) / 1024
+            doc.add_paragraph(f'Средний вес страницы: {avg_weight:.0f} KB, уникальных ресурсов: {len(self.resource_sizes)}')
+            for resource in self.heaviest_resources(5):
+                doc.add_paragraph(f"{resource['url']} — {(resource['bytes'] or 0) / 1024:.0f} KB "
+                                  f"({resource['kind']}, на {resource['pages']} стр.)", style='List Bullet')
         doc.add_paragraph('Решение: Добавьте описательный ALT текст')
         doc.add_paragraph('Правила ALT текста:')
         doc.add_paragraph('✅ Описывайте, что на картинке (не просто "картинка")', style='List Bullet')
@@ -1529,7 +5893,73 @@ class SEOAuditParser:
         doc.add_paragraph(f'HTTPS: {sum(1 for r in self.results if r["https_ok"])} из {len(self.results)} ({round(sum(1 for r in self.results if r["https_ok"]) / len(self.results) * 100, 1)}%)')
         doc.add_paragraph(f'Mobile Friendly: {sum(1 for r in self.results if r["mobile_friendly"])} из {len(self.results)}')
         doc.add_paragraph(f'Schema Markup: {sum(1 for r in self.results if r["schema"])} из {len(self.results)}')
+        for name, entry in list(self.schema_type_index().items())[:10]:
+            missing = ', '.join(prop for prop, _ in entry['missing'].most_common(3))
+            doc.add_paragraph(f"{name}: {len(entry['pages'])} стр." + (f", неполных {entry['incomplete']} (нет: {missing})"
+                                                                      if entry['incomplete'] else ''), style='List Bullet')
         doc.add_paragraph(f'Canonical Tags: {sum(1 for r in self.results if r["canonical"])} из {len(self.results)}')
+        if self.link_checks:
+            broken_links = [link for link in self.link_checks if link['broken']]
+            redirected = sum(1 for link in self.link_checks if link['chain'])
+            doc.add_paragraph(f'Внутренние ссылки: проверено {len(self.link_checks)} целей, битых {len(broken_links)}, '
+                              f'с редиректом {redirected}')
+            for link in broken_links[:10]:
+                doc.add_paragraph(f"❌ {link['url']} ({link['status'] or link['error']}) — "
+                                  f"ссылаются {len(link['sources'])} стр.", style='List Bullet')
+        if self.external_checks:
+            broken_external = sum(1 for link in self.external_checks if link['broken'])
+            dead_domains = sorted({link['domain'] for link in self.external_checks if link['dead_domain']})
+            doc.add_paragraph(f'Внешние ссылки: проверено {len(self.external_checks)}, битых {broken_external}, '
+                              f'мёртвых доменов {len(dead_domains)}')
+            for domain in dead_domains[:10]:
+                doc.add_paragraph(f'❌ {domain}', style='List Bullet')
+        if self.redirects:
+            multi_hop = sum(1 for r in self.redirects if len(r['chain']) > 1)
+            loops = sum(1 for r in self.redirects if r['error'] == 'loop')
+            doc.add_paragraph(f'Редиректы: {len(self.redirects)}, цепочек длиннее 1 хопа: {multi_hop}, петель: {loops}')
+        bad_canonicals = [r for r in self.results if r['canonical_issue']]
+        if bad_canonicals:
+            doc.add_paragraph(f'Проблемные canonical: {len(bad_canonicals)}')
+            for result in bad_canonicals[:10]:
+                doc.add_paragraph(f"{result['canonical_issue']}: {result['url']} → {result['canonical_url']}", style='List Bullet')
+        if self.hreflang_index:
+            issue_counts = Counter(item['issue'] for item in self.hreflang_issues)
+            doc.add_paragraph(f'Hreflang: страниц с альтернативами {len(self.hreflang_index)}, '
+                              f'ошибок {len(self.hreflang_issues)}')
+            for text, count in issue_counts.most_common(5):
+                doc.add_paragraph(f'{text}: {count}', style='List Bullet')
+        if self.slow_pages:
+            reduced = sum(1 for page in self.slow_pages if page['mode'] != 'full')
+            doc.add_paragraph(f'Тяжёлые страницы: {len(self.slow_pages)} (упрощённый анализ: {reduced})')
+            for page in sorted(self.slow_pages, key=lambda p: -p['ms'])[:5]:
+                doc.add_paragraph(f"🐢 {page['url']} — {page['ms']} мс, {page['mode']}", style='List Bullet')
+        timing = self.timing_summary()
+        if timing:
+            overall = timing[0]
+            doc.add_paragraph(f"Время ответа сервера: TTFB p50 {overall['ttfb_p50']} мс, p95 {overall['ttfb_p95']} мс; "
+                              f"полная загрузка p50 {overall['total_p50']} мс, p95 {overall['total_p95']} мс")
+        budget = self.frontier_summary(limit=0)
+        doc.add_paragraph(f'Бюджет краулинга: просканировано {budget["crawled"]} URL, во фронтире осталось '
+                          f'{budget["pending"]} ({budget["uncrawled_percent"]}%), '
+                          f'отброшено ссылок сверх лимита: {budget["dropped_links"]}')
+        if self.sample_size:
+            estimates = self.sample_estimates()
+            doc.add_paragraph(f'Выборка: проанализировано {estimates["sampled"]} страниц из {estimates["population"]} '
+                              f'найденных URL ({len(estimates["templates"])} шаблонов); оценки для всего сайта '
+                              f'с 95% доверительным интервалом:')
+            for metric, (mean, low, high) in estimates['metrics'].items():
+                bounds = '' if low is None else f' [{low:.1f}; {high:.1f}]'
+                doc.add_paragraph(f'{metric}: {mean:.1f}{bounds}', style='List Bullet')
+            for label, (count, low, high) in list(estimates['issues'].items())[:10]:
+                bounds = '' if low is None else f' [{low}; {high}]'
+                doc.add_paragraph(f'{label}: ~{count} страниц{bounds}', style='List Bullet')
+        if self.trap_detector and self.trap_detector.pruned:
+            traps = self.trap_detector.report()
+            doc.add_paragraph(f'Ловушки краулинга: отброшено {self.trap_detector.pruned_total} URL. '
+                              f'Закройте эти шаблоны от индексации (robots.txt, nofollow) или уберите ссылки на них:')
+            for trap in traps[:10]:
+                doc.add_paragraph(f'{trap["pattern"]} — {TRAP_REASONS[trap["reason"]]}: {trap["pruned"]} URL, '
+                                  f'например {trap["example"]}', style='List Bullet')
         
         # РАЗДЕЛ 6
         doc.add_heading('5️⃣ 6. ON-PAGE SEO', level=1)
@@ -1553,6 +5983,12 @@ class SEOAuditParser:
             doc.add_paragraph('TOP 15 ключевых слов на сайте:')
             for kw, count in top_kw:
                 doc.add_paragraph(f'{kw}: {count} упоминаний', style='List Bullet')
+        for n, sketch in self.site_phrases.items():
+            phrases = sketch.top(15)
+            if phrases:
+                doc.add_paragraph(f'TOP 15 фраз из {n} слов на сайте:')
+                for phrase, count, _ in phrases:
+                    doc.add_paragraph(f'{phrase}: {count} упоминаний', style='List Bullet')
         
         # РАЗДЕЛ 8
         doc.add_heading('7️⃣ 8. ДОВЕРИЕ И E-E-A-T', level=1)
@@ -1589,9 +6025,124 @@ class SEOAuditParser:
         doc.save(filename)
         return filename
 
+    def save_history(self, path):
+        """Сохраняет аудит в историю (AuditHistory), возвращает run_id"""
+        history = AuditHistory(path)
+        try:
+            return history.save(self.domain, self.audit_started.isoformat(timespec='seconds'), self.results)
+        finally:
+            history.close()
+
+    def close(self):
+        """Освобождает дисковое состояние краулинга (--disk-frontier) и общий фронтир шардов"""
+        if self.shared_frontier:
+            self.shared_frontier.close()
+            self.shared_frontier = None
+        if self.crawl_state:
+            self.crawl_state.close()
+            self.crawl_state = None
+
+    # ==================== PARQUET ЭКСПОРТ ====================
+
+    def _flatten_result(self, result):
+        """Плоская строка для Parquet: вложенные словари раскрываются в колонки"""
+        row = {}
+        for key, value in result.items():
+            if key in PARQUET_KEYWORD_FIELDS:
+                continue
+            if key in PARQUET_FLATTEN_FIELDS and isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    if isinstance(sub_value, (list, tuple, dict)):
+                        sub_value = json.dumps(sub_value, ensure_ascii=False)
+                    row[f'{key}_{sub_key}'] = sub_value
+            elif isinstance(value, (list, tuple, dict)):
+                row[key] = json.dumps(value, ensure_ascii=False)
+            else:
+                row[key] = value
+        return row
+
+    def _parquet_column(self, name, values):
+        """Приводит колонку к стабильному типу (см. PARQUET_COLUMN_TYPES)"""
+        if name in PARQUET_COLUMN_TYPES:
+            type_name = PARQUET_COLUMN_TYPES[name]
+        else:
+            present = [v for v in values if v is not None]
+            if present and all(isinstance(v, bool) for v in present):
+                type_name = 'bool'
+            elif present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+                type_name = 'double'
+            else:
+                type_name = 'string'
+        if type_name == 'double':
+            values = [float(v) if v is not None else None for v in values]
+        elif type_name == 'string':
+            values = [str(v) if v is not None else None for v in values]
+        return pa.array(values, type=pa.type_for_alias(type_name))
+
+    def export_parquet(self, out_dir=None):
+        """Экспорт страниц, графа ссылок, внешних ссылок и ключевых слов в Parquet"""
+        if pa is None:
+            raise RuntimeError('Для Parquet экспорта установите pyarrow: pip install pyarrow')
+        if out_dir is None:
+            out_dir = f"{self.domain.replace('.', '_')}_{self.audit_started.strftime('%Y%m%d_%H%M%S')}_parquet"
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        audit_meta = {'domain': self.domain, 'audit_started': self.audit_started.isoformat(timespec='seconds')}
+        
+        def write(name, columns, schema=None):
+            n = len(next(iter(columns.values()))) if columns else 0
+            columns = {**{k: [v] * n for k, v in audit_meta.items()}, **columns}
+            if schema is None:
+                table = pa.table({col: self._parquet_column(col, values) for col, values in columns.items()})
+            else:
+                table = pa.table(columns, schema=pa.schema([('domain', pa.string()), ('audit_started', pa.string())] + schema))
+            pq.write_table(table, out / f'{name}.parquet')
+        
+        rows = [self._flatten_result(r) for r in self.results]
+        page_columns = {}
+        for row in rows:
+            for key in row:
+                page_columns.setdefault(key, [])
+        for key in page_columns:
+            page_columns[key] = [row.get(key) for row in rows]
+        write('pages', page_columns)
+        
+        edges = {'source_url': [], 'target_url': [], 'link_count': []}
+        for source, targets in self.internal_links_graph.items():
+            for target, count in Counter(targets).items():
+                edges['source_url'].append(source)
+                edges['target_url'].append(target)
+                edges['link_count'].append(count)
+        write('links', edges, [('source_url', pa.string()), ('target_url', pa.string()), ('link_count', pa.int64())])
+        
+        external = {'source_url': [], 'url': [], 'text': [], 'follow': []}
+        for link in self.external_links:
+            for key in external:
+                external[key].append(link.get(key))
+        write('external_links', external, [('source_url', pa.string()), ('url', pa.string()),
+                                           ('text', pa.string()), ('follow', pa.string())])
+        
+        keywords = {'url': [], 'source': [], 'rank': [], 'keyword': [], 'count': [], 'value': []}
+        
+        def add_keyword(*values):
+            for key, value in zip(keywords, values):
+                keywords[key].append(value)
+        
+        for result in self.results:
+            url = result['url']
+            for rank, (word, count) in enumerate(result.get('top_keywords', []), 1):
+                add_keyword(url, 'top', rank, word, count, None)
+            for rank, (word, data) in enumerate(result.get('keyword_density_profile', {}).items(), 1):
+                add_keyword(url, 'density', rank, word, data['count'], data['density'])
+            for rank, (word, score) in enumerate(result.get('tf_idf_keywords', {}).items(), 1):
+                add_keyword(url, 'tf_idf', rank, word, None, score)
+        write('keywords', keywords, [('url', pa.string()), ('source', pa.string()), ('rank', pa.int32()),
+                                     ('keyword', pa.string()), ('count', pa.int64()), ('value', pa.float64())])
+        return str(out)
+
     def generate_reports(self):
         """Генерирует оба отчёта"""
-        print("📊 Генерирую ПОЛНЫЙ Excel отчёт (16 вкладок)...")
+        print("📊 Генерирую ПОЛНЫЙ Excel отчёт...")
         excel_file = self.generate_excel_report()
         
         print("📄 Генерирую ПОЛНЫЙ Word отчёт (9 разделов)...")
@@ -1600,46 +6151,275 @@ class SEOAuditParser:
         return excel_file, word_file
 
 
+def history_diff_main(argv):
+    """Команда diff: сравнение двух прогонов домена из истории аудитов"""
+    parser = argparse.ArgumentParser(prog='seo_audit_v9_0.py diff',
+                                     description='Сравнение двух аудитов домена из истории')
+    parser.add_argument('domain', help='Домен (или URL) сайта')
+    parser.add_argument('--history', default='seo_history.sqlite', help='Файл истории аудитов')
+    parser.add_argument('--old', type=int, help='run_id старого прогона (по умолчанию предпоследний)')
+    parser.add_argument('--new', type=int, help='run_id нового прогона (по умолчанию последний)')
+    parser.add_argument('--score-delta', type=float, default=1.0,
+                        help='Минимальное изменение health score (по умолчанию 1)')
+    parser.add_argument('--words-ratio', type=float, default=0.1,
+                        help='Минимальное относительное изменение числа слов (по умолчанию 0.1)')
+    args = parser.parse_args(argv)
+    
+    if not Path(args.history).exists():
+        print(f"❌ Нет файла истории: {args.history}")
+        sys.exit(1)
+    domain = urlparse(args.domain).netloc if '://' in args.domain else args.domain.strip('/')
+    history = AuditHistory(args.history)
+    run_ids = [run_id for run_id, _, _ in history.runs(domain)]
+    new_run = args.new if args.new is not None else (run_ids[-1] if run_ids else None)
+    older = [run_id for run_id in run_ids if new_run is not None and run_id < new_run]
+    old_run = args.old if args.old is not None else (older[-1] if older else None)
+    if old_run not in run_ids or new_run not in run_ids:
+        print(f"❌ Нужны два прогона {domain} в истории, найдено: {len(run_ids)}")
+        history.close()
+        sys.exit(1)
+    
+    diff = history.diff(old_run, new_run, args.score_delta, args.words_ratio)
+    print(f"📊 {domain}: прогон #{old_run} → #{new_run}")
+    print(f"✏️ Изменено страниц: {len(diff['changed'])}")
+    print(f"🆕 Новых страниц: {len(diff['added'])}")
+    print(f"🗑️ Удалённых страниц: {len(diff['removed'])}\n")
+    for page in diff['changed'][:20]:
+        changes = '; '.join(f'{name}: {old} → {new}' for name, (old, new) in page['fields'].items())
+        print(f"   {page['url']}: {changes}")
+    filename = history.export_diff_excel(diff, f"{domain.replace('.', '_')}_DIFF_{old_run}_{new_run}.xlsx")
+    history.close()
+    print(f"\n✅ Diff: {filename}")
+
+
 def main():
     lightning = LightningAnimation()
     
+    # Шаблон правил выводится без заставки, чтобы stdout можно было сохранить как JSON
+    if len(sys.argv) > 1 and sys.argv[1] == 'rules':
+        rules_json = json.dumps(DEFAULT_RULES, ensure_ascii=False, indent=2)
+        if len(sys.argv) > 2:
+            Path(sys.argv[2]).write_text(rules_json + '\n', encoding='utf-8')
+            print(f"✅ Правила по умолчанию: {sys.argv[2]}")
+        else:
+            print(rules_json)
+        return
+    
     # Печать приветствия
     lightning.print_title()
     
+    if len(sys.argv) > 1 and sys.argv[1] == 'diff':
+        history_diff_main(sys.argv[2:])
+        return
+    
     if len(sys.argv) < 2:
         print("🚀 SEO Audit Parser v9.0 COMPLETE RESTORED (85+ КБ)")
-        print("Использование: python seo_audit_v9_0.py <URL> [max_pages] [max_depth]\n")
+        print("Использование: python seo_audit_v9_0.py <URL> [max_pages] [max_depth] [опции]\n")
+        sys.exit(1)
+    
+    parser = argparse.ArgumentParser(description='SEO Technical Audit Parser')
+    parser.add_argument('url', help='URL сайта')
+    parser.add_argument('max_pages', nargs='?', type=int, default=50, help='Максимум страниц')
+    parser.add_argument('max_depth', nargs='?', type=int, default=3, help='Максимальная глубина')
+    parser.add_argument('--skip-duplicate-links', action='store_true',
+                        help='Не раскрывать ссылки со страниц-почти-дублей уже увиденных страниц')
+    parser.add_argument('--simhash-distance', type=int, default=3,
+                        help='Максимальное расстояние Хэмминга для почти-дублей (по умолчанию 3)')
+    parser.add_argument('--partial-every', type=int, default=0,
+                        help='Писать промежуточный Excel отчёт каждые N страниц (0 — выключено)')
+    parser.add_argument('--parquet', action='store_true',
+                        help='Дополнительно выгрузить результаты в Parquet (нужен pyarrow)')
+    parser.add_argument('--disk-frontier', metavar='DIR',
+                        help='Хранить очередь, visited, счётчики ссылок и тексты страниц в SQLite в папке DIR '
+                             '(результаты анализа и граф ссылок остаются в памяти)')
+    parser.add_argument('--template-threshold', type=float, default=0,
+                        help='Исключать из контентных метрик блоки текста, которые есть на такой доле '
+                             'страниц (например 0.6; 0 — выключено)')
+    parser.add_argument('--template-min-pages', type=int, default=20,
+                        help='Сколько страниц нужно детектору шаблонов для обучения (по умолчанию 20)')
+    parser.add_argument('--crawl-order', choices=('priority', 'bfs'), default='priority',
+                        help='Порядок обхода: priority — сначала самые ценные URL (по умолчанию), bfs — в ширину')
+    parser.add_argument('--verify-links', action='store_true',
+                        help='Проверить по HTTP все внутренние ссылки, которые краулер не открыл')
+    parser.add_argument('--link-workers', type=int, default=32,
+                        help='Потоков для проверки ссылок (по умолчанию 32)')
+    parser.add_argument('--verify-external', action='store_true',
+                        help='Проверить по HTTP уникальные внешние ссылки (статус, финальный URL, мёртвые домены)')
+    parser.add_argument('--external-workers', type=int, default=16,
+                        help='Потоков для проверки внешних ссылок (по умолчанию 16)')
+    parser.add_argument('--external-per-domain', type=int, default=2,
+                        help='Одновременных соединений на один внешний домен (по умолчанию 2)')
+    parser.add_argument('--page-weight', action='store_true',
+                        help='Измерить вес картинок, скриптов и стилей (HEAD по уникальным ресурсам, --link-workers потоков)')
+    parser.add_argument('--timing-json', metavar='FILE', nargs='?', const='',
+                        help='Сохранить сырые тайминги запросов и сводку в JSON (по умолчанию <домен>_TIMING_<время>.json)')
+    parser.add_argument('--hreflang-fetch', action='store_true',
+                        help='Запросить цели hreflang вне краулинга (статус и обратные ссылки)')
+    parser.add_argument('--page-budget', type=float, default=10.0,
+                        help='Бюджет анализа страницы в секундах; сверх него — только быстрый профиль (0 — без бюджета)')
+    parser.add_argument('--heavy-page-kb', type=int, default=3000,
+                        help='Страницы тяжелее (КБ) сразу анализируются быстрым профилем (0 — выключено)')
+    parser.add_argument('--heavy-page-nodes', type=int, default=20000,
+                        help='То же для страниц с большим числом элементов DOM (0 — выключено)')
+    parser.add_argument('--stream-page-kb', type=int, default=3000,
+                        help='Страницы тяжелее (КБ) разбираются потоково, без дерева BeautifulSoup, '
+                             'и считаются быстрым профилем (0 — выключено)')
+    parser.add_argument('--rules', metavar='FILE',
+                        help='JSON с правилами оценок и проблем (разделы подменяют DEFAULT_RULES; шаблон — команда rules)')
+    parser.add_argument('--lemmatize', action='store_true',
+                        help='Ключевые слова, TF-IDF и семантические связи по леммам (нужен pymorphy3)')
+    parser.add_argument('--sample', type=int, default=0, metavar='N',
+                        help='Анализировать до N страниц на шаблон URL и экстраполировать метрики на весь шаблон '
+                             '(0 — полный краулинг)')
+    parser.add_argument('--trap-max-segments', type=int, default=10, metavar='N',
+                        help='URL с путём глубже N сегментов считаются ловушкой краулинга')
+    parser.add_argument('--trap-min-urls', type=int, default=200, metavar='N',
+                        help='Шаблон URL, порождающий сам себя, признаётся ловушкой не раньше N найденных URL; '
+                             'перестановки сегментов пути отбрасываются, когда их в разделе больше N')
+    parser.add_argument('--no-trap-detection', action='store_true',
+                        help='Не отбрасывать URL ловушек краулинга (календари, сессии в пути, комбинации фильтров)')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Число воркеров шардированного краулинга (по умолчанию 1 — без шардов)')
+    parser.add_argument('--shard-queue', metavar='SPEC',
+                        help='Общая очередь шардов: redis://host:port/db или файл SQLite '
+                             '(по умолчанию <shard-dir>/frontier.sqlite)')
+    parser.add_argument('--shard-dir', metavar='DIR',
+                        help='Папка состояний воркеров (общая для всех машин при --remote-shards)')
+    parser.add_argument('--remote-shards', type=int, default=0,
+                        help='Сколько последних шардов запускается на других машинах с --shard-id')
+    parser.add_argument('--shard-id', type=int,
+                        help='Запустить только воркер этого шарда (на другой машине)')
+    parser.add_argument('--history', default='seo_history.sqlite',
+                        help='Файл истории аудитов для команды diff (по умолчанию seo_history.sqlite)')
+    parser.add_argument('--no-history', action='store_true', help='Не сохранять аудит в историю')
+    parser.add_argument('--metrics', default='full',
+                        help=f"Профиль метрик ({', '.join(METRIC_PROFILES)}) или плагины через запятую: "
+                             f"{', '.join(METRIC_PLUGINS)}")
+    args = parser.parse_args()
+    
+    try:
+        resolve_metric_plugins(args.metrics)
+    except ValueError as e:
+        print(f"❌ {e}")
         sys.exit(1)
     
-    url = sys.argv[1]
-    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
-    max_depth = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    if args.parquet and pa is None:
+        print("❌ Для --parquet установите pyarrow: pip install pyarrow")
+        sys.exit(1)
+    
+    if args.rules:
+        try:
+            RulesEngine.from_file(args.rules)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"❌ Правила {args.rules}: {e}")
+            sys.exit(1)
+    
+    if args.lemmatize and pymorphy is None:
+        print("❌ Для --lemmatize установите pymorphy3: pip install pymorphy3")
+        sys.exit(1)
+    
+    if args.trap_max_segments < 1 or args.trap_min_urls < 1:
+        print("❌ --trap-max-segments и --trap-min-urls должны быть больше 0")
+        sys.exit(1)
+    
+    if args.sample and args.shards > 1:
+        print("❌ --sample пока не совместим с --shards")
+        sys.exit(1)
+    
+    if args.shard_id is not None and not 0 <= args.shard_id < args.shards:
+        print("❌ --shard-id должен быть от 0 до --shards - 1")
+        sys.exit(1)
+    if not 0 <= args.remote_shards <= args.shards:
+        print("❌ --remote-shards не может быть больше --shards")
+        sys.exit(1)
+    if args.shards > 1 and redis is None and (args.shard_queue or '').startswith(('redis://', 'rediss://', 'unix://')):
+        print("❌ Для очереди шардов в Redis установите redis: pip install redis")
+        sys.exit(1)
     
-    print(f"📊 URL: {url}")
-    print(f"📄 Max Pages: {max_pages}")
-    print(f"📐 Max Depth: {max_depth}")
+    print(f"📊 URL: {args.url}")
+    print(f"📄 Max Pages: {args.max_pages}")
+    print(f"📐 Max Depth: {args.max_depth}")
     lightning.print_divider()
     print()
     
-    audit = SEOAuditParser(url, max_pages, max_depth)
-    audit.crawl()
+    audit = SEOAuditParser(
+        args.url, args.max_pages, args.max_depth,
+        skip_duplicate_links=args.skip_duplicate_links,
+        simhash_distance=args.simhash_distance,
+        partial_every=args.partial_every,
+        disk_frontier=args.disk_frontier,
+        metrics=args.metrics,
+        template_threshold=args.template_threshold,
+        template_min_pages=args.template_min_pages,
+        crawl_order=args.crawl_order,
+        verify_links=args.verify_links,
+        link_workers=args.link_workers,
+        verify_external=args.verify_external,
+        external_workers=args.external_workers,
+        external_per_domain=args.external_per_domain,
+        page_weight=args.page_weight,
+        hreflang_fetch=args.hreflang_fetch,
+        shards=args.shards,
+        shard_id=args.shard_id,
+        shard_queue=args.shard_queue,
+        shard_dir=args.shard_dir,
+        remote_shards=args.remote_shards,
+        page_budget=args.page_budget,
+        heavy_page_bytes=args.heavy_page_kb * 1024,
+        heavy_page_nodes=args.heavy_page_nodes,
+        lemmatize=args.lemmatize,
+        rules=args.rules,
+        sample_size=args.sample,
+        stream_page_bytes=args.stream_page_kb * 1024,
+        trap_detection=not args.no_trap_detection,
+        trap_max_segments=args.trap_max_segments,
+        trap_min_urls=args.trap_min_urls,
+    )
+    if args.shard_id is not None:
+        try:
+            state_file = audit.crawl_shard()
+        finally:
+            audit.close()
+        print(f"✅ Шард {args.shard_id}: {len(audit.results)} страниц → {state_file}")
+        return
+    
+    try:
+        audit.crawl()
+    except KeyboardInterrupt:
+        audit.lightning.stop_animation()
+        print("\n⛔ Краулинг прерван, сохраняю промежуточный отчёт...")
+        audit.write_partial_report()
+        audit.close()
+        sys.exit(130)
     
     print("📊 Генерирую отчёты...\n")
     excel_file, word_file = audit.generate_reports()
+    parquet_dir = audit.export_parquet() if args.parquet else None
+    timing_file = audit.export_timing_json(args.timing_json or None) if args.timing_json is not None else None
+    history_run = None if args.no_history else audit.save_history(args.history)
+    audit.close()
     
+    names = [
+        'Основной отчёт', 'Ошибки иерархии', 'On-Page SEO', 'Content',
+        'Technical', 'E-E-A-T', 'Trust', 'Health', 'Internal Links',
+        'Images', 'External Links', 'Structured Data', 'Keywords & TF-IDF',
+        'Topics', 'Advanced', 'Link Quality', 'Near Duplicates', 'Crawl Budget',
+        'Broken Links', 'Redirects & Canonical', 'Page Weight', 'Timing', 'Hreflang', 'Schema Types',
+        'Phrases', 'Sample', 'Crawl Traps'
+    ]
     lightning.print_divider()
     print("\n✅ AUDIT COMPLETE!")
-    print(f"📊 Excel (16 вкладок): {excel_file}")
+    print(f"📊 Excel ({len(names)} вкладок): {excel_file}")
     print(f"📄 Word (9 разделов): {word_file}")
+    if parquet_dir:
+        print(f"🗂️ Parquet: {parquet_dir}/ (pages, links, external_links, keywords)")
+    if timing_file:
+        print(f"⏱️ Тайминги: {timing_file}")
+    if history_run:
+        print(f"🗄️ История: {args.history} (прогон #{history_run})")
     print(f"\nEXCEL ВКЛАДКИ:")
-    for i in range(1, 17):
-        names = [
-            'Основной отчёт', 'Ошибки иерархии', 'On-Page SEO', 'Content',
-            'Technical', 'E-E-A-T', 'Trust', 'Health', 'Internal Links',
-            'Images', 'External Links', 'Structured Data', 'Keywords & TF-IDF',
-            'Topics', 'Advanced', 'Link Quality'
-        ]
-        print(f"{i}. {names[i-1]}")
+    for i, name in enumerate(names, 1):
+        print(f"{i}. {name}")
     print(f"\nWORD РАЗДЕЛЫ:")
     print("1. Критичные ошибки")
     print("2. Иерархия заголовков")
@@ -0,0 +1,39 @@
+"""Анализ байт-в-байт одинаковой страницы переиспользуется с полями, пересчитанными для её URL."""
+
+import sys
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+PAGE = b'''<html><head><title>Page</title><link rel="canonical" href="item">
+<link rel="alternate" hreflang="EN" href="../en/item"></head><body><h1>Item</h1><a href="next">next</a></body></html>'''
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.content = PAGE
+        self.status_code = 200
+        self.url = url
+        self.headers = {'content-type': 'text/html'}
+
+
+def test_cached_canonical_and_hreflang_follow_the_new_url():
+    audit = seo.SEOAuditParser('http://example.com', metrics='quick')
+    try:
+        for parse in (lambda: BeautifulSoup(PAGE, 'html.parser'), lambda: seo.StreamedPage.parse(audit, PAGE)):
+            first = 'http://example.com/a/item'
+            soup = parse()
+            analysis = audit.analyze_page(soup, first, FakeResponse(first))
+            entry = {'url': first, 'result': analysis, 'hrefs': ['next'], 'external': [], 'resources': None,
+                     'meta_refs': audit.extract_meta_refs(soup)}
+            second = 'http://example.com/b/sub/item'
+            reused = audit.reuse_cached_analysis(entry, second, FakeResponse(second))
+            assert analysis['canonical_url'] == first
+            assert reused['canonical_url'] == second
+            assert reused['hreflang_links'] == [('en', 'http://example.com/b/en/item')]
+            assert reused['exact_duplicate_of'] == first
+    finally:
+        audit.close()
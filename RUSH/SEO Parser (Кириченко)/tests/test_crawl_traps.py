@@ -0,0 +1,81 @@
+"""Ловушки краулинга: правила на один URL и рост шаблона, порождающего сам себя."""
+
+import re
+import sys
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+
+def template(url):
+    return re.sub(r'\d+', '{n}', urlsplit(url).path)
+
+
+def detector(**options):
+    return seo.CrawlTrapDetector(template, **options)
+
+
+def test_url_rules():
+    traps = detector()
+    assert traps.url_reason('http://example.com/' + '/'.join('abcdefghijk')) == 'depth'
+    assert traps.url_reason('http://example.com/a/x/a/y/a') == 'repeat'
+    assert traps.url_reason('http://example.com/cal/2024/05/2024/05') == 'repeat'
+    assert traps.url_reason('http://example.com/shop;jsessionid=abc/item') == 'session'
+    assert traps.url_reason('http://example.com/sid-3f9a0c1d2e3f4a5b6c7d/item') == 'session'
+    assert traps.url_reason('http://example.com/blog/2024/05/post') == ''
+
+
+def test_single_permutations_are_regular_pages():
+    traps = detector()
+    for path in ('shop/shoes/men', 'shop/men/shoes', 'news/05/2024', 'news/2024/05',
+                 'compare/galaxy/iphone', 'compare/iphone/galaxy'):
+        assert traps.url_reason(f'http://example.com/{path}') == '', path
+
+
+def test_many_permutations_in_section_are_pruned():
+    traps = detector(min_urls=5)
+    colors, sizes = ['red', 'blue', 'green', 'black'], ['s', 'm']
+    reasons = []
+    for color in colors:
+        for size in sizes:
+            assert traps.url_reason(f'http://example.com/catalog/{color}/{size}') == ''
+            reasons.append(traps.url_reason(f'http://example.com/catalog/{size}/{color}'))
+    assert reasons == [''] * 5 + ['permutation'] * 3
+    # Порог считается по первому сегменту пути: в другом разделе перестановка снова допустима
+    traps.url_reason('http://example.com/news/05/2024')
+    assert traps.url_reason('http://example.com/news/2024/05') == ''
+
+
+def test_self_generating_template_is_blocked_without_duplicates():
+    traps = detector(min_urls=20, min_crawled=5)
+    traps.check('http://example.com/cal/0')
+    for day in range(30):
+        page = f'http://example.com/cal/{day}'
+        traps.observe_page(page, duplicate=False)
+        traps.check(f'http://example.com/cal/{day + 1}', page)
+        traps.check(f'http://example.com/cal/{day + 1000}', page)
+    assert traps.blocked == {'/cal/{n}': 'growth'}
+    assert traps.check('http://example.com/cal/5000') == 'growth'
+
+
+def test_catalogue_found_from_listing_is_not_blocked():
+    traps = detector(min_urls=20, min_crawled=5)
+    for index in range(300):
+        traps.check(f'http://example.com/item/{index}', f'http://example.com/list/{index // 20}')
+        if index % 2:
+            traps.observe_page(f'http://example.com/item/{index // 2}', duplicate=False)
+    assert not traps.blocked
+
+
+def test_duplicates_halve_growth_threshold():
+    # окно: найдено 20, из них на своих страницах 18, открыто 24 — рост 0.75 на страницу
+    stats = [40, 36, 20, 0, 20, 18, 24]
+    traps = detector(min_urls=20, min_crawled=5)
+    traps.stats['/cal/{n}'] = list(stats)
+    traps._check_growth('/cal/{n}')
+    assert not traps.blocked
+    traps.stats['/cal/{n}'][3] = 10
+    traps._check_growth('/cal/{n}')
+    assert traps.blocked == {'/cal/{n}': 'growth'}
@@ -0,0 +1,37 @@
+"""Дисковый приоритетный фронтир ведёт себя как PriorityFrontier в памяти."""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+
+def make_frontiers(scores):
+    score = lambda url, depth: scores[url]  # noqa: E731
+    return seo.PriorityFrontier(score), seo.DiskPriorityQueue(sqlite3.connect(':memory:'), score)
+
+
+def test_rediscovered_url_counts_once():
+    _, disk = make_frontiers({'a': 1.0})
+    disk.append(('a', 2))
+    disk.flush()
+    disk.append(('a', 1))
+    assert len(disk) == 1
+    disk.flush()
+    assert len(disk) == 1
+
+
+def test_rediscovered_url_gets_new_score_and_min_depth():
+    scores = {'a': 5.0, 'b': 3.0}
+    memory, disk = make_frontiers(scores)
+    for frontier in (memory, disk):
+        frontier.append(('a', 2))
+        frontier.append(('b', 2))
+    disk.flush()
+    scores['a'] = 1.0  # редкость шаблона падает с ростом url_templates
+    for frontier in (memory, disk):
+        frontier.append(('a', 3))
+    assert [disk.pop(0) for _ in range(2)] == [memory.pop(0) for _ in range(2)] == [('b', 2), ('a', 2)]
+    assert not disk and not memory
@@ -0,0 +1,40 @@
+"""Токены страницы: без --lemmatize — как раньше, с ним — без пунктуации по краям слов."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+TEXT = 'Купить кабеля, провод — «медный» кабеля'
+
+
+def make_audit():
+    return seo.SEOAuditParser('http://example.com')
+
+
+def test_default_terms_keep_punctuation():
+    audit = make_audit()
+    try:
+        assert audit.page_terms(TEXT) == ['купить', 'кабеля,', 'провод', '—', '«медный»', 'кабеля']
+    finally:
+        audit.close()
+
+
+def test_phrase_tokens_strip_punctuation_and_keep_breaks():
+    audit = make_audit()
+    try:
+        assert audit.page_terms(TEXT, breaks=True) == ['купить', 'кабеля', 'провод', '', 'медный', 'кабеля']
+    finally:
+        audit.close()
+
+
+def test_lemmatized_terms_strip_punctuation(monkeypatch):
+    # pymorphy может быть не установлен: лемматизатор подменяется, проверяется токенизация
+    monkeypatch.setattr(seo, 'lemmatize_word', lambda word: {'кабеля': 'кабель'}.get(word, word))
+    audit = make_audit()
+    audit.lemmatize = True
+    try:
+        assert audit.page_terms(TEXT) == ['купить', 'кабель', 'провод', 'медный', 'кабель']
+    finally:
+        audit.close()
@@ -0,0 +1,79 @@
+"""RulesEngine: пустые оценки, нормировка composite по посчитанным частям, NumPy и списки."""
+
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+OUTPUTS = ['site_health_score', 'linking_quality_score']
+
+
+def page(**fields):
+    result = {'html_quality_score': 60, 'dom_nodes': 100, 'words_count': 100, 'readability_score': 50,
+              'unique_percent': 60, 'toxicity_score': 0, 'h1_count': 1, 'h_hierarchy': 'Good', 'title_len': 40,
+              'canonical': 1, 'trust_score': 50, 'anchor_text_quality_score': 80, 'total_links': 10,
+              'h_errors': []}
+    result.update(fields)
+    return result
+
+
+def apply(results, available=None, use_numpy=True, monkeypatch=None):
+    if not use_numpy:
+        monkeypatch.setattr(seo, 'np', None)
+    results = copy.deepcopy(results)
+    seo.RulesEngine().apply(results, OUTPUTS, available)
+    return results
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'lists'])
+def use_numpy(request):
+    if request.param and seo.np is None:
+        pytest.skip('NumPy не установлен')
+    return request.param
+
+
+def test_all_parts_present(use_numpy, monkeypatch):
+    # tech 85, content 80 (мало слов), trust 50, seo 100
+    [result] = apply([page()], use_numpy=use_numpy, monkeypatch=monkeypatch)
+    assert result['site_health_score'] == 78.2
+    assert result['linking_quality_score'] == 100
+
+
+def test_score_with_unevaluated_rule_is_empty(use_numpy, monkeypatch):
+    available = {'readability_score': [False], 'anchor_text_quality_score': [False]}
+    [result] = apply([page()], available, use_numpy, monkeypatch)
+    assert result['linking_quality_score'] is None
+    # content_health пуст: tech 85 · 0.25 + trust 50 · 0.20 + seo 100 · 0.15 на вес 0.60
+    assert result['site_health_score'] == 77.1
+
+
+def test_composite_rescales_over_present_parts(use_numpy, monkeypatch):
+    available = {'trust_score': [True, False]}
+    results = apply([page(trust_score=None), page()], available, use_numpy, monkeypatch)
+    # trust пуст или не считался: tech, content, seo на вес 0.80
+    assert [result['site_health_score'] for result in results] == [85.3, 85.3]
+
+
+def test_page_without_parts_is_empty(use_numpy, monkeypatch):
+    fields = ['html_quality_score', 'words_count', 'h1_count', 'trust_score']
+    [result] = apply([page()], {field: [False] for field in fields}, use_numpy, monkeypatch)
+    assert result['site_health_score'] is None
+
+
+def test_numpy_and_lists_match(monkeypatch):
+    if seo.np is None:
+        pytest.skip('NumPy не установлен')
+    results = [page(words_count=100 * i, trust_score=None if i % 3 == 0 else 10 * i, total_links=i,
+                    anchor_text_quality_score=10 * i, readability_score=30 + i) for i in range(12)]
+    available = {'trust_score': [i % 4 != 1 for i in range(12)],
+                 'readability_score': [i % 5 != 2 for i in range(12)],
+                 'anchor_text_quality_score': [i % 6 != 3 for i in range(12)],
+                 'html_quality_score': [i != 7 for i in range(12)]}
+    with_numpy = apply(results, available)
+    with_lists = apply(results, available, use_numpy=False, monkeypatch=monkeypatch)
+    assert [{name: r[name] for name in OUTPUTS} for r in with_numpy] == \
+           [{name: r[name] for name in OUTPUTS} for r in with_lists]
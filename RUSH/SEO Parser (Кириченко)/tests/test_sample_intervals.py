@@ -0,0 +1,74 @@
+"""Интервалы выборки: среднее и доля шаблона, экстраполяция на сайт без интервала нулевой ширины."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+
+def test_mean_of_one_page_has_no_interval():
+    assert seo.mean_interval([42], 100) == (42, None, None, None)
+
+
+def test_mean_of_whole_population_is_exact():
+    mean, low, high, variance = seo.mean_interval([10, 20, 30], 3)
+    assert mean == low == high == 20
+    assert variance == 100
+
+
+def test_mean_interval_narrows_with_finite_population():
+    _, low_small, high_small, _ = seo.mean_interval([10, 20, 30], 4)
+    _, low_large, high_large, _ = seo.mean_interval([10, 20, 30], 10 ** 6)
+    assert low_large < low_small < 20 < high_small < high_large
+
+
+def test_share_of_whole_population_is_exact():
+    assert seo.share_interval(3, 10, 10) == (0.3, 0.3, 0.3)
+
+
+def test_wilson_bounds_stay_in_unit_range():
+    for hits in (0, 1):
+        share, low, high = seo.share_interval(hits, 1, 50)
+        assert 0.0 <= low <= share <= high <= 1.0
+        assert low < high
+
+
+def estimates(pages, population):
+    audit = seo.SEOAuditParser('http://example.com')
+    try:
+        audit.results = [{'url': f'http://example.com{path}', 'words_count': words,
+                          'all_issues': ['Нет description'] if issue else []}
+                         for path, words, issue in pages]
+        for path, _, _ in pages:
+            audit.sample_population[audit.sample_template(f'http://example.com{path}')] = 0
+        audit.sample_population.update(population)
+        return audit.sample_estimates()
+    finally:
+        audit.close()
+
+
+def test_site_interval_with_sampled_strata():
+    result = estimates([('/item/1', 100, True), ('/item/2', 300, False), ('/blog/a-b-c', 50, True),
+                        ('/blog/d-e-f', 70, False)], {'/item/{n}': 40, '/blog/{slug}': 10})
+    mean, low, high = result['metrics']['words_count']
+    assert mean == (40 * 200 + 10 * 60) / 50
+    assert low < mean < high
+    count, low, high = result['issues']['Нет description']
+    assert count == 25 and low < count < high
+
+
+def test_site_interval_is_dropped_for_single_page_stratum():
+    # шаблон /about из 5 URL представлен одной страницей: его дисперсия неизвестна
+    result = estimates([('/item/1', 100, True), ('/item/2', 300, False), ('/about', 50, True)],
+                       {'/item/{n}': 40, '/about': 5})
+    assert result['metrics']['words_count'] == ((40 * 200 + 5 * 50) / 45, None, None)
+    assert result['issues']['Нет description'] == (25, None, None)
+
+
+def test_single_page_that_is_whole_stratum_keeps_interval():
+    result = estimates([('/item/1', 100, True), ('/item/2', 300, False), ('/about', 50, True)],
+                       {'/item/{n}': 40, '/about': 1})
+    _, low, high = result['metrics']['words_count']
+    assert low is not None and high is not None
+    assert result['issues']['Нет description'][1] is not None
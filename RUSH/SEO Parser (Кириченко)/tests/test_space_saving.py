@@ -0,0 +1,45 @@
+"""SpaceSaving: count — оценка частоты сверху, count - error — снизу, в том числе после слияния."""
+
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+
+def sketch(items, capacity):
+    table = seo.SpaceSaving(capacity)
+    for item in items:
+        table.update({item: 1})
+    return table
+
+
+def assert_bounds(table, truth):
+    for item, count, error in table.top(table.capacity):
+        assert count - error <= truth[item] <= count, item
+
+
+def test_floor_is_zero_until_full():
+    table = sketch('aab', 3)
+    assert table.floor() == 0
+    table.update({'c': 1})
+    assert table.floor() == 1
+
+
+def test_missing_item_gets_floor_of_full_table():
+    left = sketch('aaab', 2)       # полная: a=3, b=1
+    right = sketch('cc', 2)        # не полная: c=2
+    left.merge(right)
+    assert left.counts == {'a': 3, 'c': 3}
+    assert left.errors == {'a': 0, 'c': 1}
+
+
+def test_merged_tables_keep_bounds():
+    rnd = random.Random(1)
+    stream = [str(int(rnd.paretovariate(1.2))) for _ in range(20000)]
+    left, right = sketch(stream[:10000], 20), sketch(stream[10000:], 20)
+    left.merge(right)
+    assert left.total == len(stream)
+    assert_bounds(left, Counter(stream))
@@ -0,0 +1,56 @@
+"""Потоковый разбор (StreamedPage.parse) даёт те же результаты, что и дерево BeautifulSoup.
+
+Страницы в fixtures/ — то, на чём разборщики расходятся чаще всего: незакрытые
+теги, CDATA и скрипты, <template> и микроразметка, страница в cp1251.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import seo  # noqa: E402
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+URL = 'http://example.com/page'
+# Время разбора и анализа у разборщиков заведомо разное
+TIMING_FIELDS = {'analysis_ms'}
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+        self.url = URL
+        self.headers = {'content-type': 'text/html'}
+
+
+def analyze(content, streamed):
+    """Результат быстрого профиля, ссылки и текстовые блоки страницы одним из разборщиков"""
+    audit = seo.SEOAuditParser(URL, metrics='quick')
+    try:
+        if streamed:
+            page = seo.StreamedPage.parse(audit, content)
+            hrefs = [link['href'] for link in page.links]
+            blocks = audit.hash_text_blocks(page.text_blocks)
+        else:
+            page = BeautifulSoup(content, 'html.parser')
+            hrefs = [link['href'] for link in page.find_all('a', href=True)]
+            blocks = audit.extract_text_blocks(page)
+        result = audit.analyze_page(page, URL, FakeResponse(content))
+    finally:
+        audit.close()
+    result = {name: value for name, value in result.items() if name not in TIMING_FIELDS}
+    return result, hrefs, blocks
+
+
+@pytest.mark.parametrize('name', sorted(path.name for path in FIXTURES.glob('*.html')))
+def test_stream_matches_tree(name):
+    content = (FIXTURES / name).read_bytes()
+    tree_result, tree_hrefs, tree_blocks = analyze(content, streamed=False)
+    stream_result, stream_hrefs, stream_blocks = analyze(content, streamed=True)
+    assert stream_hrefs == tree_hrefs
+    assert stream_blocks == tree_blocks
+    assert stream_result == tree_result